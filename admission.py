@@ -0,0 +1,127 @@
+"""Admission state of a classroom: pending requests, approved students, viewports.
+
+Socket.IO handler threads change it while the Tk thread and the HTTP API
+read it, and the hot path (every incoming pen sample) asks whether its
+sender is approved. Writers take a private lock, build new containers and
+publish them as one immutable ``AdmissionSnapshot`` with a bumped version;
+readers just grab the current snapshot, without locking, and can iterate
+it as long as they like (the records inside are never modified either).
+Admission changes are rare next to pen samples, so copying on write is
+cheap, and the version lets UI readers skip redrawing when nothing
+changed.
+"""
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+AdmissionSnapshot = namedtuple("AdmissionSnapshot", "version pending_requests connected_clients client_viewports")
+
+_EMPTY = AdmissionSnapshot(0, MappingProxyType({}), frozenset(), MappingProxyType({}))
+
+
+class AdmissionState:
+    """Copy-on-write admission state; see the module docstring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Serializes writers only
+        self.current = _EMPTY
+
+    def snapshot(self):
+        """The latest AdmissionSnapshot; never changes once returned."""
+        return self.current
+
+    def _publish(self, pending=None, connected=None, viewports=None):
+        """Replace the snapshot (called with the lock held)."""
+        old = self.current
+        self.current = AdmissionSnapshot(
+            old.version + 1,
+            old.pending_requests if pending is None else MappingProxyType(pending),
+            old.connected_clients if connected is None else frozenset(connected),
+            old.client_viewports if viewports is None else MappingProxyType(viewports),
+        )
+
+    # Readers -----------------------------------------------------------
+
+    def is_approved(self, client_id):
+        return client_id in self.current.connected_clients
+
+    def client_count(self):
+        return len(self.current.connected_clients)
+
+    def pending_list(self):
+        """Pending requests, oldest first."""
+        return sorted(self.current.pending_requests.values(), key=lambda r: r["timestamp"])
+
+    # Writers -----------------------------------------------------------
+
+    def add_request(self, client_id, client_ip, question=""):
+        request_data = {
+            "client_id": client_id,
+            "client_ip": client_ip,
+            "timestamp": time.time(),
+            "status": "pending",
+            "question": question,
+        }
+        with self.lock:
+            pending = dict(self.current.pending_requests)
+            pending[client_id] = request_data
+            self._publish(pending=pending)
+        return request_data
+
+    def admit(self, client_id):
+        """Move a pending request to the approved students; returns it, or None."""
+        with self.lock:
+            request_data = self.current.pending_requests.get(client_id)
+            if request_data is None:
+                return None
+            pending = dict(self.current.pending_requests)
+            del pending[client_id]
+            self._publish(pending=pending, connected=self.current.connected_clients | {client_id})
+        return request_data
+
+    def drop_request(self, client_id):
+        """Forget a pending request; returns it, or None."""
+        with self.lock:
+            request_data = self.current.pending_requests.get(client_id)
+            if request_data is None:
+                return None
+            pending = dict(self.current.pending_requests)
+            del pending[client_id]
+            self._publish(pending=pending)
+        return request_data
+
+    def expire(self, cutoff):
+        """Drop the requests made before cutoff; returns their client ids."""
+        with self.lock:
+            pending = self.current.pending_requests
+            stale = [client_id for client_id, r in pending.items() if r["timestamp"] < cutoff]
+            if stale:
+                self._publish(pending={k: v for k, v in pending.items() if k not in stale})
+        return stale
+
+    def set_viewport(self, client_id, width, height):
+        """Record an approved student's viewport; returns False for anyone else."""
+        with self.lock:
+            if client_id not in self.current.connected_clients:
+                return False
+            viewports = dict(self.current.client_viewports)
+            viewports[client_id] = {"width": width, "height": height}
+            self._publish(viewports=viewports)
+        return True
+
+    def remove(self, client_id):
+        """Forget a student entirely; returns (was pending, was approved)."""
+        with self.lock:
+            old = self.current
+            was_pending = client_id in old.pending_requests
+            was_approved = client_id in old.connected_clients
+            had_viewport = client_id in old.client_viewports
+            if not (was_pending or was_approved or had_viewport):
+                return False, False
+            self._publish(
+                pending={k: v for k, v in old.pending_requests.items() if k != client_id} if was_pending else None,
+                connected=old.connected_clients - {client_id} if was_approved else None,
+                viewports={k: v for k, v in old.client_viewports.items() if k != client_id} if had_viewport else None,
+            )
+        return was_pending, was_approved
@@ -0,0 +1,110 @@
+"""Content-addressed cache for documents and rendered pages.
+
+Classrooms hosted by one server often use the same slides. Documents are
+stored once by SHA-1 of their bytes, together with the base64 text sent to
+students, and pages are rendered and PNG-encoded once per (document, page,
+scale) no matter how many classrooms show them. Rendered pages are kept in
+an LRU bounded by their size in memory; documents live as long as a
+session still holds them.
+"""
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict, namedtuple
+
+# Memory budget for rendered pages (decoded image + PNG text)
+PAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+RenderedPage = namedtuple("RenderedPage", "image png_b64 nbytes")
+
+
+class AssetCache:
+    """Thread-safe cache shared by every classroom in the process."""
+
+    def __init__(self, max_page_bytes=PAGE_CACHE_BYTES):
+        self.max_page_bytes = max_page_bytes
+        self.lock = threading.Lock()
+        self.documents = {}  # {digest: [pdf bytes, base64 text, users]}
+        self.pages = OrderedDict()  # {(digest, page, scale): RenderedPage}, oldest first
+        self.page_bytes = 0
+        self.rendering = {}  # {key: Event} for pages being rendered right now
+        self.hits = self.misses = 0
+
+    # Documents ---------------------------------------------------------
+
+    def add_document(self, pdf_bytes):
+        """Register a user of a document; returns (digest, shared bytes)."""
+        digest = hashlib.sha1(pdf_bytes).hexdigest()
+        with self.lock:
+            entry = self.documents.get(digest)
+            if entry is None:
+                entry = self.documents[digest] = [pdf_bytes, None, 0]
+            entry[2] += 1
+            return digest, entry[0]
+
+    def release_document(self, digest):
+        """Drop one user of a document; it is forgotten with its last user."""
+        with self.lock:
+            entry = self.documents.get(digest)
+            if entry is None:
+                return
+            entry[2] -= 1
+            if entry[2] <= 0:
+                del self.documents[digest]
+
+    def document_b64(self, digest):
+        """Base64 text of a document, encoded on first use."""
+        with self.lock:
+            entry = self.documents[digest]
+            if entry[1] is None:
+                entry[1] = base64.b64encode(entry[0]).decode("utf-8")
+            return entry[1]
+
+    # Pages -------------------------------------------------------------
+
+    def page(self, digest, page_number, scale, render):
+        """Return the RenderedPage for a page, calling ``render()`` (-> PIL image) on a miss.
+
+        Concurrent requests for the same page wait for a single render.
+        """
+        key = (digest, page_number, scale)
+        while True:
+            with self.lock:
+                page = self.pages.get(key)
+                if page is not None:
+                    self.pages.move_to_end(key)
+                    self.hits += 1
+                    return page
+                pending = self.rendering.get(key)
+                if pending is None:
+                    self.rendering[key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+        try:
+            img = render()
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG")
+            png_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+            page = RenderedPage(img, png_b64, img.width * img.height * len(img.getbands()) + len(png_b64))
+            with self.lock:
+                self.pages[key] = page
+                self.page_bytes += page.nbytes
+                while self.page_bytes > self.max_page_bytes and len(self.pages) > 1:
+                    _, evicted = self.pages.popitem(last=False)
+                    self.page_bytes -= evicted.nbytes
+            return page
+        finally:
+            with self.lock:
+                self.rendering.pop(key).set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "documents": len(self.documents),
+                "pages": len(self.pages),
+                "page_bytes": self.page_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
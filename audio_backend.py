@@ -0,0 +1,243 @@
+"""Audio device backends for voice chat.
+
+A backend mirrors the small part of the PyAudio API that ``VoiceChat``
+uses: ``open(format, channels, rate, input=..., output=..., frames_per_buffer=...)``
+returns a stream with ``read``/``write``/``stop_stream``/``close``, and
+``terminate`` releases the backend. ``VoiceChat`` takes a backend factory
+and creates one backend per session.
+
+Besides real sound cards (``PyAudioBackend``) there are simulated devices
+that need no hardware: silence (``NullBackend``), WAV files
+(``WavBackend``), output fed back into input (``LoopbackBackend``), and
+arbitrary callables (``SimulatedBackend``) for benchmarks. Simulated
+streams run on their own device clock, so reads and writes block for as
+long as a real device would, and they count underruns and overruns.
+"""
+import threading
+import time
+import wave
+
+import numpy as np
+
+SAMPLE_WIDTH = 2  # Only 16-bit PCM (pyaudio.paInt16) is simulated
+
+
+class PyAudioBackend:
+    """The sound card, via PortAudio."""
+
+    def __init__(self):
+        import pyaudio  # Deferred: loading PortAudio is slow and only needed once a peer connects
+        self.pa = pyaudio.PyAudio()
+
+    def open(self, **kwargs):
+        return self.pa.open(**kwargs)
+
+    def stats(self):
+        return {}
+
+    def terminate(self):
+        self.pa.terminate()
+
+
+class SimulatedStream:
+    """A PyAudio-like stream paced by a simulated device clock.
+
+    Input: ``read`` returns once the requested frames would have been
+    captured; if nobody read for longer than ``overflow_after`` seconds the
+    gap is dropped and counted as an overrun. Output: a written chunk is
+    scheduled right after the audio already queued and ``write`` blocks
+    while more than two buffers are waiting; if the queue ran dry
+    before the write, that is an underrun.
+    """
+
+    def __init__(self, backend, rate, channels=1, frames_per_buffer=1024,
+                 input=False, output=False, overflow_after=0.2, **kwargs):
+        self.backend = backend
+        self.rate = rate
+        self.channels = channels
+        self.is_input = input
+        self.is_output = output
+        self.buffer_time = 2 * frames_per_buffer / rate
+        self.overflow_after = overflow_after
+        self.clock = None
+        self.active = True
+
+    def _frame_count(self, data):
+        return len(data) // (SAMPLE_WIDTH * self.channels)
+
+    def read(self, num_frames, exception_on_overflow=True):
+        now = time.time()
+        if self.clock is None:
+            self.clock = now
+        elif now - self.clock > self.overflow_after:
+            self.backend.overruns += 1
+            self.clock = now
+        captured_at = self.clock
+        self.clock += num_frames / self.rate
+        delay = self.clock - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.backend.frames_read += num_frames
+        return self.backend.source(num_frames * self.channels, captured_at)
+
+    def write(self, data, num_frames=None, exception_on_underflow=False):
+        now = time.time()
+        if self.clock is None or now > self.clock:
+            if self.clock is not None:
+                self.backend.underruns += 1
+            self.clock = now
+        plays_at = self.clock
+        frames = self._frame_count(data)
+        self.clock += frames / self.rate
+        delay = self.clock - self.buffer_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.backend.frames_written += frames
+        self.backend.sink(data, plays_at)
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+
+
+class SimulatedBackend:
+    """A simulated sound card.
+
+    ``source(samples, captured_at)`` supplies captured PCM (silence by
+    default); ``sink(data, plays_at)`` receives every written chunk with the
+    time it starts playing (discarded by default).
+    """
+
+    def __init__(self, source=None, sink=None):
+        if source is not None:
+            self.source = source
+        if sink is not None:
+            self.sink = sink
+        self.underruns = self.overruns = 0
+        self.frames_read = self.frames_written = 0
+
+    def open(self, **kwargs):
+        return SimulatedStream(self, **kwargs)
+
+    def source(self, samples, captured_at):
+        return bytes(samples * SAMPLE_WIDTH)
+
+    def sink(self, data, plays_at):
+        pass
+
+    def stats(self):
+        return {
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "frames_read": self.frames_read,
+            "frames_written": self.frames_written,
+        }
+
+    def terminate(self):
+        pass
+
+
+class NullBackend(SimulatedBackend):
+    """Silent microphone, output discarded."""
+
+
+class WavBackend(SimulatedBackend):
+    """Microphone from a WAV file, speaker into a WAV file.
+
+    The source must be 16-bit PCM at the input stream's rate and channel
+    count (checked when the stream is opened); it is played once and
+    followed by silence, or repeated with ``loop=True``. The sink is
+    written with the same timeline a listener would hear: underruns become
+    silence.
+    """
+
+    def __init__(self, source_path=None, sink_path=None, loop=False):
+        super().__init__()
+        self.loop = loop
+        self.samples = None
+        self.position = 0
+        self.source_path = source_path
+        self.source_rate = self.source_channels = None
+        if source_path:
+            with wave.open(source_path, "rb") as wav:
+                if wav.getsampwidth() != SAMPLE_WIDTH:
+                    raise ValueError(f"{source_path}: only 16-bit WAV files are supported")
+                self.source_rate = wav.getframerate()
+                self.source_channels = wav.getnchannels()
+                self.samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+        self.sink_path = sink_path
+        self.sink_file = None
+        self.sink_rate = None
+        self.sink_channels = 1
+        self.sink_clock = None
+
+    def source(self, samples, captured_at):
+        if self.samples is None or self.samples.size == 0:
+            return bytes(samples * SAMPLE_WIDTH)
+        out = np.zeros(samples, dtype="<i2")
+        filled = 0
+        while filled < samples:
+            if self.position >= self.samples.size:
+                if not self.loop:
+                    break
+                self.position = 0
+            take = min(samples - filled, self.samples.size - self.position)
+            out[filled:filled + take] = self.samples[self.position:self.position + take]
+            self.position += take
+            filled += take
+        return out.tobytes()
+
+    def open(self, **kwargs):
+        if kwargs.get("input") and self.source_rate is not None:
+            rate, channels = kwargs["rate"], kwargs.get("channels", 1)
+            if (self.source_rate, self.source_channels) != (rate, channels):
+                raise ValueError(f"{self.source_path}: {self.source_rate} Hz x {self.source_channels} channel(s), "
+                                 f"but the stream is {rate} Hz x {channels} channel(s)")
+        if kwargs.get("output") and self.sink_path and self.sink_file is None:
+            self.sink_rate = kwargs["rate"]
+            self.sink_channels = kwargs.get("channels", 1)
+            self.sink_file = wave.open(self.sink_path, "wb")
+            self.sink_file.setnchannels(self.sink_channels)
+            self.sink_file.setsampwidth(SAMPLE_WIDTH)
+            self.sink_file.setframerate(self.sink_rate)
+        return super().open(**kwargs)
+
+    def sink(self, data, plays_at):
+        if self.sink_file is None:
+            return
+        if self.sink_clock is not None and plays_at > self.sink_clock:
+            gap = int((plays_at - self.sink_clock) * self.sink_rate) * self.sink_channels
+            self.sink_file.writeframes(bytes(gap * SAMPLE_WIDTH))
+        self.sink_file.writeframes(data)
+        self.sink_clock = plays_at + len(data) // (SAMPLE_WIDTH * self.sink_channels) / self.sink_rate
+
+    def terminate(self):
+        if self.sink_file is not None:
+            self.sink_file.close()
+            self.sink_file = None
+
+
+class LoopbackBackend(SimulatedBackend):
+    """Whatever is played comes back out of the microphone (silence when nothing is queued)."""
+
+    def __init__(self, max_bytes=1 << 18):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.max_bytes = max_bytes
+
+    def source(self, samples, captured_at):
+        size = samples * SAMPLE_WIDTH
+        with self.lock:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data + bytes(size - len(data))
+
+    def sink(self, data, plays_at):
+        with self.lock:
+            self.buffer += data
+            # Nobody is listening: keep only the most recent audio
+            if len(self.buffer) > self.max_bytes:
+                del self.buffer[:len(self.buffer) - self.max_bytes]
@@ -0,0 +1,183 @@
+"""Shared helpers for the benchmark scripts in this directory."""
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# Make the application modules importable when a benchmark is run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+try:
+    import psutil
+except ImportError:  # psutil is optional, fall back to /proc on Linux
+    psutil = None
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+def summarize(values):
+    """Summarize a list of samples as count/mean/p50/p99/max."""
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+class ProcessSampler:
+    """Sample CPU usage and RSS of a process between calls to sample()."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._proc = psutil.Process(pid) if psutil else None
+        self._last_cpu = self._cpu_seconds()
+        self._last_wall = time.monotonic()
+
+    def _cpu_seconds(self):
+        if self._proc:
+            times = self._proc.cpu_times()
+            return times.user + times.system
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        return (int(fields[11]) + int(fields[12])) / ticks
+
+    def _rss_bytes(self):
+        if self._proc:
+            return self._proc.memory_info().rss
+        with open(f"/proc/{self.pid}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+
+    def sample(self):
+        """Return (cpu_percent, rss_mb) since the previous sample."""
+        cpu = self._cpu_seconds()
+        wall = time.monotonic()
+        elapsed = wall - self._last_wall
+        cpu_percent = 100.0 * (cpu - self._last_cpu) / elapsed if elapsed > 0 else 0.0
+        self._last_cpu = cpu
+        self._last_wall = wall
+        return cpu_percent, self._rss_bytes() / (1024 * 1024)
+
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width text table."""
+    widths = [len(h) for h in headers]
+    for row in rows:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], len(str(cell)))
+    line = "  ".join(h.rjust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for row in rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(row, widths)))
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_revision():
+    """Return the short git revision of the working tree, if available."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def save_results(name, metrics, label=None, path=None):
+    """Write metrics plus run metadata to a JSON file and return its path."""
+    revision = git_revision()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{label or revision}.json")
+    document = {
+        "benchmark": name,
+        "label": label or revision,
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": metrics,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(path):
+    """Load a results file written by save_results()."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def flatten_metrics(metrics, prefix=""):
+    """Flatten nested metric dicts into {"a.b.c": number}."""
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """Print metrics side by side, flagging changes larger than threshold."""
+    old = flatten_metrics(baseline["metrics"])
+    new = flatten_metrics(current["metrics"])
+    rows = []
+    for key in sorted(set(old) & set(new)):
+        before, after = old[key], new[key]
+        change = (after - before) / before if before else 0.0
+        flag = "!" if abs(change) > threshold else ""
+        rows.append([key, f"{before:.4g}", f"{after:.4g}", f"{change * 100:+.1f}%", flag])
+    print(f"Comparing {baseline['label']} -> {current['label']}")
+    print_table(["metric", baseline["label"], current["label"], "change", ""], rows)
+
+
+@contextmanager
+def virtual_display(size="1600x900x24"):
+    """Run the body with DISPLAY pointing at a private Xvfb if none is set.
+
+    Exits the benchmark with a message when there is neither a display nor
+    Xvfb (e.g. ``apt install xvfb``).
+    """
+    if os.environ.get("DISPLAY"):
+        yield os.environ["DISPLAY"]
+        return
+    if not shutil.which("Xvfb"):
+        raise SystemExit("This benchmark needs a display: set DISPLAY or install Xvfb")
+    display = ":%d" % random.randint(100, 999)
+    proc = subprocess.Popen(["Xvfb", display, "-screen", "0", size, "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    try:
+        time.sleep(0.5)
+        if proc.poll() is not None:
+            raise SystemExit("Xvfb failed to start")
+        yield display
+    finally:
+        del os.environ["DISPLAY"]
+        proc.terminate()
+        proc.wait(timeout=5)
@@ -0,0 +1,369 @@
+"""Synthetic classroom load generator and end-to-end latency benchmark.
+
+Starts the whiteboard server headlessly in a child process and connects N
+simulated students to it over Socket.IO on localhost. Every student joins,
+is auto-approved, registers a viewport and listens for
+``coordinate_update`` and ``change_page``; a few of them stream
+``send_coordinates`` while a teacher proxy flips pages. For each class size the benchmark reports:
+
+* connect time (connect() until ``connection_approved`` arrives)
+* p50/p99 stroke fan-out latency (``send_coordinates`` -> ``coordinate_update``)
+* p50/p99 page-flip delivery time (server emit -> ``change_page`` received)
+* server CPU and RSS
+
+With ``--classrooms N`` the server hosts N classrooms at once (the default
+namespace plus ``/class/room2`` ...), each with its own students, writers
+and page flips, and the worst classroom's p99 is reported alongside the
+overall figures. ``--page-source pdf`` loads the same generated PDF into
+every classroom and flips real pages, so the shared page cache is
+exercised; its hit rate is read from ``/api/classrooms``.
+
+Usage:
+    python benchmarks/classroom_load.py --students 5 20 50 --duration 10
+    python benchmarks/classroom_load.py --students 30 --json results.json
+    python benchmarks/classroom_load.py --students 20 --classrooms 4 --page-source pdf
+
+Requires python-socketio (client) in addition to the server dependencies;
+psutil is used for process stats when installed.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import ProcessSampler, print_table, summarize
+
+
+def find_free_port():
+    """Ask the OS for a free localhost TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --------------------------------------------------------------------------
+# Server side (runs in the child process)
+# --------------------------------------------------------------------------
+
+def classroom_namespace(index):
+    """Namespace of the index-th benchmark classroom (the first is the default one)."""
+    return "/" if index == 0 else f"/class/room{index + 1}"
+
+
+def serve(port, num_classrooms=1, pdf_path=None):
+    """Run the whiteboard server with auto-approval and benchmark hooks."""
+    from server import app, classrooms, session, socketio
+
+    rooms = [session] + [classrooms.create(f"room{i + 1}") for i in range(1, num_classrooms)]
+    pdf_bytes = None
+    if pdf_path:
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+    for room in rooms:
+        room.auto_approve = True
+        if pdf_bytes:
+            room.load_pdf_bytes(pdf_bytes, os.path.basename(pdf_path))
+        register_bench_handlers(socketio, room)
+
+    socketio.run(app, host="127.0.0.1", port=port, debug=False,
+                 log_output=False, allow_unsafe_werkzeug=True)
+
+
+def register_bench_handlers(socketio, room):
+    """Benchmark-only events for one classroom, on its namespace."""
+
+    def bench_change_page(data):
+        # Stand-in for the teacher flipping a PDF page
+        payload = base64.b64encode(os.urandom(int(data.get("size", 0)))).decode("utf-8")
+        socketio.emit("change_page", {
+            "page_image": payload,
+            "page_number": data.get("page_number", 0),
+            "canvas_width": 1654,
+            "canvas_height": 2339,
+            "sent_at": time.time(),
+        }, namespace=room.namespace)
+
+    def bench_goto_page(data):
+        # A real page flip, rendered through the shared page cache
+        if room.total_pages:
+            room.goto_page(int(data.get("page_number", 0)) % room.total_pages)
+
+    socketio.on("bench_change_page", namespace=room.namespace)(bench_change_page)
+    socketio.on("bench_goto_page", namespace=room.namespace)(bench_goto_page)
+
+
+def start_server(port, num_classrooms=1, pdf_path=None):
+    """Spawn the headless server and wait until it answers HTTP."""
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--classrooms", str(num_classrooms)]
+    if pdf_path:
+        command += ["--pdf", pdf_path]
+    proc = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    # Loading and rendering the PDF in every classroom takes a moment
+    deadline = time.time() + 20 + (5 if pdf_path else 0)
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("Benchmark server did not come up in time")
+
+
+# --------------------------------------------------------------------------
+# Client side
+# --------------------------------------------------------------------------
+
+class SimulatedStudent:
+    """A headless student client that records delivery latencies."""
+
+    def __init__(self, url, transports=None, namespace="/", flip_times=None):
+        import socketio as socketio_client
+
+        self.url = url
+        self.transports = transports
+        self.namespace = namespace
+        # {(namespace, page number): time the teacher asked for it}, for real
+        # page flips whose change_page event carries no send time
+        self.flip_times = flip_times if flip_times is not None else {}
+        self.sio = socketio_client.Client(reconnection=False)
+        self.approved = threading.Event()
+        self.connect_time = None
+        self.stroke_latencies = []
+        self.page_latencies = []
+        self._connect_started = None
+
+        self.sio.on("connection_approved", self._on_approved, namespace=namespace)
+        self.sio.on("coordinate_update", self._on_coordinates, namespace=namespace)
+        self.sio.on("change_page", self._on_change_page, namespace=namespace)
+
+    def connect(self):
+        self._connect_started = time.perf_counter()
+        self.sio.connect(self.url, transports=self.transports, namespaces=[self.namespace])
+        self.sio.emit("join", namespace=self.namespace)
+
+    def _on_approved(self, *args):
+        self.connect_time = time.perf_counter() - self._connect_started
+        self.sio.emit("register_viewport", {"width": 1280, "height": 720}, namespace=self.namespace)
+        self.approved.set()
+
+    def _on_coordinates(self, data):
+        sent_at = data.get("sent_at")
+        if sent_at is not None:
+            self.stroke_latencies.append(time.time() - sent_at)
+
+    def _on_change_page(self, data):
+        sent_at = data.get("sent_at")
+        if sent_at is None:
+            sent_at = self.flip_times.get((self.namespace, data.get("page_number")))
+        if sent_at is not None:
+            self.page_latencies.append(time.time() - sent_at)
+
+    def stream_strokes(self, rate, duration):
+        """Emit a synthetic pen stroke at rate points per second."""
+        interval = 1.0 / rate
+        end = time.perf_counter() + duration
+        x, y = random.random(), random.random()
+        is_start = True
+        count = 0
+        while time.perf_counter() < end:
+            x = min(1.0, max(0.0, x + random.uniform(-0.01, 0.01)))
+            y = min(1.0, max(0.0, y + random.uniform(-0.01, 0.01)))
+            self.sio.emit("send_coordinates", {
+                "x": x,
+                "y": y,
+                "is_start": is_start,
+                "line_width": 3,
+                "pen_color": "red",
+                "sent_at": time.time(),
+            }, namespace=self.namespace)
+            count += 1
+            # Lift the pen every 50 points to start a new stroke
+            is_start = count % 50 == 0
+            time.sleep(interval)
+
+    def disconnect(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def fetch_cache_stats(url):
+    """Shared page cache counters from the server, or None."""
+    try:
+        with urllib.request.urlopen(f"{url}/api/classrooms", timeout=5) as response:
+            return json.load(response)["cache"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def run_scenario(num_students, args, pdf_path=None):
+    """Run one class size (per classroom) against a fresh server and return its metrics."""
+    import socketio as socketio_client
+
+    port = find_free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = start_server(port, args.classrooms, pdf_path)
+    transports = [args.transport] if args.transport else None
+    namespaces = [classroom_namespace(i) for i in range(args.classrooms)]
+    flip_times = {}
+    students = [SimulatedStudent(url, transports, namespace, flip_times)
+                for namespace in namespaces for _ in range(num_students)]
+    teacher = socketio_client.Client(reconnection=False)
+    try:
+        sampler = ProcessSampler(proc.pid)
+
+        with ThreadPoolExecutor(max_workers=args.connect_concurrency) as pool:
+            list(pool.map(lambda s: s.connect(), students))
+        deadline = time.time() + args.approve_timeout
+        for student in students:
+            student.approved.wait(max(0.0, deadline - time.time()))
+        approved = [s for s in students if s.approved.is_set()]
+        _, idle_rss = sampler.sample()
+
+        teacher.connect(url, transports=transports, namespaces=namespaces)
+
+        writers = [w for namespace in namespaces
+                   for w in [s for s in approved if s.namespace == namespace][:args.writers]]
+        threads = [threading.Thread(target=w.stream_strokes, args=(args.rate, args.duration))
+                   for w in writers]
+        for t in threads:
+            t.start()
+
+        page_end = time.perf_counter() + args.duration
+        page_number = 0
+        while time.perf_counter() < page_end:
+            time.sleep(args.page_interval)
+            page_number += 1
+            for namespace in namespaces:
+                if pdf_path:
+                    flip_times[(namespace, page_number % args.pdf_pages)] = time.time()
+                    teacher.emit("bench_goto_page", {"page_number": page_number}, namespace=namespace)
+                else:
+                    teacher.emit("bench_change_page", {"size": args.page_bytes, "page_number": page_number},
+                                 namespace=namespace)
+
+        for t in threads:
+            t.join()
+        # Give in-flight messages a moment to land
+        time.sleep(1.0)
+        cpu_percent, rss = sampler.sample()
+
+        stroke_latencies = [l for s in approved for l in s.stroke_latencies]
+        page_latencies = [l for s in approved for l in s.page_latencies]
+        per_classroom = {}
+        for namespace in namespaces:
+            members = [s for s in approved if s.namespace == namespace]
+            per_classroom[namespace] = {
+                "approved": len(members),
+                "stroke_fanout": summarize([l for s in members for l in s.stroke_latencies]),
+                "page_flip": summarize([l for s in members for l in s.page_latencies]),
+            }
+        return {
+            "students": num_students,
+            "classrooms": args.classrooms,
+            "page_source": args.page_source,
+            "approved": len(approved),
+            "connect": summarize([s.connect_time for s in approved]),
+            "stroke_fanout": summarize(stroke_latencies),
+            "page_flip": summarize(page_latencies),
+            "per_classroom": per_classroom,
+            "worst_stroke_p99": max(c["stroke_fanout"]["p99"] for c in per_classroom.values()),
+            "worst_page_p99": max(c["page_flip"]["p99"] for c in per_classroom.values()),
+            "page_cache": fetch_cache_stats(url),
+            "server_cpu_percent": cpu_percent,
+            "server_rss_mb_idle": idle_rss,
+            "server_rss_mb": rss,
+        }
+    finally:
+        for student in students:
+            student.disconnect()
+        try:
+            teacher.disconnect()
+        except Exception:
+            pass
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, nargs="+", default=[5, 10, 25, 50],
+                        help="class sizes to benchmark (students per classroom)")
+    parser.add_argument("--classrooms", type=int, default=1, help="classrooms hosted by the server")
+    parser.add_argument("--page-source", choices=["synthetic", "pdf"], default="synthetic",
+                        help="random page payloads, or real pages of a generated PDF")
+    parser.add_argument("--pdf-pages", type=int, default=10, help="pages in the generated PDF")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of drawing per run")
+    parser.add_argument("--writers", type=int, default=1, help="students streaming strokes")
+    parser.add_argument("--rate", type=float, default=60.0, help="stroke points per second per writer")
+    parser.add_argument("--page-interval", type=float, default=2.0, help="seconds between page flips")
+    parser.add_argument("--page-bytes", type=int, default=400_000, help="raw size of each page image")
+    parser.add_argument("--connect-concurrency", type=int, default=16)
+    parser.add_argument("--approve-timeout", type=float, default=30.0)
+    parser.add_argument("--transport", choices=["polling", "websocket"], default=None)
+    parser.add_argument("--json", help="write raw results to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=5000, help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.classrooms, args.pdf)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="classroom-load-")
+    try:
+        pdf_path = None
+        if args.page_source == "pdf":
+            from render_bench import generate_pdf
+
+            pdf_path = os.path.join(workdir, "slides.pdf")
+            generate_pdf(pdf_path, args.pdf_pages)
+        results = []
+        for num_students in args.students:
+            print(f"Running {args.classrooms} classroom(s) with {num_students} students each...")
+            results.append(run_scenario(num_students, args, pdf_path))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ms = lambda v: f"{v * 1000:.1f}"
+
+    def hit_rate(cache):
+        if not cache or not cache["hits"] + cache["misses"]:
+            return "-"
+        return f"{100 * cache['hits'] / (cache['hits'] + cache['misses']):.0f}"
+
+    print_table(
+        ["rooms", "students", "approved", "connect p50", "connect p99", "stroke p50", "stroke p99",
+         "worst room p99", "page p50", "page p99", "worst room p99", "cache hit %", "cpu %", "rss MB"],
+        [[r["classrooms"], r["students"], r["approved"],
+          ms(r["connect"]["p50"]), ms(r["connect"]["p99"]),
+          ms(r["stroke_fanout"]["p50"]), ms(r["stroke_fanout"]["p99"]), ms(r["worst_stroke_p99"]),
+          ms(r["page_flip"]["p50"]), ms(r["page_flip"]["p99"]), ms(r["worst_page_p99"]),
+          hit_rate(r["page_cache"]),
+          f"{r['server_cpu_percent']:.0f}", f"{r['server_rss_mb']:.1f}"] for r in results],
+    )
+    print("(latencies in ms, students per classroom)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Eraser and lasso benchmark: grid-indexed hit tests against a linear scan.
+
+Fills a ``StrokeStore`` with short handwriting-like strokes spread over the
+page and reports, per page size:
+
+* eraser hit-test latency through the grid index and by scanning every
+  stroke, at random pointer positions
+* lasso selection latency for a rectangle-ish lasso covering ~5% of the page
+* cost of deleting the strokes found (store + index update)
+* per-point append cost with the index maintained
+
+Usage:
+    python benchmarks/hit_test.py --strokes 1000 10000 50000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _common import print_table, save_results, summarize
+from session import ERASER_RADIUS
+from spatial import polyline_distances
+from strokes import StrokeStore
+
+POINTS_PER_STROKE = 30
+QUERIES = 500
+
+
+def build_store(num_strokes, seed=5):
+    """Fill a store point by point, as the session does; returns (store, seconds)."""
+    rng = np.random.default_rng(seed)
+    starts = rng.random((num_strokes, 1, 2))
+    steps = rng.normal(0, 0.0015, size=(num_strokes, POINTS_PER_STROKE, 2))
+    coords = np.clip(starts + np.cumsum(steps, axis=1), 0, 1).tolist()
+    store = StrokeStore()
+    start = time.perf_counter()
+    for stroke in coords:
+        for i, (x, y) in enumerate(stroke):
+            store.add_point({"x": x, "y": y, "is_start": i == 0, "line_width": 3, "pen_color": "blue"}, "bench")
+    return store, time.perf_counter() - start
+
+
+def linear_hit_test(store, x, y, radius):
+    """Reference eraser without the index: bounding box then exact test on every stroke."""
+    hits = []
+    for stroke in store:
+        points = stroke.as_array()
+        if (points[:, 0].min() - radius <= x <= points[:, 0].max() + radius
+                and points[:, 1].min() - radius <= y <= points[:, 1].max() + radius
+                and polyline_distances([points], x, y)[0] <= radius):
+            hits.append(stroke.id)
+    return hits
+
+
+def lasso(cx, cy, size, vertices=24):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    # A squircle-ish loop, as a hand-drawn lasso would be
+    r = size / 2 / np.maximum(np.abs(np.cos(angles)), np.abs(np.sin(angles))) ** 0.3
+    return list(zip((cx + r * np.cos(angles)).tolist(), (cy + r * np.sin(angles)).tolist()))
+
+
+def timed_calls(fn, args_list):
+    latencies, results = [], []
+    for args in args_list:
+        start = time.perf_counter()
+        results.append(fn(*args))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def bench(num_strokes, linear_queries):
+    store, build_s = build_store(num_strokes)
+    rng = np.random.default_rng(11)
+    probes = [(float(x), float(y), ERASER_RADIUS) for x, y in rng.random((QUERIES, 2))]
+
+    grid_lat, grid_hits = timed_calls(store.hit_test, probes)
+    linear_lat, linear_hits = timed_calls(lambda x, y, r: linear_hit_test(store, x, y, r), probes[:linear_queries])
+    mismatches = sum(sorted(a) != sorted(b) for a, b in zip(grid_hits, linear_hits))
+
+    lassos = [(lasso(float(x), float(y), 0.22),) for x, y in rng.uniform(0.15, 0.85, (QUERIES // 5, 2))]
+    lasso_lat, selections = timed_calls(store.select_polygon, lassos)
+
+    erase_lat, _ = timed_calls(store.remove, [(hits,) for hits in grid_hits if hits])
+    return {
+        "strokes": num_strokes,
+        "append_us_per_point": build_s / (num_strokes * POINTS_PER_STROKE) * 1e6,
+        "hit_test_us": summarize([l * 1e6 for l in grid_lat]),
+        "linear_hit_test_us": summarize([l * 1e6 for l in linear_lat]),
+        "hits_per_probe": sum(len(h) for h in grid_hits) / len(grid_hits),
+        "mismatches": mismatches,
+        "lasso_us": summarize([l * 1e6 for l in lasso_lat]),
+        "selected_per_lasso": sum(len(s) for s in selections) / len(selections),
+        "erase_us": summarize([l * 1e6 for l in erase_lat]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--strokes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--linear-queries", type=int, default=50,
+                        help="probes to run through the unindexed scan (it is slow)")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    results = [bench(n, args.linear_queries) for n in args.strokes]
+    rows = []
+    for r in results:
+        rows.append([
+            r["strokes"], f"{r['append_us_per_point']:.2f}",
+            f"{r['hit_test_us']['p50']:.0f}", f"{r['hit_test_us']['p99']:.0f}",
+            f"{r['linear_hit_test_us']['p50']:.0f}",
+            f"{r['lasso_us']['p50']:.0f}", f"{r['lasso_us']['p99']:.0f}",
+            f"{r['selected_per_lasso']:.0f}", f"{r['erase_us']['p50']:.0f}", r["mismatches"],
+        ])
+    print(f"{POINTS_PER_STROKE} points per stroke, eraser radius {ERASER_RADIUS}")
+    print_table(["strokes", "append us/pt", "erase hit p50 us", "p99 us", "linear p50 us",
+                 "lasso p50 us", "p99 us", "selected", "delete p50 us", "mismatches"], rows)
+    path = save_results("hit-test", results, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Session recording benchmark: hot-path cost, size on disk and replay speed.
+
+Drives a ``WhiteboardSession`` (with Socket.IO emits going nowhere, so only
+the session and recorder are measured) with synthetic pen strokes, page
+clears and voice frames, and reports:
+
+* ``add_point`` latency with and without a recorder attached
+* bytes per pen sample on disk, against the JSON the live path sends
+* how far the writer thread lags (largest queue seen)
+* replay throughput at unlimited speed and seek time into the middle of
+  the recording, with a headless target that only counts events
+
+Before measuring, a short session (API stroke batches, one without a
+style, then an erase) is recorded and replayed into a fresh session, and
+the benchmark stops if the replayed ink differs from the live ink.
+
+Usage:
+    python benchmarks/recording.py --points 200000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from _common import print_table, save_results, summarize
+from recorder import RECORD_HEADER, Recording, SessionRecorder, SessionTarget
+from session import WhiteboardSession
+from voice_chat import CHUNK, FRAME_DURATION, ImaAdpcmCodec
+
+POINTS_PER_STROKE = 50
+CLEAR_EVERY = 5000  # points
+
+
+class NullSocketIO:
+    """Socket.IO stand-in that drops every emit."""
+
+    def emit(self, *args, **kwargs):
+        pass
+
+
+class CountingTarget:
+    """Headless replay target that only counts what it is given."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def _count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def document(self, name, pdf_bytes):
+        self._count("document")
+
+    def page(self, page_number, total_pages, digest):
+        self._count("page")
+
+    def point(self, data, origin):
+        self._count("point")
+
+    def erase(self, stroke_numbers):
+        self._count("erase")
+
+    def clear_annotations(self):
+        self._count("clear")
+
+    def clear_all(self):
+        self._count("clear_all")
+
+    def audio(self, pcm):
+        self._count("audio")
+
+
+def make_points(count, seed=0):
+    rng = random.Random(seed)
+    points = []
+    for i in range(count):
+        points.append({
+            "x": rng.random(), "y": rng.random(),
+            "is_start": i % POINTS_PER_STROKE == 0,
+            "line_width": 3, "pen_color": rng.choice(("blue", "red", "#00aa00")),
+        })
+    return points
+
+
+def drive(session, points, recorder=None, audio_every=None):
+    """Feed points (and clears / audio) into the session; return add_point latencies."""
+    latencies = []
+    silence = bytes(CHUNK * 2)
+    for i, point in enumerate(points):
+        start = time.perf_counter()
+        session.add_point(point, origin="student-1" if i % 3 else "teacher")
+        latencies.append(time.perf_counter() - start)
+        if i and i % CLEAR_EVERY == 0:
+            session.clear_annotations()
+        if recorder and audio_every and i % audio_every == 0:
+            recorder.record_audio(silence)
+    return latencies
+
+
+def check_round_trip(tmp):
+    """Record strokes sent as API batches plus an erase, replay them, compare the ink.
+
+    Returns a list of differences (empty when replay matches the live session).
+    """
+    path = os.path.join(tmp, "round-trip.wbrec")
+    live = WhiteboardSession(NullSocketIO())
+    recorder = SessionRecorder(path, live)
+    recorder.start()
+    strokes = []
+    for n, style in enumerate(({"pen_color": "red"}, {"pen_color": "red"}, {"pen_color": "green"}, {})):
+        # Like POST /api/strokes: no is_start, the batch is closed with end_stroke;
+        # the last one leaves the style to the defaults
+        batch = [dict(style, x=0.1 * n, y=0.1 * i) for i in range(2)]
+        for point in batch:
+            stroke_id = live.add_point(point, origin="api")
+        live.end_stroke(origin="api")
+        strokes.append(stroke_id)
+    live.erase_strokes([strokes[1]])
+    recorder.stop()
+
+    replayed = WhiteboardSession(NullSocketIO())
+    Recording(path).replay(SessionTarget(replayed), speed=float("inf"), audio=False)
+    want = [[(p["x"], p["y"], p["pen_color"], p["line_width"]) for p in stroke] for stroke in live.get_strokes()]
+    got = [[(p["x"], p["y"], p["pen_color"], p["line_width"]) for p in stroke] for stroke in replayed.get_strokes()]
+    return [] if want == got else [f"live ink {want}", f"replayed ink {got}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--audio-every", type=int, default=10,
+                        help="record one voice frame every N points (0 to disable)")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        differences = check_round_trip(tmp)
+    if differences:
+        raise SystemExit("Replay does not reproduce the live session:\n  " + "\n  ".join(differences))
+    print("Round trip (API batches + erase): replay matches the live session")
+
+    points = make_points(args.points)
+    baseline = drive(WhiteboardSession(NullSocketIO()), points)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lecture.wbrec")
+        session = WhiteboardSession(NullSocketIO())
+        recorder = SessionRecorder(path, session)
+        recorder.start()
+        max_queue = 0
+        recorded = []
+        for start in range(0, len(points), 1000):
+            recorded += drive(session, points[start:start + 1000], recorder, args.audio_every)
+            max_queue = max(max_queue, len(recorder.pending))
+        recorder.stop()
+        stats = recorder.stats()
+        size = os.path.getsize(path)
+
+        recording = Recording(path)
+        target = CountingTarget()
+        start = time.perf_counter()
+        recording.replay(target, speed=float("inf"), audio=True)
+        replay_s = time.perf_counter() - start
+        replayed = sum(target.counts.values())
+
+        seek_target = CountingTarget()
+        start = time.perf_counter()
+        recording.replay(seek_target, speed=float("inf"), start=recording.duration / 2, audio=False)
+        seek_s = time.perf_counter() - start
+
+    audio_frames = args.points // args.audio_every if args.audio_every else 0
+    # Record header + codec id + ADPCM frame, to count the ink on its own
+    audio_bytes = RECORD_HEADER.size + 1 + len(ImaAdpcmCodec().encode(bytes(CHUNK * 2)))
+    json_bytes = sum(len(json.dumps(p)) for p in points) / len(points)
+    metrics = {
+        "add_point_us": summarize([l * 1e6 for l in baseline]),
+        "add_point_recording_us": summarize([l * 1e6 for l in recorded]),
+        "max_writer_queue": max_queue,
+        "file_bytes": size,
+        "bytes_per_point": (size - audio_frames * audio_bytes) / len(points),
+        "json_bytes_per_point": json_bytes,
+        "chunks": stats["chunks"],
+        "replay_events_per_s": replayed / replay_s,
+        "replayed_points": target.counts.get("point", 0),
+        "seek_middle_s": seek_s,
+        "audio_seconds": audio_frames * FRAME_DURATION,
+    }
+
+    base, rec = metrics["add_point_us"], metrics["add_point_recording_us"]
+    print_table(["", "p50 us", "p99 us", "max us"], [
+        ["add_point", f"{base['p50']:.2f}", f"{base['p99']:.2f}", f"{base['max']:.0f}"],
+        ["add_point + recorder", f"{rec['p50']:.2f}", f"{rec['p99']:.2f}", f"{rec['max']:.0f}"],
+    ])
+    print()
+    print(f"{len(points)} points and {audio_frames} voice frames -> {size / 1024:.0f} KB in "
+          f"{stats['chunks']} chunks, ~{metrics['bytes_per_point']:.1f} bytes/point "
+          f"(JSON: {json_bytes:.0f}), writer queue peaked at {max_queue}")
+    print(f"Replay: {metrics['replay_events_per_s']:.0f} events/s, "
+          f"{metrics['replayed_points']} points; seek to the middle: {seek_s * 1000:.0f} ms")
+    path = save_results("recording", metrics, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Rendering microbenchmarks for the whiteboard draw path.
+
+Drives a real ``CollaborativeWhiteboard`` and so needs a display: without
+DISPLAY it starts a private Xvfb, which must be installed (it exits with a
+message otherwise). It measures the hot paths:
+
+* ``draw``                 local pen strokes from synthetic mouse events
+* ``draw_point``           remote points as delivered by the server
+* ``process_coordinates``  draining the coordinate queue in batches
+* ``clear_annotations``    clearing a page full of ink
+* ``render_pdf_page``      rasterizing pages of a generated PDF
+* ``lecture``              a long lecture's worth of ink through the session,
+                           with and without flattening old ink into the page
+* ``resize``               re-fitting an inked page to new window sizes (bulk
+                           remap + off-thread rescale) against redrawing
+                           every point
+
+For each it records per-event cost, the Tk canvas item count and the
+distribution of frame times (one ``update()`` after every batch of events).
+Results are written to ``benchmarks/results/render-<label>.json`` and can be
+compared against an earlier run:
+
+    python benchmarks/render_bench.py --label before
+    python benchmarks/render_bench.py --label after --compare benchmarks/results/render-before.json
+
+Stroke traces can be replayed from a JSON-lines file of ``coordinate_update``
+payloads (``{"x": .., "y": .., "is_start": ..}``) with ``--trace``.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from _common import (compare_results, load_results, print_table, save_results, summarize,
+                     virtual_display)
+
+
+class FakeEvent:
+    """Minimal stand-in for a Tk mouse event."""
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def synthetic_strokes(num_strokes, points_per_stroke, seed=1):
+    """Generate smooth random strokes as lists of normalized (x, y) points."""
+    rng = random.Random(seed)
+    strokes = []
+    for _ in range(num_strokes):
+        x, y = rng.uniform(0.1, 0.9), rng.uniform(0.1, 0.9)
+        heading = rng.uniform(0, 2 * math.pi)
+        points = []
+        for _ in range(points_per_stroke):
+            heading += rng.uniform(-0.3, 0.3)
+            x = min(1.0, max(0.0, x + 0.004 * math.cos(heading)))
+            y = min(1.0, max(0.0, y + 0.004 * math.sin(heading)))
+            points.append((x, y))
+        strokes.append(points)
+    return strokes
+
+
+def load_trace(path):
+    """Load a recorded trace of coordinate payloads into strokes."""
+    strokes = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("is_start", False) or not strokes:
+                strokes.append([])
+            strokes[-1].append((data["x"], data["y"]))
+    return strokes
+
+
+def generate_pdf(path, num_pages):
+    """Write a PDF with text and vector content on every page."""
+    import fitz
+
+    doc = fitz.open()
+    for page_num in range(num_pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 72), f"Benchmark page {page_num + 1}", fontsize=24)
+        for line in range(40):
+            page.insert_text((72, 110 + line * 17), "Lorem ipsum dolor sit amet " * 3, fontsize=10)
+        for i in range(20):
+            rect = fitz.Rect(60 + i * 24, 600, 80 + i * 24, 600 + (i * 7) % 160)
+            page.draw_rect(rect, color=(0.1, 0.2, 0.7), fill=(0.6, 0.7, 0.9))
+    doc.save(path)
+    doc.close()
+
+
+class FrameTimer:
+    """Collect per-batch timings of the Tk event loop."""
+
+    def __init__(self, root):
+        self.root = root
+        self.frame_times = []
+
+    def frame(self):
+        start = time.perf_counter()
+        self.root.update_idletasks()
+        self.root.update()
+        self.frame_times.append(time.perf_counter() - start)
+
+
+def item_count(whiteboard):
+    return len(whiteboard.canvas.find_all())
+
+
+def bench_draw(whiteboard, strokes, batch):
+    """Feed synthetic mouse events through start_draw/draw/stop_draw."""
+    timer = FrameTimer(whiteboard.root)
+    costs = []
+    pending = 0
+    for stroke in strokes:
+        events = [FakeEvent(int(x * whiteboard.image_width + whiteboard.x_offset),
+                            int(y * whiteboard.image_height + whiteboard.y_offset))
+                  for x, y in stroke]
+        whiteboard.start_draw(events[0])
+        for event in events[1:]:
+            start = time.perf_counter()
+            whiteboard.draw(event)
+            costs.append(time.perf_counter() - start)
+            pending += 1
+            if pending >= batch:
+                timer.frame()
+                pending = 0
+        whiteboard.stop_draw(events[-1])
+    timer.frame()
+    return costs, timer.frame_times
+
+
+def bench_draw_point(whiteboard, strokes, batch):
+    """Call draw_point directly, as for remote ink."""
+    timer = FrameTimer(whiteboard.root)
+    costs = []
+    pending = 0
+    for stroke in strokes:
+        for i, (x, y) in enumerate(stroke):
+            start = time.perf_counter()
+            whiteboard.draw_point(x, y, i == 0, 3, "red")
+            costs.append(time.perf_counter() - start)
+            pending += 1
+            if pending >= batch:
+                timer.frame()
+                pending = 0
+    timer.frame()
+    return costs, timer.frame_times
+
+
+def bench_process_coordinates(whiteboard, strokes, batch):
+    """Queue points in batches and time one process_coordinates drain each."""
+    timer = FrameTimer(whiteboard.root)
+    costs = []
+    points = [{"x": x, "y": y, "is_start": i == 0, "line_width": 3, "pen_color": "green"}
+              for stroke in strokes for i, (x, y) in enumerate(stroke)]
+    for offset in range(0, len(points), batch):
+        chunk = points[offset:offset + batch]
+        for data in chunk:
+            whiteboard.event_queue.put(("point", {"data": data, "origin": "bench"}))
+        start = time.perf_counter()
+        whiteboard.process_coordinates()
+        costs.append((time.perf_counter() - start) / len(chunk))
+        timer.frame()
+    return costs, timer.frame_times
+
+
+def bench_clear(whiteboard):
+    """Time clear_annotations with the current amount of ink on the canvas."""
+    items = item_count(whiteboard)
+    start = time.perf_counter()
+    whiteboard.clear_annotations()
+    whiteboard.root.update()
+    return time.perf_counter() - start, items
+
+
+def bench_lecture(whiteboard, strokes, num_strokes, batch, flatten):
+    """Draw num_strokes strokes through the session, as a long lecture would."""
+    from server import session
+
+    whiteboard.flatten_var.set(flatten)
+    session.clear_annotations()
+    whiteboard.apply_session_events()
+    timer = FrameTimer(whiteboard.root)
+    peak = 0
+    for n in range(num_strokes):
+        for i, (x, y) in enumerate(strokes[n % len(strokes)]):
+            session.add_point({"x": x, "y": y, "is_start": i == 0, "line_width": 3, "pen_color": "purple"},
+                              origin="lecture")
+        session.end_stroke(origin="lecture")
+        if n % max(1, batch // 5) == 0:
+            # What process_coordinates does on every tick
+            whiteboard.apply_session_events()
+            whiteboard.maybe_flatten()
+            timer.frame()
+            peak = max(peak, item_count(whiteboard))
+    if whiteboard.ink_baker.thread:
+        whiteboard.ink_baker.thread.join()
+    whiteboard.apply_session_events()
+    timer.frame()
+    clear_time, items = bench_clear(whiteboard)
+    return {"frame_s": summarize(timer.frame_times), "peak_items": peak, "final_items": items,
+            "clear_s": clear_time}
+
+
+def bench_resize(whiteboard, strokes, steps):
+    """Resize an inked page repeatedly; time the Tk-thread cost and the rescaled page's arrival."""
+    from server import session
+
+    session.goto_page(0)
+    whiteboard.flatten_var.set(False)
+    whiteboard.clear_annotations()
+    whiteboard.apply_session_events()
+    for stroke in strokes:
+        for i, (x, y) in enumerate(stroke):
+            whiteboard.draw_point(x, y, i == 0, 3, "red")
+    whiteboard.root.update()
+    items = item_count(whiteboard)
+
+    base_width, base_height = whiteboard.canvas_width, whiteboard.canvas_height
+    remap_costs, ready_times = [], []
+    for step in range(steps):
+        # Alternate between a narrower and a shorter window, as a drag would
+        factor = 0.6 + 0.4 * (step % 5) / 4
+        width, height = (int(base_width * factor), base_height) if step % 2 else (base_width, int(base_height * factor))
+        start = time.perf_counter()
+        whiteboard.resize_canvas(width, height)
+        remap_costs.append(time.perf_counter() - start)
+        while whiteboard.rescale_pending:
+            whiteboard.apply_session_events()
+            time.sleep(0.001)
+        ready_times.append(time.perf_counter() - start)
+        whiteboard.root.update()
+
+    # Reference: re-fitting by clearing and redrawing every point at the new size
+    start = time.perf_counter()
+    whiteboard.canvas.delete("annotation")
+    for stroke in strokes:
+        for i, (x, y) in enumerate(stroke):
+            whiteboard.draw_point(x, y, i == 0, 3, "red")
+    whiteboard.root.update()
+    redraw = time.perf_counter() - start
+    whiteboard.resize_canvas(base_width, base_height)
+    return {"items": items, "remap_s": summarize(remap_costs), "page_ready_s": summarize(ready_times),
+            "redraw_s": redraw}
+
+
+def bench_render_pdf(whiteboard, pdf_path, num_pages):
+    """Render every page of the generated PDF."""
+    from server import session
+
+    session.load_pdf(pdf_path)
+    timer = FrameTimer(whiteboard.root)
+    costs = []
+    for page_num in range(num_pages):
+        start = time.perf_counter()
+        whiteboard.render_pdf_page(page_num)
+        costs.append(time.perf_counter() - start)
+        timer.frame()
+    return costs, timer.frame_times
+
+
+def run(args):
+    from tkinter import Tk
+    from whiteboard import CollaborativeWhiteboard
+
+    if args.trace:
+        strokes = load_trace(args.trace)
+    else:
+        strokes = synthetic_strokes(args.strokes, args.points)
+    total_points = sum(len(s) for s in strokes)
+
+    workdir = tempfile.mkdtemp(prefix="render-bench-")
+    pdf_path = os.path.join(workdir, "bench.pdf")
+    generate_pdf(pdf_path, args.pages)
+
+    root = Tk()
+    root.geometry("1600x900")
+    whiteboard = CollaborativeWhiteboard(root, "127.0.0.1")
+    root.update()
+    metrics = {"points": total_points, "strokes": len(strokes)}
+    try:
+        costs, frames = bench_render_pdf(whiteboard, pdf_path, args.pages)
+        metrics["render_pdf_page"] = {"per_page_s": summarize(costs), "frame_s": summarize(frames)}
+
+        costs, frames = bench_draw(whiteboard, strokes, args.batch)
+        metrics["draw"] = {"per_event_s": summarize(costs), "frame_s": summarize(frames),
+                           "items": item_count(whiteboard)}
+        clear_time, items = bench_clear(whiteboard)
+        metrics["clear_after_draw"] = {"seconds": clear_time, "items": items}
+
+        costs, frames = bench_draw_point(whiteboard, strokes, args.batch)
+        metrics["draw_point"] = {"per_event_s": summarize(costs), "frame_s": summarize(frames),
+                                 "items": item_count(whiteboard)}
+        clear_time, items = bench_clear(whiteboard)
+        metrics["clear_after_draw_point"] = {"seconds": clear_time, "items": items}
+
+        costs, frames = bench_process_coordinates(whiteboard, strokes, args.batch)
+        metrics["process_coordinates"] = {"per_point_s": summarize(costs), "frame_s": summarize(frames),
+                                          "items": item_count(whiteboard)}
+        clear_time, items = bench_clear(whiteboard)
+        metrics["clear_annotations"] = {"seconds": clear_time, "items": items}
+
+        for name, flatten in (("lecture", False), ("lecture_flattened", True)):
+            metrics[name] = bench_lecture(whiteboard, strokes, args.lecture_strokes, args.batch, flatten)
+
+        metrics["resize"] = bench_resize(whiteboard, strokes, args.resize_steps)
+    finally:
+        whiteboard.cleanup()
+        root.destroy()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return metrics
+
+
+def report(metrics):
+    us = lambda v: f"{v * 1e6:.1f}"
+    ms = lambda v: f"{v * 1e3:.2f}"
+    rows = []
+    for name, key in (("render_pdf_page", "per_page_s"), ("draw", "per_event_s"),
+                      ("draw_point", "per_event_s"), ("process_coordinates", "per_point_s")):
+        cost, frames = metrics[name][key], metrics[name]["frame_s"]
+        rows.append([name, us(cost["p50"]), us(cost["p99"]), ms(frames["p50"]), ms(frames["p99"]),
+                     metrics[name].get("items", "")])
+    print_table(["path", "cost p50 us", "cost p99 us", "frame p50 ms", "frame p99 ms", "items"], rows)
+    for name in ("clear_after_draw", "clear_after_draw_point", "clear_annotations"):
+        print(f"{name}: {ms(metrics[name]['seconds'])} ms for {metrics[name]['items']} items")
+    print()
+    rows = []
+    for name in ("lecture", "lecture_flattened"):
+        lecture = metrics[name]
+        rows.append([name, ms(lecture["frame_s"]["p50"]), ms(lecture["frame_s"]["p99"]),
+                     lecture["peak_items"], lecture["final_items"], ms(lecture["clear_s"])])
+    print_table(["path", "frame p50 ms", "frame p99 ms", "peak items", "final items", "clear ms"], rows)
+    print()
+    resize = metrics["resize"]
+    print(f"resize with {resize['items']} items: remap p50 {ms(resize['remap_s']['p50'])} ms, "
+          f"p99 {ms(resize['remap_s']['p99'])} ms; page ready p50 {ms(resize['page_ready_s']['p50'])} ms; "
+          f"full redraw {ms(resize['redraw_s'])} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--strokes", type=int, default=200, help="synthetic strokes to draw")
+    parser.add_argument("--points", type=int, default=50, help="points per synthetic stroke")
+    parser.add_argument("--trace", help="JSON-lines file of recorded coordinate payloads")
+    parser.add_argument("--pages", type=int, default=10, help="pages in the generated PDF")
+    parser.add_argument("--batch", type=int, default=20, help="events between frame updates")
+    parser.add_argument("--lecture-strokes", type=int, default=2000,
+                        help="strokes drawn in the long-lecture scenario")
+    parser.add_argument("--resize-steps", type=int, default=20, help="window sizes in the resize scenario")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    parser.add_argument("--output", help="explicit results path")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    with virtual_display():
+        metrics = run(args)
+    report(metrics)
+    path = save_results("render", metrics, label=args.label, path=args.output)
+    print(f"Results written to {path}")
+    if args.compare:
+        compare_results(load_results(args.compare), load_results(path))
+
+
+if __name__ == "__main__":
+    main()
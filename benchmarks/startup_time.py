@@ -0,0 +1,150 @@
+"""Startup-time benchmark for the teacher app.
+
+Measures, from process launch:
+
+* time until the Tk window is mapped
+* time until the HTTP server answers
+* time until the voice server is listening
+* which heavy optional modules (fitz, pyaudio, PIL) were already imported
+  when the window appeared -- they should only load on first use
+
+and prints a ``-X importtime`` breakdown of the startup imports, heaviest
+first. Needs a display: without DISPLAY it starts a private Xvfb, which
+must be installed (it exits with a message otherwise).
+
+Usage:
+    python benchmarks/startup_time.py --runs 5 --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from _common import REPO_ROOT, print_table, save_results, summarize, virtual_display
+
+HEAVY_MODULES = ("fitz", "pyaudio", "PIL", "flask", "flask_socketio", "engineio")
+
+
+def child(port):
+    """Mimic main.py startup and report milestones as JSON lines on stdout."""
+    import threading
+
+    def report(event, **extra):
+        print(json.dumps(dict(event=event, t=time.time(), **extra)), flush=True)
+
+    from server import app, socketio
+    threading.Thread(
+        target=lambda: socketio.run(app, host="127.0.0.1", port=port, debug=False,
+                                    log_output=False, allow_unsafe_werkzeug=True),
+        daemon=True,
+    ).start()
+
+    from tkinter import Tk
+    from whiteboard import CollaborativeWhiteboard
+
+    root = Tk()
+    root.geometry("1200x700")
+    whiteboard = CollaborativeWhiteboard(root, "127.0.0.1")
+
+    def on_map(event):
+        if event.widget is root:
+            root.unbind("<Map>")
+            report("window", modules=[m for m in HEAVY_MODULES if m in sys.modules])
+
+    def wait_for_voice():
+        if whiteboard.voice_chat.server_socket is not None:
+            report("voice")
+            whiteboard.cleanup()
+            root.destroy()
+        else:
+            root.after(5, wait_for_voice)
+
+    root.bind("<Map>", on_map)
+    root.after(5, wait_for_voice)
+    root.mainloop()
+
+
+def measure_once(port):
+    """Launch one child and return milestone times relative to launch."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.time()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", "--port", str(port)],
+        stdout=subprocess.PIPE, text=True, env=env,
+    )
+    milestones = {}
+    # The HTTP server is polled from here so its readiness is measured externally
+    while "http" not in milestones and proc.poll() is None:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=0.2):
+                milestones["http"] = time.time() - started
+        except OSError:
+            time.sleep(0.005)
+    modules = []
+    for line in proc.stdout:
+        record = json.loads(line)
+        milestones[record["event"]] = record["t"] - started
+        modules = record.get("modules", modules)
+    proc.wait(timeout=30)
+    return milestones, modules
+
+
+def import_breakdown(top):
+    """Return the heaviest startup imports by cumulative time (us)."""
+    code = "import server, whiteboard"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Only top-level imports; nested ones are included in their parent's cumulative time
+        if name.startswith(" ") and not name.startswith("  "):
+            entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    entries.sort(key=lambda e: e[2], reverse=True)
+    return entries[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="imports to list in the breakdown")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.port)
+        return
+
+    with virtual_display():
+        runs = [measure_once(args.port) for _ in range(args.runs)]
+
+    metrics = {}
+    rows = []
+    for milestone in ("window", "http", "voice"):
+        values = [m[milestone] for m, _ in runs if milestone in m]
+        metrics[milestone + "_s"] = summarize(values)
+        stats = metrics[milestone + "_s"]
+        rows.append([milestone, f"{stats['p50'] * 1000:.0f}", f"{stats['max'] * 1000:.0f}"])
+    print_table(["milestone", "p50 ms", "max ms"], rows)
+    loaded = sorted({m for _, modules in runs for m in modules})
+    print(f"Heavy modules loaded before the window appeared: {', '.join(loaded) or 'none'}")
+
+    breakdown = import_breakdown(args.top)
+    print()
+    print_table(["module", "self ms", "cumulative ms"],
+                [[name, f"{s / 1000:.1f}", f"{c / 1000:.1f}"] for name, s, c in breakdown])
+
+    metrics["imports_ms"] = {name: c / 1000 for name, _, c in breakdown}
+    path = save_results("startup", metrics, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Stroke storage benchmark: packed StrokeStore against one dict per point.
+
+Builds the same synthetic ink both ways and reports, for each:
+
+* memory held (tracemalloc) and bytes per point
+* append throughput, one wire-format point at a time as the session does,
+  and in bulk for the packed store
+* serialization and deserialization time and size (JSON for the dicts,
+  ``StrokeStore.to_bytes`` for the packed store)
+* time to walk every point, and to take the newest tenth of the strokes
+
+Before measuring, malformed pen samples are fed to a store, and the
+benchmark stops unless each is rejected with the store left as it was.
+
+Usage:
+    python benchmarks/stroke_store.py --strokes 2000 --points 100
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from _common import print_table, save_results
+from strokes import StrokeStore
+
+
+def synthetic_points(num_strokes, points_per_stroke, seed=3):
+    """Return wire-format pen samples for smooth random strokes."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.002, size=(num_strokes, points_per_stroke, 2))
+    starts = rng.random((num_strokes, 1, 2))
+    coords = np.clip(starts + np.cumsum(steps, axis=1), 0, 1)
+    colors = ("blue", "red", "black", "#00aa00")
+    payloads = []
+    for s in range(num_strokes):
+        color = colors[s % len(colors)]
+        for p in range(points_per_stroke):
+            payloads.append({"x": float(coords[s, p, 0]), "y": float(coords[s, p, 1]),
+                             "is_start": p == 0, "line_width": 3, "pen_color": color})
+    return payloads, coords
+
+
+def check_malformed():
+    """Feed malformed samples between good ones; return what went wrong (empty if nothing)."""
+    good = [{"x": 0.1, "y": 0.1, "is_start": True}, {"x": 0.2, "y": 0.3}]
+    malformed = [
+        {"x": 0.5, "y": "a"}, {"x": "a", "y": 0.5, "is_start": True}, {"x": 0.5},
+        {"x": float("nan"), "y": 0.5}, {"x": 0.5, "y": 0.5, "line_width": "3"},
+        {"x": 0.5, "y": 0.5, "pen_color": None}, ["x", "y"], None,
+    ]
+    store = StrokeStore()
+    problems = []
+    store.add_point(good[0], "student")
+    for data in malformed:
+        try:
+            store.add_point(data, "student")
+            problems.append(f"accepted {data!r}")
+        except ValueError:
+            pass
+        except Exception as e:
+            problems.append(f"{data!r} raised {type(e).__name__}: {e}")
+    store.add_point(good[1], "student")
+    expected = StrokeStore()
+    expected.add_points(good, "student")
+    try:
+        if store.to_points() != expected.to_points():
+            problems.append(f"store holds {store.to_points()}")
+        store.hit_test(0.1, 0.1, 0.05)
+        StrokeStore.from_bytes(store.to_bytes())
+    except Exception as e:
+        problems.append(f"store unusable: {type(e).__name__}: {e}")
+    return problems
+
+
+def dict_store_add(strokes, open_strokes, data, origin):
+    """The list-of-dicts storage the session used before StrokeStore."""
+    stroke = open_strokes.get(origin)
+    if data.get("is_start", False) or stroke is None:
+        stroke = []
+        strokes.append(stroke)
+        open_strokes[origin] = stroke
+    stroke.append(data)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, held
+
+
+def bench_dicts(payloads):
+    def build():
+        # Copy the payloads as handle_coordinates receives a fresh dict per point
+        strokes, open_strokes = [], {}
+        for data in payloads:
+            dict_store_add(strokes, open_strokes, dict(data), "student")
+        return strokes
+
+    strokes, memory = measure_memory(build)
+    _, append_s = timed(build)
+    blob, dump_s = timed(json.dumps, strokes)
+    _, load_s = timed(json.loads, blob)
+    _, walk_s = timed(lambda: sum(p["x"] + p["y"] for s in strokes for p in s))
+    _, slice_s = timed(lambda: [list(s) for s in strokes[-len(strokes) // 10:]])
+    return {"memory_bytes": memory, "append_s": append_s, "bulk_append_s": None,
+            "serialized_bytes": len(blob), "dump_s": dump_s, "load_s": load_s,
+            "walk_s": walk_s, "slice_s": slice_s}
+
+
+def bench_packed(payloads, coords):
+    def build():
+        store = StrokeStore()
+        for data in payloads:
+            store.add_point(data, "student")
+        return store
+
+    def build_bulk():
+        store = StrokeStore()
+        for s in range(coords.shape[0]):
+            store.begin_stroke("student", "blue", 3, coords[s])
+        return store
+
+    store, memory = measure_memory(build)
+    _, append_s = timed(build)
+    _, bulk_s = timed(build_bulk)
+    blob, dump_s = timed(store.to_bytes)
+    _, load_s = timed(StrokeStore.from_bytes, blob)
+    _, walk_s = timed(lambda: sum(float(s.as_array().sum()) for s in store))
+    _, slice_s = timed(lambda: store[-len(store) // 10:])
+    return {"memory_bytes": memory, "append_s": append_s, "bulk_append_s": bulk_s,
+            "serialized_bytes": len(blob), "dump_s": dump_s, "load_s": load_s,
+            "walk_s": walk_s, "slice_s": slice_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--strokes", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=100, help="points per stroke")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    problems = check_malformed()
+    if problems:
+        raise SystemExit("Malformed samples corrupt the store:\n  " + "\n  ".join(problems))
+    print("Malformed samples: all rejected, store intact")
+
+    payloads, coords = synthetic_points(args.strokes, args.points)
+    total = len(payloads)
+    results = {"points": total, "dicts": bench_dicts(payloads), "packed": bench_packed(payloads, coords)}
+
+    def rate(seconds):
+        return f"{total / seconds / 1e6:.2f}" if seconds else "-"
+
+    rows = []
+    for name in ("dicts", "packed"):
+        r = results[name]
+        rows.append([
+            name, f"{r['memory_bytes'] / total:.1f}",
+            rate(r["append_s"]), rate(r["bulk_append_s"]),
+            f"{r['serialized_bytes'] / total:.1f}",
+            f"{r['dump_s'] * 1000:.1f}", f"{r['load_s'] * 1000:.1f}",
+            f"{r['walk_s'] * 1000:.1f}", f"{r['slice_s'] * 1000:.2f}",
+        ])
+    print(f"{args.strokes} strokes x {args.points} points")
+    print_table(["storage", "bytes/pt", "append Mpt/s", "bulk Mpt/s", "wire bytes/pt",
+                 "dump ms", "load ms", "walk ms", "slice ms"], rows)
+    path = save_results("stroke-store", results, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Lecture broadcast benchmark: listener count against CPU and added latency.
+
+Runs the hub's ``LectureBroadcaster`` in-process with N listeners connected
+over localhost TCP (after the normal codec handshake). A publisher thread
+stands in for the microphone, publishing one chunk per frame period; a
+single selector thread reads every listener and timestamps each frame on
+arrival. Optionally some listeners never read at all, to show that slow
+listeners skip ahead instead of holding up the others.
+
+Reports per listener count: sender CPU, cost of ``publish`` on the capture
+thread, added latency (publish -> received by the listener) and skips.
+
+Usage:
+    python benchmarks/voice_broadcast.py --listeners 1 10 50 100 --slow 2
+"""
+import argparse
+import selectors
+import socket
+import threading
+import time
+
+import numpy as np
+
+from _common import print_table, save_results, summarize
+from voice_chat import CHUNK, FRAME_DURATION, FRAME_HEADER, HANDSHAKE_MAGIC
+from voice_hub import LectureBroadcaster, StreamParticipant
+
+
+def connect_listeners(count, codec_name):
+    """Open count localhost TCP connections and complete the handshake."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(count)
+    pairs = []
+    for _ in range(count):
+        client = socket.create_connection(server.getsockname())
+        connection, addr = server.accept()
+        connection.setblocking(False)
+        participant = StreamParticipant(connection, addr)
+        client.sendall(HANDSHAKE_MAGIC + codec_name.encode("ascii") + b"\n")
+        while participant.handshaking:
+            try:
+                participant.feed(connection.recv(4096))
+            except BlockingIOError:
+                time.sleep(0.001)
+        reply = b""
+        while not reply.endswith(b"\n"):
+            reply += client.recv(1)
+        pairs.append((participant, client))
+    server.close()
+    return pairs
+
+
+def tagged_chunk(seq):
+    """A chunk of quiet noise whose first two samples carry the sequence number."""
+    samples = np.random.default_rng(seq).integers(-200, 200, CHUNK).astype("<i2")
+    samples[0] = seq & 0x7FFF
+    samples[1] = seq >> 15
+    return samples.tobytes()
+
+
+def run_once(num_listeners, args):
+    pairs = connect_listeners(num_listeners, args.codec)
+    listeners = [participant for participant, _ in pairs]
+    readers = [client for _, client in pairs[args.slow:]]
+    broadcaster = LectureBroadcaster()
+    broadcaster.start()
+
+    published_at = {}
+    latencies = []
+    publish_costs = []
+    done = threading.Event()
+
+    def read_loop():
+        selector = selectors.DefaultSelector()
+        buffers = {}
+        for client in readers:
+            client.setblocking(False)
+            selector.register(client, selectors.EVENT_READ)
+            buffers[client] = bytearray()
+        while not done.is_set():
+            for key, _ in selector.select(timeout=0.05):
+                buffer = buffers[key.fileobj]
+                try:
+                    buffer += key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                now = time.time()
+                while len(buffer) >= FRAME_HEADER.size:
+                    _, length = FRAME_HEADER.unpack_from(buffer)
+                    if len(buffer) < FRAME_HEADER.size + length:
+                        break
+                    payload = bytes(buffer[FRAME_HEADER.size:FRAME_HEADER.size + length])
+                    del buffer[:FRAME_HEADER.size + length]
+                    if args.codec == "pcm":
+                        tag = np.frombuffer(payload[:4], dtype="<i2").astype(np.int64)
+                        seq = int(tag[0]) | int(tag[1]) << 15
+                        if seq in published_at:
+                            latencies.append(now - published_at[seq])
+        selector.close()
+
+    reader = threading.Thread(target=read_loop)
+    reader.start()
+
+    chunks = [tagged_chunk(seq) for seq in range(int(args.duration / FRAME_DURATION))]
+    started = time.perf_counter()
+    for seq, chunk in enumerate(chunks):
+        published_at[seq] = time.time()
+        t0 = time.perf_counter()
+        broadcaster.publish(chunk, listeners)
+        publish_costs.append(time.perf_counter() - t0)
+        # Pace like a real microphone
+        delay = started + (seq + 1) * FRAME_DURATION - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - started
+    time.sleep(0.2)
+
+    done.set()
+    reader.join()
+    broadcaster.stop()
+    for participant, client in pairs:
+        participant.close()
+        client.close()
+
+    stats = broadcaster.stats()
+    return {
+        "listeners": num_listeners,
+        "sender_cpu_percent": 100 * stats["cpu_seconds"] / elapsed,
+        "publish_us": summarize([c * 1e6 for c in publish_costs]),
+        "latency_ms": summarize([l * 1000 for l in latencies]),
+        "frames_published": stats["published"],
+        "frames_sent": stats["sent"],
+        "frames_skipped": stats["skipped"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--listeners", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--slow", type=int, default=0, help="listeners that never read")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of audio per run")
+    parser.add_argument("--codec", choices=["pcm", "ulaw", "adpcm"], default="pcm",
+                        help="latency is only measured with pcm (the tag must survive)")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    results = [run_once(n, args) for n in args.listeners]
+    print_table(
+        ["listeners", "sender cpu %", "publish p50 us", "publish p99 us",
+         "latency p50 ms", "latency p99 ms", "sent", "skipped"],
+        [[r["listeners"], f"{r['sender_cpu_percent']:.1f}",
+          f"{r['publish_us']['p50']:.1f}", f"{r['publish_us']['p99']:.1f}",
+          f"{r['latency_ms']['p50']:.2f}", f"{r['latency_ms']['p99']:.2f}",
+          r["frames_sent"], r["frames_skipped"]] for r in results],
+    )
+    path = save_results("voice-broadcast", {str(r["listeners"]): r for r in results}, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Voice codec benchmark: CPU per frame, bitrate and quality.
+
+Encodes and decodes a test signal in CHUNK-sized frames with every codec in
+``voice_chat.CODECS`` and compares against the legacy raw PCM stream:
+
+* encode / decode CPU time per frame
+* wire bytes per frame (including the frame header) and bitrate
+* signal-to-noise ratio of the round trip
+
+The default signal is synthetic voiced speech (a modulated harmonic series
+with noise); pass ``--wav`` to use a 16-bit mono recording instead.
+
+Usage:
+    python benchmarks/voice_codecs.py --seconds 30
+    python benchmarks/voice_codecs.py --wav lecture.wav
+"""
+import argparse
+import time
+import wave
+
+import numpy as np
+
+from _common import print_table, save_results
+import voice_chat
+from voice_chat import CHUNK, CODECS, FRAME_HEADER, RATE
+
+
+def synthetic_speech(seconds, rate=RATE, seed=0):
+    """Voiced-speech-like test signal: gliding pitch, formant-ish harmonics, pauses."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    # Syllable-rate envelope with gaps between words
+    envelope = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None) * (np.sin(2 * np.pi * 0.25 * t) > -0.3)
+    signal = 6000 * voiced * envelope + rng.normal(0, 80, t.size)
+    return np.clip(signal, -32768, 32767).astype("<i2")
+
+
+def load_wav(path):
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise SystemExit("Expected a 16-bit mono WAV file")
+        if wav.getframerate() != RATE:
+            print(f"Warning: {path} is {wav.getframerate()} Hz, voice runs at {RATE} Hz")
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+
+
+def snr_db(reference, decoded):
+    reference = reference[:decoded.size].astype(np.float64)
+    noise = reference - decoded.astype(np.float64)
+    noise_power = np.mean(noise ** 2)
+    if noise_power == 0:
+        return float("inf")
+    return float(10 * np.log10(np.mean(reference ** 2) / noise_power))
+
+
+def bench_codec(make_codec, frames, framed=True):
+    """Round-trip all frames through a codec; return per-frame metrics."""
+    encoder, decoder = make_codec(), make_codec()
+
+    start = time.process_time()
+    payloads = [encoder.encode(frame) for frame in frames]
+    encode_s = time.process_time() - start
+
+    start = time.process_time()
+    decoded = [decoder.decode(payload) for payload in payloads]
+    decode_s = time.process_time() - start
+
+    header = FRAME_HEADER.size if framed else 0
+    wire_bytes = sum(len(p) + header for p in payloads) / len(payloads)
+    return {
+        "encode_us_per_frame": 1e6 * encode_s / len(frames),
+        "decode_us_per_frame": 1e6 * decode_s / len(frames),
+        "bytes_per_frame": wire_bytes,
+        "kbit_per_s": wire_bytes * 8 * RATE / CHUNK / 1000,
+        "decoded": np.frombuffer(b"".join(decoded), dtype="<i2"),
+    }
+
+
+class PythonAdpcmCodec(voice_chat.ImaAdpcmCodec):
+    """ADPCM forced onto the pure-Python fallback, for comparison."""
+
+    def encode(self, pcm):
+        header = self.BLOCK_HEADER.pack(*self.state)
+        payload, self.state = voice_chat._adpcm_encode(pcm, *self.state)
+        return header + payload
+
+    def decode(self, payload):
+        valpred, index = self.BLOCK_HEADER.unpack_from(payload)
+        return voice_chat._adpcm_decode(payload[self.BLOCK_HEADER.size:], valpred, index)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the synthetic signal")
+    parser.add_argument("--wav", help="16-bit mono WAV file to use instead")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    signal = load_wav(args.wav) if args.wav else synthetic_speech(args.seconds)
+    usable = signal.size - signal.size % CHUNK
+    raw = signal[:usable].tobytes()
+    frames = [raw[i:i + CHUNK * 2] for i in range(0, len(raw), CHUNK * 2)]
+
+    candidates = [("raw (legacy)", CODECS["pcm"], False)]
+    candidates += [(name, codec, True) for name, codec in CODECS.items()]
+    if voice_chat.audioop is not None:
+        candidates.append(("adpcm (python)", PythonAdpcmCodec, True))
+
+    metrics = {}
+    rows = []
+    baseline_kbit = None
+    for name, codec, framed in candidates:
+        result = bench_codec(codec, frames, framed)
+        quality = snr_db(signal[:usable], result.pop("decoded"))
+        result["snr_db"] = quality
+        metrics[name] = result
+        baseline_kbit = baseline_kbit or result["kbit_per_s"]
+        rows.append([
+            name,
+            f"{result['encode_us_per_frame']:.1f}",
+            f"{result['decode_us_per_frame']:.1f}",
+            f"{result['bytes_per_frame']:.0f}",
+            f"{result['kbit_per_s']:.1f}",
+            f"{100 * result['kbit_per_s'] / baseline_kbit:.0f}%",
+            "lossless" if quality == float("inf") else f"{quality:.1f}",
+        ])
+
+    print(f"{len(frames)} frames of {CHUNK} samples at {RATE} Hz "
+          f"({CHUNK / RATE * 1000:.1f} ms per frame)")
+    print_table(["codec", "enc us/frame", "dec us/frame", "bytes/frame", "kbit/s", "vs raw", "SNR dB"],
+                rows)
+    for result in metrics.values():
+        if result["snr_db"] == float("inf"):
+            result["snr_db"] = 999.0  # Keep the JSON strictly valid
+    path = save_results("voice-codecs", metrics, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
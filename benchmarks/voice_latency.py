@@ -0,0 +1,149 @@
+"""End-to-end voice benchmark without a sound card.
+
+Runs a real teacher <-> student voice session over localhost: the teacher
+side is the app's ``VoiceHub`` and the student is a ``VoiceChat`` joining it
+with ``connect``. Both use simulated sound cards (``audio_backend``) on
+which the microphones emit short tone bursts at known times and the
+speakers time when each burst starts playing. Reported per transport:
+
+* mouth-to-ear latency in each direction (capture of a burst on one side
+  to the start of its playback on the other)
+* output underruns and input overruns on both simulated devices
+* jitter-buffer statistics (UDP only)
+* CPU of the whole process
+
+Usage:
+    python benchmarks/voice_latency.py --transport tcp udp --codec adpcm --seconds 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _common import print_table, save_results, summarize
+from audio_backend import SimulatedBackend
+from voice_chat import RATE, VoiceChat
+from voice_hub import VoiceHub
+
+BURST_INTERVAL = 0.5  # Seconds between bursts; must exceed the worst latency
+BURST_LENGTH = 0.03
+BURST_AMPLITUDE = 16000
+DETECT_LEVEL = 4000
+WARMUP = 1.0
+
+
+class BurstDevice(SimulatedBackend):
+    """Simulated sound card whose mic emits timed bursts and whose speaker times them.
+
+    Bursts are emitted every BURST_INTERVAL from ``start + emit_offset``;
+    the speaker expects the peer's bursts at ``start + listen_offset``.
+    """
+
+    def __init__(self, start, emit_offset, listen_offset):
+        super().__init__()
+        self.start = start
+        self.emit_offset = emit_offset
+        self.listen_offset = listen_offset
+        self.latencies = []
+        self.last_detection = 0.0
+
+    def source(self, samples, captured_at):
+        t = captured_at + np.arange(samples) / RATE
+        in_burst = np.mod(t - self.start - self.emit_offset, BURST_INTERVAL) < BURST_LENGTH
+        in_burst &= t >= self.start
+        tone = BURST_AMPLITUDE * np.sin(2 * np.pi * 1000 * t)
+        return (tone * in_burst).astype("<i2").tobytes()
+
+    def sink(self, data, plays_at):
+        samples = np.frombuffer(data, dtype="<i2")
+        loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > DETECT_LEVEL)
+        if loud.size == 0:
+            return
+        heard_at = plays_at + loud[0] / RATE
+        if heard_at - self.last_detection < BURST_INTERVAL / 2:
+            return  # Still the same burst
+        self.last_detection = heard_at
+        # The burst heard is the most recent one emitted
+        first = self.start + self.listen_offset
+        emitted_at = first + np.floor((heard_at - first) / BURST_INTERVAL) * BURST_INTERVAL
+        if emitted_at >= self.start + WARMUP:
+            self.latencies.append(heard_at - emitted_at)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise TimeoutError("Voice session did not start")
+        time.sleep(0.01)
+
+
+def run_session(transport, args, port):
+    start = time.time() + 1.0
+    teacher_audio = BurstDevice(start, 0.0, BURST_INTERVAL / 2)
+    student_audio = BurstDevice(start, BURST_INTERVAL / 2, 0.0)
+
+    hub = VoiceHub("127.0.0.1", port=port, audio_backend=lambda: teacher_audio)
+    hub.start_server()
+    wait_for(lambda: hub.udp_socket is not None)
+    student = VoiceChat("127.0.0.1", transport=transport, audio_backend=lambda: student_audio, port=port)
+    student.connect("127.0.0.1", codecs=(args.codec,))
+    wait_for(lambda: student.connected)
+
+    cpu_start = time.process_time()
+    wall_start = time.time()
+    time.sleep(max(0.0, start - time.time()) + args.seconds)
+    cpu_percent = 100 * (time.process_time() - cpu_start) / (time.time() - wall_start)
+    jitter = student.transport_stats()
+
+    student.disconnect()
+    hub.disconnect()
+    time.sleep(0.5)
+    student.cleanup()
+    hub.cleanup()
+
+    result = {
+        "teacher_to_student_ms": summarize([l * 1000 for l in student_audio.latencies]),
+        "student_to_teacher_ms": summarize([l * 1000 for l in teacher_audio.latencies]),
+        "student_device": student_audio.stats(),
+        "teacher_device": teacher_audio.stats(),
+        "cpu_percent": cpu_percent,
+    }
+    if jitter:
+        result["student_jitter_buffer"] = jitter._asdict()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transport", nargs="+", choices=["tcp", "udp"], default=["tcp", "udp"])
+    parser.add_argument("--codec", choices=["adpcm", "ulaw", "pcm"], default="adpcm")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measured length of each session")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    results = {}
+    for index, transport in enumerate(args.transport):
+        results[transport] = run_session(transport, args, args.port + index)
+
+    rows = []
+    for transport, result in results.items():
+        down, up = result["teacher_to_student_ms"], result["student_to_teacher_ms"]
+        rows.append([
+            transport,
+            f"{down['p50']:.0f}", f"{down['p99']:.0f}",
+            f"{up['p50']:.0f}", f"{up['p99']:.0f}",
+            down["count"] + up["count"],
+            result["student_device"]["underruns"], result["teacher_device"]["underruns"],
+            f"{result['cpu_percent']:.1f}",
+        ])
+    print(f"{args.codec}, {args.seconds:.0f} s per session, a burst every {BURST_INTERVAL * 1000:.0f} ms")
+    print_table(["transport", "t->s p50 ms", "t->s p99 ms", "s->t p50 ms", "s->t p99 ms",
+                 "bursts", "student underruns", "teacher underruns", "cpu %"], rows)
+    path = save_results("voice-latency", results, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Silence suppression benchmark: bandwidth saved and speech clipped.
+
+Runs ``voice_chat.SilenceSuppressor`` over a speech signal mixed with
+background noise at several levels and reports, per noise level:
+
+* detector CPU time per chunk
+* fraction of chunks sent as audio, and the bandwidth saved per codec
+  (comfort-noise markers included)
+* false-clip rate: chunks of real speech that were suppressed, and how many
+  speech onsets lost their first chunk
+* false-alarm rate: chunks without speech that were still sent (mostly the
+  deliberate hangover)
+
+"Real speech" is judged on the clean signal, before noise is added: a chunk
+counts as speech when it is within 30 dB of the loud end of the recording.
+The default signal is the synthetic voiced speech of voice_codecs.py; pass
+``--wav`` to use a 16-bit mono recording instead.
+
+Usage:
+    python benchmarks/voice_vad.py --noise-dbfs -70 -55 -45
+    python benchmarks/voice_vad.py --wav lecture.wav
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _common import print_table, save_results
+from voice_codecs import load_wav, synthetic_speech
+from voice_chat import CHUNK, CODECS, FRAME_AUDIO, FRAME_HEADER, FRAME_SILENCE, RATE, SilenceSuppressor
+
+SPEECH_RANGE_DB = 30.0
+
+
+def frame_levels(frames):
+    as_float = frames.astype(np.float64)
+    power = np.einsum("ij,ij->i", as_float, as_float) / frames.shape[1]
+    return 10 * np.log10(power / 32768.0 ** 2 + 1e-12)
+
+
+def speech_labels(clean_frames):
+    """Oracle labels from the clean signal: True for chunks of real speech."""
+    levels = frame_levels(clean_frames)
+    return levels > np.percentile(levels, 95) - SPEECH_RANGE_DB
+
+
+def add_noise(signal, noise_dbfs, seed=1):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 32768.0 * 10 ** (noise_dbfs / 20), signal.size)
+    return np.clip(signal + noise, -32768, 32767).astype("<i2")
+
+
+def run_suppressor(frames):
+    """Return the per-chunk actions and the detector CPU time per chunk."""
+    suppressor = SilenceSuppressor()
+    actions = []
+    start = time.process_time()
+    for frame in frames:
+        actions.append(suppressor.process(frame.tobytes()))
+    elapsed = time.process_time() - start
+    return actions, elapsed / len(frames)
+
+
+def wire_bytes(frames, actions, codec):
+    """Bytes on the wire over framed TCP, without and with suppression."""
+    encoder = codec()
+    audio = [len(encoder.encode(frame.tobytes())) + FRAME_HEADER.size for frame in frames]
+    full = sum(audio)
+    suppressed = sum(size for size, action in zip(audio, actions) if action == FRAME_AUDIO)
+    suppressed += (FRAME_HEADER.size + 1) * sum(action == FRAME_SILENCE for action in actions)
+    return full, suppressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of the synthetic signal")
+    parser.add_argument("--wav", help="16-bit mono WAV file to use instead")
+    parser.add_argument("--noise-dbfs", type=float, nargs="+", default=[-70.0, -55.0, -45.0],
+                        help="background noise levels to mix in")
+    parser.add_argument("--label", help="name for the stored results (default: git revision)")
+    args = parser.parse_args()
+
+    clean = load_wav(args.wav) if args.wav else synthetic_speech(args.seconds)
+    usable = clean.size - clean.size % CHUNK
+    clean = clean[:usable]
+    labels = speech_labels(clean.reshape(-1, CHUNK))
+    onsets = np.flatnonzero(labels & ~np.concatenate(([False], labels[:-1])))
+    seconds = usable / RATE
+
+    metrics = {}
+    rows = []
+    for noise_dbfs in args.noise_dbfs:
+        frames = add_noise(clean, noise_dbfs).reshape(-1, CHUNK)
+        actions, cpu_per_frame = run_suppressor(frames)
+        sent = np.array([action == FRAME_AUDIO for action in actions])
+
+        result = {
+            "vad_us_per_frame": cpu_per_frame * 1e6,
+            "speech_fraction": float(labels.mean()),
+            "sent_fraction": float(sent.mean()),
+            "false_clip_rate": float((labels & ~sent).sum() / max(1, labels.sum())),
+            "onsets": int(onsets.size),
+            "onsets_clipped": int((~sent[onsets]).sum()),
+            "false_alarm_rate": float((~labels & sent).sum() / max(1, (~labels).sum())),
+            "codecs": {},
+        }
+        for name, codec in CODECS.items():
+            full, suppressed = wire_bytes(frames, actions, codec)
+            result["codecs"][name] = {
+                "kbit_per_s": full * 8 / seconds / 1000,
+                "suppressed_kbit_per_s": suppressed * 8 / seconds / 1000,
+                "saved": 1 - suppressed / full,
+            }
+        metrics[f"{noise_dbfs:g}dBFS"] = result
+        rows.append([
+            f"{noise_dbfs:g}",
+            f"{result['vad_us_per_frame']:.1f}",
+            f"{100 * result['speech_fraction']:.0f}%",
+            f"{100 * result['sent_fraction']:.0f}%",
+            f"{100 * result['false_clip_rate']:.2f}%",
+            f"{result['onsets_clipped']}/{result['onsets']}",
+            f"{100 * result['false_alarm_rate']:.0f}%",
+        ] + [f"{100 * result['codecs'][name]['saved']:.0f}%" for name in CODECS])
+
+    print(f"{len(labels)} chunks ({seconds:.0f} s), {100 * labels.mean():.0f}% speech")
+    print_table(["noise dBFS", "vad us/frame", "speech", "sent", "false clips", "onsets clipped",
+                 "false alarms"] + [f"{name} saved" for name in CODECS], rows)
+    path = save_results("voice-vad", metrics, label=args.label)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Several isolated classrooms in one server process.
+
+Every classroom is a ``WhiteboardSession`` with its own admission state,
+document, page and strokes, talking to its students on its own Socket.IO
+namespace: the teacher's own classroom (driven by the Tk window) is the
+default namespace ``/`` and further classrooms are ``/class/<name>``.
+Socket.IO keeps outbound traffic separate per namespace, so a busy
+classroom's broadcasts never reach another's students. All classrooms
+share one ``AssetCache``, so slides used in several rooms are stored,
+rendered and encoded once.
+"""
+import re
+import threading
+
+from flask import request
+from flask_socketio import Namespace
+
+from session import ERASER_RADIUS, WhiteboardSession
+
+CLASSROOM_PREFIX = "/class/"
+
+VALID_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def apply_erase(session, body, skip_sid=None):
+    """Apply an erase request: explicit ids, a point eraser or a lasso. Returns the ids erased."""
+    if "stroke_ids" in body:
+        return session.erase_strokes([int(i) for i in body["stroke_ids"]], skip_sid=skip_sid)
+    if "polygon" in body:
+        return session.erase_strokes(session.select_lasso(body["polygon"]), skip_sid=skip_sid)
+    radius = float(body.get("radius", ERASER_RADIUS))
+    return session.erase_at(float(body["x"]), float(body["y"]), radius, skip_sid=skip_sid)
+
+
+class ClassroomNamespace(Namespace):
+    """Socket.IO handlers for the students of one classroom."""
+
+    def __init__(self, namespace, session):
+        super().__init__(namespace)
+        self.session = session
+        self.closed = False
+
+    def on_connect(self, auth=None):
+        """Handle client connection request."""
+        if self.closed:
+            return False
+        client_id = request.sid
+        client_ip = request.remote_addr
+        print(f"Connection request from {client_ip} (ID: {client_id}, classroom {self.namespace})")
+
+        # Connection is pending until approved (auto-approval waits for "join")
+        self.session.request_connection(client_id, client_ip)
+        return True
+
+    def on_join(self, data=None):
+        """A connected client is ready for events; auto-approve it now if enabled.
+
+        Events emitted from on_connect can reach the client before its
+        namespace is connected and get dropped, so approval waits for this
+        handshake. The ack tells the client whether it is approved.
+        """
+        client_id = request.sid
+        if self.session.auto_approve:
+            self.session.approve(client_id)
+        return {"approved": self.session.is_approved(client_id)}
+
+    def on_allow_student(self, client_id):
+        self.emit("allow_student", {"allowed_sid": client_id})
+
+    def on_send_coordinates(self, data):
+        """Handle incoming coordinates from clients."""
+        client_id = request.sid
+
+        # Only process if client is approved
+        if self.session.is_approved(client_id):
+            # Record and broadcast to all other approved clients
+            try:
+                self.session.add_point(data, origin=client_id, skip_sid=client_id)
+            except ValueError as e:
+                print(f"Dropped bad coordinates from {client_id}: {e}")
+        else:
+            print(f"Rejected coordinates from unapproved client {client_id}")
+
+    def on_erase(self, data):
+        """Erase strokes for an approved client; the others get an erase_strokes event."""
+        client_id = request.sid
+        if not self.session.is_approved(client_id):
+            print(f"Rejected erase from unapproved client {client_id}")
+            return
+        try:
+            apply_erase(self.session, data, skip_sid=client_id)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Bad erase request from {client_id}: {e}")
+
+    def on_register_viewport(self, data):
+        """Handle client viewport registration."""
+        self.session.set_viewport(request.sid, data.get("width", 0), data.get("height", 0))
+
+    def on_disconnect(self, reason=None):
+        """Clean up when client disconnects."""
+        self.session.client_disconnected(request.sid)
+
+
+class Classrooms:
+    """Registry of the classrooms hosted by one Socket.IO server."""
+
+    def __init__(self, socketio, default_session):
+        self.socketio = socketio
+        self.cache = default_session.cache
+        self.lock = threading.Lock()
+        self.namespaces = {}  # {name: ClassroomNamespace}, "" is the default classroom
+        self._register("", default_session)
+
+    def _register(self, name, session):
+        handler = ClassroomNamespace(session.namespace, session)
+        self.socketio.on_namespace(handler)
+        self.namespaces[name] = handler
+        return handler
+
+    def create(self, name):
+        """Open a classroom (or return the open one with that name)."""
+        if not VALID_NAME.match(name or ""):
+            raise ValueError("Classroom names are 1-64 letters, digits, '-' or '_'")
+        with self.lock:
+            handler = self.namespaces.get(name)
+            if handler is not None and not handler.closed:
+                return handler.session
+            session = WhiteboardSession(self.socketio, namespace=CLASSROOM_PREFIX + name, cache=self.cache)
+            if handler is not None:
+                # Socket.IO can't unregister a namespace; reopen it with a fresh session
+                handler.session = session
+                handler.closed = False
+            else:
+                self._register(name, session)
+        print(f"Opened classroom {name} on {session.namespace}")
+        return session
+
+    def get(self, name):
+        """The open classroom called name ("" or None for the default one), or None."""
+        handler = self.namespaces.get(name or "")
+        return handler.session if handler is not None and not handler.closed else None
+
+    def close(self, name):
+        """Close a classroom: disconnect its students and free its document."""
+        if not name:
+            raise ValueError("The default classroom can't be closed")
+        with self.lock:
+            handler = self.namespaces.get(name)
+            if handler is None or handler.closed:
+                return False
+            handler.closed = True
+        session = handler.session
+        admission = session.admission_snapshot()
+        for client_id in list(admission.connected_clients) + list(admission.pending_requests):
+            try:
+                self.socketio.server.disconnect(client_id, namespace=session.namespace)
+            except Exception as e:
+                print(f"Error disconnecting client {client_id}: {e}")
+        session.close_document()
+        print(f"Closed classroom {name}")
+        return True
+
+    def names(self):
+        with self.lock:
+            return sorted(name for name, handler in self.namespaces.items() if not handler.closed)
+
+    def summary(self):
+        """JSON-serializable overview of every open classroom and the shared cache."""
+        rooms = []
+        for name in self.names():
+            session = self.get(name)
+            if session is None:
+                continue
+            state = session.state()
+            rooms.append({
+                "name": name,
+                "namespace": session.namespace,
+                "document": state["document"],
+                "current_page": state["current_page"],
+                "students": len(state["connected_clients"]),
+                "pending": len(state["pending_requests"]),
+                "strokes": state["strokes"],
+            })
+        return {"classrooms": rooms, "cache": self.cache.stats()}
@@ -1,7 +1,7 @@
 import time
 from tkinter import Frame, Label, Listbox, Button, MULTIPLE, StringVar, RIGHT, LEFT, BOTH, Y
 from tkinter import ttk
-from server import connection_requests, connected_clients, socketio
+from server import session
 
 class ConnectionRequestPanel:
     def __init__(self, parent):
@@ -51,49 +51,43 @@ class ConnectionRequestPanel:
         ttk.Button(button_frame, text="Refresh", command=self.refresh_requests).pack(side="left", padx=2)
 
         # Request storage
-        self.pending_requests = {}  # {index: request_data}
+        self.pending_requests = {}  # {client_id: request_data}
         self.index_to_client_id = {}  # {listbox index: client_id}
+        self.version = -1  # Version of the admission snapshot shown
 
         # Automatically refresh requests on creation
         self.refresh_requests()
 
     def refresh_requests(self):
-        """Refresh the list of connection requests."""
-        current_time = time.time()
-        stale_indexes = []
-
-        # Check for stale requests
-        for index, request_data in self.pending_requests.items():
-            if current_time - request_data["timestamp"] > 120:  # 2 minutes
-                stale_indexes.append(index)
-
-        # Disconnect and remove stale
-        for index in stale_indexes:
-            client_id = self.pending_requests[index]["client_id"]
-            try:
-                socketio.server.disconnect(client_id)
-            except Exception as e:
-                print(f"Error disconnecting stale client {client_id}: {e}")
-            del self.pending_requests[index]
-
-        # Get new requests from the queue
-        while not connection_requests.empty():
-            request = connection_requests.get()
-            if request["client_id"] not in connected_clients:
-                index = len(self.pending_requests)
-                self.pending_requests[index] = request
-
-        # Update Listbox
+        """Drop stale requests and show the current ones."""
+        session.expire_stale_requests()
+        self.show_requests(session.admission_snapshot())
+
+    def show_requests(self, snapshot):
+        """Show the pending requests of an admission snapshot (Tk thread)."""
+        if snapshot.version == self.version:
+            return
+        self.version = snapshot.version
+        selected = {self.index_to_client_id.get(idx) for idx in self.request_list.curselection()}
+
+        self.pending_requests = {
+            request_data["client_id"]: request_data
+            for request_data in sorted(snapshot.pending_requests.values(), key=lambda r: r["timestamp"])
+        }
+
+        # Update Listbox, keeping the teacher's selection
         self.request_list.delete(0, "end")
         self.index_to_client_id.clear()
 
-        for idx, (index, request_data) in enumerate(self.pending_requests.items()):
+        for idx, request_data in enumerate(self.pending_requests.values()):
             client_ip = request_data["client_ip"]
             timestamp = time.strftime("%H:%M:%S", time.localtime(request_data["timestamp"]))
             question = request_data.get("question", "").strip()
             preview = (question[:30] + "...") if len(question) > 30 else question
             self.request_list.insert(idx, f"{client_ip} ({timestamp}) - {preview}")
             self.index_to_client_id[idx] = request_data["client_id"]
+            if request_data["client_id"] in selected:
+                self.request_list.selection_set(idx)
 
         # Update status
         if self.pending_requests:
@@ -110,17 +104,9 @@ class ConnectionRequestPanel:
         for idx in selected_indexes:
             client_id = self.index_to_client_id.get(idx)
             if client_id:
-                request_data = self._find_request_by_client_id(client_id)
-                if request_data:
-                    client_ip = request_data["client_ip"]
-                    connected_clients.add(client_id)
-                    socketio.emit("allow_student", {"allowed_sid": client_id})
-                    socketio.emit("connection_approved", room=client_id)
-                    print(f"Approved connection from {client_ip} (ID: {client_id})")
+                session.approve(client_id)
 
-                    self._remove_request_by_client_id(client_id)
-
-        self.refresh_requests()
+        self.show_requests(session.admission_snapshot())
 
     def reject_selected(self):
         """Reject selected connection requests."""
@@ -131,19 +117,9 @@ class ConnectionRequestPanel:
         for idx in selected_indexes:
             client_id = self.index_to_client_id.get(idx)
             if client_id:
-                request_data = self._find_request_by_client_id(client_id)
-                if request_data:
-                    client_ip = request_data["client_ip"]
-                    socketio.emit("connection_rejected", room=client_id)
-                    try:
-                        socketio.server.disconnect(client_id)
-                    except Exception as e:
-                        print(f"Error disconnecting client {client_id}: {e}")
-                    print(f"Rejected connection from {client_ip} (ID: {client_id})")
-
-                    self._remove_request_by_client_id(client_id)
+                session.reject(client_id)
 
-        self.refresh_requests()
+        self.show_requests(session.admission_snapshot())
 
     def display_selected_question(self, event):
         """Show the full question of the selected request."""
@@ -167,13 +143,4 @@ class ConnectionRequestPanel:
 
     def _find_request_by_client_id(self, client_id):
         """Helper to find request_data by client_id."""
-        for data in self.pending_requests.values():
-            if data["client_id"] == client_id:
-                return data
-        return None
-
-    def _remove_request_by_client_id(self, client_id):
-        """Helper to remove request by client_id."""
-        to_delete = [k for k, v in self.pending_requests.items() if v["client_id"] == client_id]
-        for k in to_delete:
-            del self.pending_requests[k]
+        return self.pending_requests.get(client_id)
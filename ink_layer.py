@@ -0,0 +1,96 @@
+"""Raster layer for finished ink.
+
+Every pen sample drawn on the Tk canvas leaves a line and an oval item
+behind, and Tk's redraw, scroll and delete costs grow with the item count.
+Once a page holds enough items, the whiteboard hands its finished strokes
+to an ``InkBaker``, which paints them into an RGBA layer with PIL on a
+background thread and composites the layer over the page image. The Tk
+thread then only swaps the page image and deletes the baked items, so the
+number of live canvas items stays bounded however much ink the page
+holds. The vectors stay in the session's ``StrokeStore``; erasing a baked
+stroke re-bakes the layer from the store.
+"""
+import threading
+from array import array
+from collections import namedtuple
+
+BakedStroke = namedtuple("BakedStroke", "id coords pen_color line_width")
+BakeResult = namedtuple("BakeResult", "generation stroke_ids replace layer composite error", defaults=(None,))
+
+
+def snapshot(strokes):
+    """Copy strokes so they can be painted off the thread that owns them."""
+    return [BakedStroke(s.id, array("f", s.coords), s.pen_color, s.line_width) for s in strokes]
+
+
+def draw_strokes(layer, strokes):
+    """Paint strokes (normalized coordinates) onto an RGBA layer, like the canvas draws them."""
+    import numpy as np
+    from PIL import ImageColor, ImageDraw
+
+    draw = ImageDraw.Draw(layer)
+    scale = np.array(layer.size, dtype=np.float32)
+    for stroke in strokes:
+        try:
+            color = ImageColor.getrgb(stroke.pen_color)
+        except ValueError:
+            color = (0, 0, 0)
+        points = np.frombuffer(stroke.coords, dtype=np.float32).reshape(-1, 2) * scale
+        if not len(points):
+            continue
+        width = max(1, int(round(stroke.line_width)))
+        if len(points) > 1:
+            draw.line(points.ravel().tolist(), fill=color, width=width, joint="curve")
+        # Round caps, as the canvas draws an oval at every sample
+        r = stroke.line_width / 2
+        for x, y in (points[0], points[-1]):
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+
+
+class InkBaker:
+    """Bakes strokes into an ink layer on a background thread, one job at a time.
+
+    ``on_done(result)`` is called on the baking thread with a ``BakeResult``,
+    whose ``error`` is set (and layer and composite None) if the bake
+    failed; the caller must marshal it to its UI thread.
+    """
+
+    def __init__(self, on_done):
+        self.on_done = on_done
+        self.thread = None
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def bake(self, generation, strokes, size, base_layer=None, page_image=None):
+        """Paint strokes over a copy of base_layer (a fresh layer if None) and composite it.
+
+        The composite is the page image (white if None) with the layer on top,
+        both at ``size``.
+        """
+        if self.busy():
+            return False
+        self.thread = threading.Thread(
+            target=self._run, args=(generation, strokes, size, base_layer, page_image), daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self, generation, strokes, size, base_layer, page_image):
+        from PIL import Image
+
+        try:
+            if base_layer is not None and base_layer.size == size:
+                layer = base_layer.copy()
+            else:
+                layer = Image.new("RGBA", size, (0, 0, 0, 0))
+            draw_strokes(layer, strokes)
+            if page_image is not None and page_image.size == size:
+                page = page_image.convert("RGBA")
+            else:
+                page = Image.new("RGBA", size, (255, 255, 255, 255))
+            composite = Image.alpha_composite(page, layer).convert("RGB")
+        except Exception as e:
+            print(f"Error baking ink: {e}")
+            self.on_done(BakeResult(generation, [s.id for s in strokes], base_layer is None, None, None, str(e)))
+            return
+        self.on_done(BakeResult(generation, [s.id for s in strokes], base_layer is None, layer, composite))
@@ -1,7 +1,7 @@
+import argparse
 import threading
 import socket
-from server import app, socketio
-from whiteboard import run_tkinter
+from server import app, socketio, session, classrooms
 
 def get_local_ip():
     """Get the local IP address"""
@@ -15,17 +15,58 @@ def get_local_ip():
     except:
         return "127.0.0.1"  # Fallback to localhost
 
-def run_flask():
+def run_flask(port=5000):
     """Start the Flask server."""
-    socketio.run(app, host="0.0.0.0", port=5000, debug=False)
+    socketio.run(app, host="0.0.0.0", port=port, debug=False)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collaborative whiteboard teacher app")
+    parser.add_argument("--headless", action="store_true",
+                        help="run only the server; drive the session through the /api endpoints")
+    parser.add_argument("--auto-approve", action="store_true",
+                        help="admit students without teacher approval")
+    parser.add_argument("--pdf", help="PDF to open at startup")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--classroom", action="append", default=[], metavar="NAME",
+                        help="also host classroom NAME on the /class/NAME namespace (repeatable)")
+    parser.add_argument("--record", metavar="PATH", help="record the session to PATH")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recorded session")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="replay speed as a multiple of real time")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     host_ip = get_local_ip()
     print(f"Using IP address: {host_ip}")
-    
-    # Start Flask in a separate thread
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    # Start Tkinter in the main thread
-    run_tkinter(host_ip)
\ No newline at end of file
+    session.auto_approve = args.auto_approve
+    for name in args.classroom:
+        classrooms.create(name).auto_approve = args.auto_approve
+
+    if args.headless:
+        from recorder import SessionRecorder, replay_in_background
+
+        recorder = None
+        if args.record:
+            recorder = SessionRecorder(args.record, session)
+            recorder.start()
+        if args.pdf:
+            session.load_pdf(args.pdf)
+        if args.replay:
+            replay_in_background(args.replay, session, args.replay_speed)
+        print(f"Running headless, session API at http://{host_ip}:{args.port}/api/state")
+        try:
+            run_flask(args.port)
+        finally:
+            if recorder:
+                recorder.stop()
+    else:
+        from whiteboard import run_tkinter
+
+        # Start Flask in a separate thread
+        flask_thread = threading.Thread(target=run_flask, args=(args.port,), daemon=True)
+        flask_thread.start()
+
+        # Start Tkinter in the main thread
+        run_tkinter(host_ip, pdf_path=args.pdf, record_path=args.record,
+                    replay_path=args.replay, replay_speed=args.replay_speed)
@@ -0,0 +1,503 @@
+"""Lecture recording and replay.
+
+A ``SessionRecorder`` listens to a ``WhiteboardSession`` (and optionally the
+voice hub) and appends timestamped events to a compact binary log. The
+live code paths only append a tuple to a deque; encoding, hashing and disk
+I/O happen on the recorder's writer thread.
+
+File layout (all integers little-endian)::
+
+    b"WBREC1\\0\\0"
+    chunk*    CHUNK_HEADER (b"CHNK", record count, byte length, start time)
+              record*   RECORD_HEADER (ms since chunk start, kind, length) + payload
+
+Chunks are only ever appended. Page changes, clears and new documents
+always start a new chunk (a "keyframe"), and every chunk is listed in a
+sidecar index (``<path>.idx``) so replay can seek without reading the
+whole log. If the index is missing or behind (e.g. after a crash), it is
+rebuilt from the chunk headers.
+
+Stroke colors and origins are stored once per chunk in a string table, so a
+pen sample costs 26 bytes on disk. Erased strokes are recorded by their
+number in order of creation since the last keyframe, which replay can
+reproduce without the live session's stroke ids.
+"""
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+
+from strokes import DEFAULT_LINE_WIDTH, DEFAULT_PEN_COLOR
+
+MAGIC = b"WBREC1\0\0"
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sIId")
+RECORD_HEADER = struct.Struct("<IBI")
+INDEX_ENTRY = struct.Struct("<dQB")
+
+# Record kinds
+KIND_STRING = 0       # <H string id> + utf-8 text, defines an id for this chunk
+KIND_DOCUMENT = 1     # <H name length> + name + PDF bytes
+KIND_PAGE = 2         # <HH page, total pages> + SHA-1 of the rendered page
+KIND_POINT = 3        # POINT
+KIND_CLEAR = 4
+KIND_CLEAR_ALL = 5
+KIND_AUDIO = 6        # <B codec id> + encoded frame
+KIND_ERASE = 7        # <I>* numbers of the erased strokes since the last keyframe
+
+# Kinds that start a new chunk so replay can seek to them
+KEYFRAME_KINDS = (KIND_DOCUMENT, KIND_PAGE, KIND_CLEAR, KIND_CLEAR_ALL)
+
+POINT = struct.Struct("<ffBfHH")  # x, y, is_start, line width, color id, origin id
+STRING_ID = struct.Struct("<H")
+PAGE = struct.Struct("<HH20s")
+STROKE_NUMBER = struct.Struct("<I")
+
+# Writer tuning: a chunk is written once it is this big or this old
+CHUNK_BYTES = 64 * 1024
+FLUSH_INTERVAL = 1.0
+POLL_INTERVAL = 0.1
+
+IndexEntry = namedtuple("IndexEntry", "start_time offset keyframe")
+Event = namedtuple("Event", "time kind payload")
+
+
+class SessionRecorder:
+    """Records a whiteboard session (and optionally voice) to an append-only log."""
+
+    def __init__(self, path, session=None, chunk_bytes=CHUNK_BYTES, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.session = session
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+        self.pending = deque()  # (time, event, payload) from the live threads
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.file = None
+        self.index_file = None
+
+        # Writer-thread state
+        self.buffer = bytearray()
+        self.records = 0
+        self.chunk_start = None
+        self.chunk_keyframe = 0
+        self.chunk_opened = 0.0
+        self.strings = {}
+        self.stroke_numbers = {}  # {live stroke id: number since the last keyframe}
+        self.ended_origins = set()  # Origins whose next point starts a new stroke
+        self.audio_encoder = None
+        self.last_audio = None
+        self.events = self.bytes_written = self.chunks = 0
+
+    def start(self):
+        if self.thread:
+            return
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.index_file = open(self.path + ".idx", "ab")
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if self.session:
+            self.session.add_listener(self.on_session_event)
+        print(f"Recording session to {self.path}")
+
+    def stop(self):
+        """Stop recording and flush everything to disk."""
+        if not self.thread:
+            return
+        if self.session:
+            self.session.remove_listener(self.on_session_event)
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.file.close()
+        self.index_file.close()
+        print(f"Recording saved: {self.events} events, {self.bytes_written / 1024:.0f} KB")
+
+    # Live threads ------------------------------------------------------
+
+    def on_session_event(self, event, payload):
+        """Session listener; only queues the event."""
+        self.pending.append((time.time(), event, payload))
+
+    def record_audio(self, pcm):
+        """Queue one chunk of 16-bit PCM (called from the voice mixer thread)."""
+        self.pending.append((time.time(), "audio", pcm))
+
+    # Writer thread -----------------------------------------------------
+
+    def _run(self):
+        while True:
+            stopping = self.stop_event.wait(POLL_INTERVAL)
+            while self.pending:
+                self._encode(*self.pending.popleft())
+            if self.buffer and (stopping or time.time() - self.chunk_opened >= self.flush_interval):
+                self._write_chunk()
+            if stopping:
+                return
+
+    def _encode(self, t, event, payload):
+        self.events += 1
+        if event == "point":
+            data = payload["data"]
+            self._open_chunk(t, KIND_POINT)
+            pen_color = str(data.get("pen_color", DEFAULT_PEN_COLOR))
+            line_width = float(data.get("line_width", DEFAULT_LINE_WIDTH))
+            color = self._string_id(t, pen_color)
+            origin = self._string_id(t, str(payload["origin"]))
+            # A stroke closed by end_stroke (API batches, a student leaving) is
+            # recorded as the next point starting a new one
+            is_start = bool(data.get("is_start", False)) or payload["origin"] in self.ended_origins
+            self.ended_origins.discard(payload["origin"])
+            stroke_id = data.get("stroke_id")
+            if stroke_id is not None and stroke_id not in self.stroke_numbers:
+                self.stroke_numbers[stroke_id] = len(self.stroke_numbers)
+            self._record(t, KIND_POINT, POINT.pack(
+                float(data["x"]), float(data["y"]), is_start, line_width, color, origin))
+        elif event == "stroke_ended":
+            self.ended_origins.add(payload["origin"])
+            self.events -= 1
+            return
+        elif event == "strokes_erased":
+            numbers = [self.stroke_numbers[i] for i in payload["stroke_ids"] if i in self.stroke_numbers]
+            if not numbers:
+                self.events -= 1
+                return
+            self._open_chunk(t, KIND_ERASE)
+            self._record(t, KIND_ERASE, b"".join(STROKE_NUMBER.pack(n) for n in numbers))
+        elif event == "audio":
+            self._open_chunk(t, KIND_AUDIO)
+            self._record(t, KIND_AUDIO, self._encode_audio(t, payload))
+        elif event == "document_loaded":
+            self._open_chunk(t, KIND_DOCUMENT)
+            name = (payload["name"] or "").encode("utf-8")[:0xFFFF]
+            self._record(t, KIND_DOCUMENT, STRING_ID.pack(len(name)) + name + payload["pdf_bytes"])
+        elif event == "page_changed":
+            self._open_chunk(t, KIND_PAGE)
+            digest = hashlib.sha1(payload["image"].tobytes()).digest()
+            self._record(t, KIND_PAGE, PAGE.pack(payload["page_number"], payload["total_pages"], digest))
+        elif event == "clear_annotations":
+            self._open_chunk(t, KIND_CLEAR)
+            self._record(t, KIND_CLEAR, b"")
+        elif event == "clear_all":
+            self._open_chunk(t, KIND_CLEAR_ALL)
+            self._record(t, KIND_CLEAR_ALL, b"")
+        else:
+            self.events -= 1
+            return
+        if len(self.buffer) >= self.chunk_bytes:
+            self._write_chunk()
+
+    def _encode_audio(self, t, pcm):
+        from voice_chat import CODEC_IDS, FRAME_DURATION, ImaAdpcmCodec
+
+        if self.audio_encoder is None:
+            self.audio_encoder = ImaAdpcmCodec()
+        if self.last_audio is None or t - self.last_audio > 1.5 * FRAME_DURATION:
+            self.audio_encoder.reset()  # Not continuous with the last frame
+        self.last_audio = t
+        return bytes([CODEC_IDS["adpcm"]]) + self.audio_encoder.encode(pcm)
+
+    def _open_chunk(self, t, kind):
+        """Make sure a chunk is open for a record of this kind; keyframes start a new one."""
+        if kind in KEYFRAME_KINDS:
+            self.stroke_numbers = {}  # Every keyframe leaves the page without ink
+            if self.buffer:
+                self._write_chunk()
+        if not self.buffer:
+            self.chunk_start = t
+            self.chunk_keyframe = kind if kind in KEYFRAME_KINDS else 0
+            self.chunk_opened = time.time()
+            self.strings = {}
+
+    def _string_id(self, t, text):
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = self.strings[text] = len(self.strings)
+            self._record(t, KIND_STRING, STRING_ID.pack(string_id) + text.encode("utf-8"))
+        return string_id
+
+    def _record(self, t, kind, payload):
+        offset_ms = max(0, int(round((t - self.chunk_start) * 1000)))
+        self.buffer += RECORD_HEADER.pack(offset_ms, kind, len(payload))
+        self.buffer += payload
+        self.records += 1
+
+    def _write_chunk(self):
+        offset = self.file.tell()
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, self.records, len(self.buffer), self.chunk_start))
+        self.file.write(self.buffer)
+        self.file.flush()
+        # The index is written after the chunk, so it never points past the data
+        self.index_file.write(INDEX_ENTRY.pack(self.chunk_start, offset, self.chunk_keyframe))
+        self.index_file.flush()
+        self.bytes_written += CHUNK_HEADER.size + len(self.buffer)
+        self.chunks += 1
+        self.buffer = bytearray()
+        self.records = 0
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "queued": len(self.pending),
+            "chunks": self.chunks,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class Recording:
+    """Read access to a recorded session: index, events and timed replay."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a session recording")
+            f.seek(0, os.SEEK_END)
+            self.size = f.tell()
+        self.index = self._load_index()
+
+    @property
+    def start_time(self):
+        return self.index[0].start_time if self.index else 0.0
+
+    @property
+    def duration(self):
+        """Seconds from the first to the last chunk start (at least)."""
+        return self.index[-1].start_time - self.start_time if self.index else 0.0
+
+    def _load_index(self):
+        entries = []
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                data = f.read()
+            for fields in INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]):
+                entry = IndexEntry(*fields)
+                if entry.offset + CHUNK_HEADER.size > self.size:
+                    break
+                entries.append(entry)
+        except FileNotFoundError:
+            pass
+        # Pick up chunks the index doesn't know about by walking the chunk headers
+        with open(self.path, "rb") as f:
+            offset = len(MAGIC)
+            if entries:
+                f.seek(entries[-1].offset)
+                offset = entries[-1].offset + CHUNK_HEADER.size + CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))[2]
+            while offset + CHUNK_HEADER.size <= self.size:
+                f.seek(offset)
+                magic, records, length, start_time = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                if magic != CHUNK_MAGIC or offset + CHUNK_HEADER.size + length > self.size:
+                    break  # Torn write at the end of the log
+                keyframe = 0
+                if records:
+                    _, kind, _ = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                    keyframe = kind if kind in KEYFRAME_KINDS else 0
+                entries.append(IndexEntry(start_time, offset, keyframe))
+                offset += CHUNK_HEADER.size + length
+        return entries
+
+    def _read_chunk(self, f, entry):
+        f.seek(entry.offset)
+        _, _, length, start_time = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        data = f.read(length)
+        strings = {}
+        position = 0
+        while position + RECORD_HEADER.size <= len(data):
+            offset_ms, kind, size = RECORD_HEADER.unpack_from(data, position)
+            position += RECORD_HEADER.size
+            payload = data[position:position + size]
+            position += size
+            t = start_time + offset_ms / 1000.0
+            if kind == KIND_STRING:
+                strings[STRING_ID.unpack_from(payload)[0]] = payload[STRING_ID.size:].decode("utf-8")
+            elif kind == KIND_POINT:
+                x, y, is_start, line_width, color, origin = POINT.unpack(payload)
+                data_point = {"x": x, "y": y, "is_start": bool(is_start),
+                              "line_width": line_width, "pen_color": strings.get(color, DEFAULT_PEN_COLOR)}
+                yield Event(t, kind, (data_point, strings.get(origin, "replay")))
+            elif kind == KIND_DOCUMENT:
+                (name_length,) = STRING_ID.unpack_from(payload)
+                name = payload[STRING_ID.size:STRING_ID.size + name_length].decode("utf-8")
+                yield Event(t, kind, (name, payload[STRING_ID.size + name_length:]))
+            elif kind == KIND_PAGE:
+                yield Event(t, kind, PAGE.unpack(payload))
+            elif kind == KIND_AUDIO:
+                yield Event(t, kind, payload)
+            elif kind == KIND_ERASE:
+                yield Event(t, kind, [n for (n,) in STROKE_NUMBER.iter_unpack(payload)])
+            else:
+                yield Event(t, kind, None)
+
+    def events(self, first_chunk=0):
+        """Yield every event from the given chunk on."""
+        with open(self.path, "rb") as f:
+            for entry in self.index[first_chunk:]:
+                yield from self._read_chunk(f, entry)
+
+    def _chunk_at(self, t):
+        """Index of the last chunk starting at or before t."""
+        chunk = 0
+        for i, entry in enumerate(self.index):
+            if entry.start_time > t:
+                break
+            chunk = i
+        return chunk
+
+    def seek_plan(self, t):
+        """What replay needs to reconstruct the board at time t.
+
+        Returns (document chunk, page chunk, ink chunk): the chunks holding
+        the current document and page (None if there is none) and the
+        keyframe from which ink must be replayed.
+        """
+        document = page = None
+        ink = 0
+        for i, entry in enumerate(self.index[:self._chunk_at(t) + 1]):
+            if entry.keyframe == KIND_DOCUMENT:
+                document, page = i, None
+            elif entry.keyframe == KIND_CLEAR_ALL:
+                document = page = None
+            elif entry.keyframe == KIND_PAGE:
+                page = i
+            if entry.keyframe:
+                ink = i
+        return document, page, ink
+
+    def replay(self, target, speed=1.0, start=0.0, audio=None, stop_event=None):
+        """Replay into target at speed x real time, starting start seconds in.
+
+        The board state at ``start`` is restored first, without waiting.
+        ``target`` receives ``document(name, pdf_bytes)``,
+        ``page(page_number, total_pages, digest)``, ``point(data, origin)``,
+        ``erase(stroke_numbers)``, ``clear_annotations()``, ``clear_all()``
+        and, if ``audio`` is true
+        (the default at 1x), ``audio(pcm)``. ``speed`` may be
+        ``float("inf")`` to replay as fast as possible.
+        """
+        if not self.index:
+            return
+        if audio is None:
+            audio = speed == 1.0
+        start_at = self.start_time + start
+        document, page, ink = self.seek_plan(start_at)
+
+        with open(self.path, "rb") as f:
+            for chunk in (document, page):
+                if chunk is not None and chunk < ink:
+                    for event in self._read_chunk(f, self.index[chunk]):
+                        if event.kind in (KIND_DOCUMENT, KIND_PAGE):
+                            self._dispatch(target, event, None)
+                            break
+
+        decoder = None
+        if audio:
+            from voice_chat import ImaAdpcmCodec
+            decoder = ImaAdpcmCodec()
+        wall_start = time.time()
+        for event in self.events(ink):
+            if stop_event is not None and stop_event.is_set():
+                return
+            if event.time < start_at:
+                if event.kind != KIND_AUDIO:
+                    self._dispatch(target, event, None)
+                continue
+            delay = wall_start + (event.time - start_at) / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._dispatch(target, event, decoder)
+
+    def _dispatch(self, target, event, decoder):
+        if event.kind == KIND_POINT:
+            target.point(*event.payload)
+        elif event.kind == KIND_PAGE:
+            target.page(*event.payload)
+        elif event.kind == KIND_DOCUMENT:
+            target.document(*event.payload)
+        elif event.kind == KIND_ERASE:
+            target.erase(event.payload)
+        elif event.kind == KIND_CLEAR:
+            target.clear_annotations()
+        elif event.kind == KIND_CLEAR_ALL:
+            target.clear_all()
+        elif event.kind == KIND_AUDIO and decoder is not None:
+            target.audio(decoder.decode(event.payload[1:]))
+
+
+class SessionTarget:
+    """Replays a recording into a live ``WhiteboardSession``.
+
+    The session redraws the Tk whiteboard through its listeners and sends
+    everything on to connected students. Audio is written to ``audio_output``
+    (any object with ``write``, e.g. a stream from an audio backend) if given.
+    """
+
+    def __init__(self, session, audio_output=None):
+        self.session = session
+        self.audio_output = audio_output
+        self.stroke_ids = []  # Session stroke id of each stroke number since the last keyframe
+        self.known_ids = set()
+        self.shown_page = None  # Page a document load already showed, with no ink since
+
+    def _reset_strokes(self):
+        self.stroke_ids = []
+        self.known_ids = set()
+
+    def document(self, name, pdf_bytes):
+        self._reset_strokes()
+        self.session.load_pdf_bytes(pdf_bytes, name)
+        self.shown_page = 0
+
+    def page(self, page_number, total_pages, digest):
+        self._reset_strokes()
+        # Loading the document showed its first page; the page event recorded
+        # right after it would only render and announce it again
+        if page_number == self.shown_page:
+            self.shown_page = None
+            return
+        self.shown_page = None
+        self.session.goto_page(page_number)
+
+    def point(self, data, origin):
+        self.shown_page = None
+        # A distinct origin so front ends don't mistake replayed ink for their own
+        stroke_id = self.session.add_point(data, origin=f"replay:{origin}")
+        if stroke_id not in self.known_ids:
+            self.known_ids.add(stroke_id)
+            self.stroke_ids.append(stroke_id)
+
+    def erase(self, stroke_numbers):
+        ids = [self.stroke_ids[n] for n in stroke_numbers if n < len(self.stroke_ids)]
+        self.session.erase_strokes(ids)
+
+    def clear_annotations(self):
+        self._reset_strokes()
+        self.session.clear_annotations()
+
+    def clear_all(self):
+        self._reset_strokes()
+        self.shown_page = None
+        self.session.clear_all()
+
+    def audio(self, pcm):
+        if self.audio_output:
+            self.audio_output.write(pcm)
+
+
+def replay_in_background(path, session, speed=1.0, start=0.0):
+    """Replay a recording into a session on a daemon thread; returns an Event that stops it."""
+    recording = Recording(path)
+    stop_event = threading.Event()
+
+    def run():
+        print(f"Replaying {path} ({recording.duration:.0f} s) at {speed:g}x")
+        recording.replay(SessionTarget(session), speed=speed, start=start, audio=False,
+                         stop_event=stop_event)
+        print("Replay finished")
+
+    threading.Thread(target=run, daemon=True).start()
+    return stop_event
@@ -1,24 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, abort
 from flask_socketio import SocketIO
-from PIL import Image
 import base64
-import io
-import time
-import queue
+import os
+
+from classrooms import Classrooms, apply_erase
+from session import WhiteboardSession
+from strokes import parse_point
 
 # Flask App for Whiteboard
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Queue for coordinates
-coordinates_queue = queue.Queue()
+# Shared classroom state driven by the Tk front end and the HTTP API
+session = WhiteboardSession(socketio)
 
-# Connection management
-connection_requests = queue.Queue()
-connected_clients = set()
+# Further classrooms on /class/<name> namespaces, sharing the page cache;
+# the Socket.IO handlers for every classroom live in classrooms.py
+classrooms = Classrooms(socketio, session)
 
-# Client viewports information
-client_viewports = {}
+# Token required by the /api endpoints; without one only localhost may call them
+API_TOKEN = os.environ.get("WHITEBOARD_API_TOKEN")
 
 @app.route("/")
 def index():
@@ -29,6 +30,8 @@ def upload_image():
     """Handle image upload."""
     file = request.files.get("image")
     if file:
+        from PIL import Image
+
         file.save("uploaded_image.png")
         # Convert to base64 and emit
         with open("uploaded_image.png", "rb") as img_file:
@@ -45,59 +48,159 @@ def upload_image():
         return jsonify({"message": "Image uploaded successfully"}), 200
     return jsonify({"message": "No image uploaded"}), 400
 
-@socketio.on("connect")
-def handle_connect():
-    """Handle client connection request."""
-    client_id = request.sid
-    client_ip = request.remote_addr
-    print(f"Connection request from {client_ip} (ID: {client_id})")
-    
-    # Add to connection request queue with timestamp
-    connection_requests.put({
-        "client_id": client_id,
-        "client_ip": client_ip,
-        "timestamp": time.time(),
-        "status": "pending"  # New status field for tracking
-    })
-    
-    # Connection is pending until approved
-    return True
-@socketio.on("allow_student")
-def allowStudent(client_id):
-    socketio.emit("allow_student", {"allowed_sid": client_id})
-
-@socketio.on("send_coordinates")
-def handle_coordinates(data):
-    """Handle incoming coordinates from clients."""
-    client_id = request.sid
-    
-    # Only process if client is approved
-    if client_id in connected_clients:
-        coordinates_queue.put(data)
-        # Broadcast to all other approved clients
-        socketio.emit("coordinate_update", data, skip_sid=request.sid)
+# ----------------------------------------------------------------------
+# Programmatic session API
+# ----------------------------------------------------------------------
+
+@app.before_request
+def check_api_access():
+    """Restrict the session API to the token holder or localhost."""
+    if not request.path.startswith("/api/"):
+        return None
+    if API_TOKEN:
+        if request.headers.get("X-Session-Token") != API_TOKEN:
+            return jsonify({"message": "Invalid session token"}), 403
+    elif request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"message": "Session API is only available on localhost"}), 403
+    return None
+
+def _session():
+    """The classroom an API call is for: ?classroom=<name>, the default one without it."""
+    target = classrooms.get(request.args.get("classroom"))
+    if target is None:
+        abort(404)
+    return target
+
+@app.route("/api/classrooms", methods=["GET"])
+def api_list_classrooms():
+    return jsonify(classrooms.summary())
+
+@app.route("/api/classrooms", methods=["POST"])
+def api_create_classroom():
+    """Open a classroom: {"name": ..., "auto_approve": bool}."""
+    body = request.get_json(silent=True) or {}
+    try:
+        created = classrooms.create(str(body.get("name", "")))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    created.auto_approve = bool(body.get("auto_approve", created.auto_approve))
+    return jsonify({"namespace": created.namespace, **created.state()})
+
+@app.route("/api/classrooms/<name>", methods=["DELETE"])
+def api_close_classroom(name):
+    try:
+        closed = classrooms.close(name)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    if not closed:
+        return jsonify({"message": "No such classroom"}), 404
+    return jsonify(classrooms.summary())
+
+@app.route("/api/state", methods=["GET"])
+def api_state():
+    return jsonify(_session().state())
+
+@app.route("/api/strokes", methods=["GET"])
+def api_get_strokes():
+    return jsonify(_session().get_strokes())
+
+@app.route("/api/strokes", methods=["POST"])
+def api_add_strokes():
+    """Draw one point or a list of points as the teacher."""
+    target = _session()
+    points = request.get_json(silent=True)
+    if isinstance(points, dict):
+        points = [points]
+    if not isinstance(points, list):
+        return jsonify({"message": "Expected a point or a list of points"}), 400
+    # Check the whole batch first so a bad point can't leave it half drawn
+    for index, point in enumerate(points):
+        try:
+            parse_point(point)
+        except ValueError:
+            return jsonify({"message": f"Point {index} needs numeric x and y and a valid style"}), 400
+    for point in points:
+        target.add_point(point, origin="api")
+    target.end_stroke(origin="api")
+    return jsonify({"message": f"Added {len(points)} point(s)"}), 200
+
+@app.route("/api/erase", methods=["POST"])
+def api_erase():
+    """Erase by {"stroke_ids"}, {"x", "y"[, "radius"]} or {"polygon": [[x, y], ...]}."""
+    target = _session()
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"message": "Expected stroke_ids, x/y or polygon"}), 400
+    try:
+        erased = apply_erase(target, body)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"message": "Expected stroke_ids, x/y or polygon"}), 400
+    return jsonify({"stroke_ids": erased}), 200
+
+@app.route("/api/clear", methods=["POST"])
+def api_clear():
+    target = _session()
+    body = request.get_json(silent=True) or {}
+    if body.get("all"):
+        target.clear_all()
     else:
-        print(f"Rejected coordinates from unapproved client {client_id}")
-
-@socketio.on("register_viewport")
-def handle_viewport_registration(data):
-    """Handle client viewport registration."""
-    client_id = request.sid  # Socket ID for this client
-    
-    # Only process if client is approved
-    if client_id in connected_clients:
-        width = data.get("width", 0)
-        height = data.get("height", 0)
-        client_viewports[client_id] = {"width": width, "height": height}
-        # print(f"Client {client_id} registered viewport: {width}x{height}")
-
-@socketio.on("disconnect")
-def handle_disconnect():
-    """Clean up when client disconnects."""
-    client_id = request.sid
-    if client_id in client_viewports:
-        del client_viewports[client_id]
-    
-    if client_id in connected_clients:
-        connected_clients.remove(client_id)
-        print(f"Client {client_id} disconnected, removed from approved clients")
\ No newline at end of file
+        target.clear_annotations()
+    return jsonify(target.state())
+
+@app.route("/api/pdf", methods=["POST"])
+def api_upload_pdf():
+    """Load a PDF sent as a multipart "pdf" file or as the raw request body."""
+    target = _session()
+    file = request.files.get("pdf")
+    pdf_bytes = file.read() if file else request.get_data()
+    if not pdf_bytes:
+        return jsonify({"message": "No PDF uploaded"}), 400
+    try:
+        target.load_pdf_bytes(pdf_bytes, file.filename if file else "document.pdf")
+    except Exception as e:
+        return jsonify({"message": f"Could not open PDF: {e}"}), 400
+    return jsonify(target.state())
+
+@app.route("/api/page", methods=["POST"])
+def api_goto_page():
+    """Change page: {"page": n} (0-based) or {"step": +1/-1}."""
+    target = _session()
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({"message": 'Expected {"page": n} or {"step": n}'}), 400
+    try:
+        if "page" in body:
+            page = int(body["page"])
+        else:
+            page = target.current_page + int(body.get("step", 1))
+    except (TypeError, ValueError):
+        return jsonify({"message": "page and step must be integers"}), 400
+    changed = target.goto_page(page)
+    if not changed:
+        return jsonify({"message": "No such page"}), 400
+    return jsonify(target.state())
+
+@app.route("/api/requests", methods=["GET"])
+def api_requests():
+    return jsonify(_session().state()["pending_requests"])
+
+@app.route("/api/requests/<client_id>/approve", methods=["POST"])
+def api_approve(client_id):
+    target = _session()
+    if not target.approve(client_id):
+        return jsonify({"message": "No pending request for that client"}), 404
+    return jsonify(target.state())
+
+@app.route("/api/requests/<client_id>/reject", methods=["POST"])
+def api_reject(client_id):
+    target = _session()
+    if not target.reject(client_id):
+        return jsonify({"message": "No pending request for that client"}), 404
+    return jsonify(target.state())
+
+@app.route("/api/auto_approve", methods=["POST"])
+def api_auto_approve():
+    target = _session()
+    body = request.get_json(silent=True) or {}
+    target.auto_approve = bool(body.get("enabled", True))
+    return jsonify(target.state())
@@ -0,0 +1,374 @@
+import threading
+import time
+
+from admission import AdmissionState
+from assets import AssetCache
+from strokes import StrokeStore
+
+# Scale used when rasterizing PDF pages for clients and the teacher view
+PAGE_RENDER_SCALE = 2
+
+# Pending connection requests older than this are dropped (seconds)
+REQUEST_TIMEOUT = 120
+
+# Origin used for ink drawn by the teacher's own front end
+TEACHER = "teacher"
+
+# Default eraser radius in normalized page units
+ERASER_RADIUS = 0.01
+
+
+class WhiteboardSession:
+    """UI-independent state of one classroom session.
+
+    Holds the current document and page, the ink drawn on it and the
+    admission state of students. Front ends (the Tk window, the HTTP API,
+    benchmarks) drive the session through its methods and observe it by
+    registering listeners; the session emits the matching Socket.IO events
+    to students itself.
+
+    Each session talks to students on its own Socket.IO ``namespace``, so
+    several classrooms can share one server (see classrooms.py). Documents
+    and rendered pages come from ``cache``, which classrooms share so the
+    same slides are stored and rendered once.
+
+    Admission state lives in an ``AdmissionState`` with its own lock (see
+    admission.py), so approving students never waits on ink or page
+    rendering and readers on other threads use immutable snapshots.
+
+    Listeners are called as ``listener(event, payload)`` on the thread that
+    made the change, so front ends with thread affinity must marshal the
+    call themselves. Events:
+
+        "document_loaded"   {"name", "pdf_bytes"}
+        "page_changed"      {"page_number", "total_pages", "image"}
+        "point"             {"data", "origin"}   (data carries "stroke_id")
+        "stroke_ended"      {"origin"}
+        "strokes_erased"    {"stroke_ids"}
+        "clear_annotations" None
+        "clear_all"         None
+        "admission_changed" AdmissionSnapshot
+    """
+
+    def __init__(self, socketio, namespace="/", cache=None):
+        self.socketio = socketio
+        self.namespace = namespace
+        self.cache = cache if cache is not None else AssetCache()
+        self.lock = threading.RLock()
+        # Serializes use of the PyMuPDF document, which renders outside self.lock
+        self.render_lock = threading.Lock()
+        self.listeners = []
+
+        # Document state
+        self.pdf_document = None
+        self.document_digest = None  # Key of the document in the asset cache
+        self.document_name = None
+        self.current_page = 0
+        self.total_pages = 0
+        self.page_image = None  # Full-resolution PIL image of the current page
+
+        # Ink on the current page, packed per stroke (see strokes.py)
+        self.strokes = StrokeStore()
+
+        # Admission state: pending requests, approved students and their viewports
+        self.admission = AdmissionState()
+        self.auto_approve = False
+
+    # ------------------------------------------------------------------
+    # Listeners
+    # ------------------------------------------------------------------
+
+    def _emit(self, event, *args, **kwargs):
+        """Emit to this classroom's students only."""
+        self.socketio.emit(event, *args, namespace=self.namespace, **kwargs)
+
+    def add_listener(self, listener):
+        """Register a callable notified of every session change."""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, event, payload=None):
+        for listener in list(self.listeners):
+            try:
+                listener(event, payload)
+            except Exception as e:
+                print(f"Error in session listener for {event}: {e}")
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def admission_snapshot(self):
+        """Current AdmissionSnapshot; safe to read from any thread without locking."""
+        return self.admission.snapshot()
+
+    def request_connection(self, client_id, client_ip, question=""):
+        """Record a pending connection request from a student."""
+        self.admission.add_request(client_id, client_ip, question)
+        self._notify("admission_changed", self.admission.snapshot())
+
+    def list_pending_requests(self):
+        """Return the pending requests, oldest first."""
+        return self.admission.pending_list()
+
+    def approve(self, client_id):
+        """Approve a pending student. Returns False if there was no such request."""
+        request_data = self.admission.admit(client_id)
+        if request_data is None:
+            return False
+        self._emit("allow_student", {"allowed_sid": client_id})
+        self._emit("connection_approved", room=client_id)
+        print(f"Approved connection from {request_data['client_ip']} (ID: {client_id})")
+        self._notify("admission_changed", self.admission.snapshot())
+        return True
+
+    def reject(self, client_id):
+        """Reject a pending student and drop its connection."""
+        request_data = self.admission.drop_request(client_id)
+        if request_data is None:
+            return False
+        self._emit("connection_rejected", room=client_id)
+        try:
+            self.socketio.server.disconnect(client_id, namespace=self.namespace)
+        except Exception as e:
+            print(f"Error disconnecting client {client_id}: {e}")
+        print(f"Rejected connection from {request_data['client_ip']} (ID: {client_id})")
+        self._notify("admission_changed", self.admission.snapshot())
+        return True
+
+    def expire_stale_requests(self, max_age=REQUEST_TIMEOUT):
+        """Disconnect students whose request has waited longer than max_age."""
+        stale = self.admission.expire(time.time() - max_age)
+        for client_id in stale:
+            try:
+                self.socketio.server.disconnect(client_id, namespace=self.namespace)
+            except Exception as e:
+                print(f"Error disconnecting stale client {client_id}: {e}")
+        if stale:
+            self._notify("admission_changed", self.admission.snapshot())
+        return stale
+
+    def is_approved(self, client_id):
+        return self.admission.is_approved(client_id)
+
+    def client_count(self):
+        return self.admission.client_count()
+
+    def set_viewport(self, client_id, width, height):
+        self.admission.set_viewport(client_id, width, height)
+
+    def client_disconnected(self, client_id):
+        """Forget everything about a student that went away."""
+        with self.lock:
+            ended = self.strokes.end_stroke(client_id)
+        if ended:
+            self._notify("stroke_ended", {"origin": client_id})
+        was_pending, was_approved = self.admission.remove(client_id)
+        if was_approved:
+            print(f"Client {client_id} disconnected, removed from approved clients")
+        if was_pending or was_approved:
+            self._notify("admission_changed", self.admission.snapshot())
+
+    # ------------------------------------------------------------------
+    # Document and pages
+    # ------------------------------------------------------------------
+
+    def load_pdf(self, file_path):
+        """Open a PDF from disk, share it with students and show page 1."""
+        with open(file_path, "rb") as pdf_file:
+            pdf_bytes = pdf_file.read()
+        self.load_pdf_bytes(pdf_bytes, file_path)
+
+    def load_pdf_bytes(self, pdf_bytes, name="document.pdf"):
+        """Open a PDF from memory, share it with students and show page 1."""
+        import fitz  # PyMuPDF is imported on the first PDF to keep startup fast
+
+        # Classrooms opening the same file share its bytes and base64 text
+        digest, pdf_bytes = self.cache.add_document(pdf_bytes)
+        try:
+            document = fitz.open(stream=pdf_bytes, filetype="pdf")
+        except Exception:
+            self.cache.release_document(digest)
+            raise
+        with self.lock:
+            self._close_document()
+            self.pdf_document = document
+            self.document_digest = digest
+            self.document_name = name
+            self.total_pages = len(document)
+            self.current_page = 0
+
+        self._emit("new_pdf", {
+            "pdf_data": self.cache.document_b64(digest),
+            "total_pages": self.total_pages,
+            "current_page": self.current_page
+        })
+        self._notify("document_loaded", {"name": name, "pdf_bytes": pdf_bytes})
+        self.goto_page(0)
+        print(f"PDF uploaded: {name}, {self.total_pages} pages")
+
+    def _render_page(self, document, page_num):
+        """Rasterize a page of document."""
+        import fitz
+        from PIL import Image
+
+        with self.render_lock:
+            if document.is_closed:
+                raise ValueError("The document was closed while its page was being rendered")
+            page = document[page_num]
+            # Convert to an image with higher resolution for clarity
+            pix = page.get_pixmap(matrix=fitz.Matrix(PAGE_RENDER_SCALE, PAGE_RENDER_SCALE))
+        return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    def goto_page(self, page_num):
+        """Render a page, broadcast it and make it the current page."""
+        with self.lock:
+            if not self.pdf_document or page_num < 0 or page_num >= self.total_pages:
+                return False
+            document, digest = self.pdf_document, self.document_digest
+
+        # Rendered and PNG-encoded once per page for all classrooms, without
+        # holding up ink from this room meanwhile
+        try:
+            rendered = self.cache.page(digest, page_num, PAGE_RENDER_SCALE,
+                                       lambda: self._render_page(document, page_num))
+        except ValueError as e:
+            print(f"Page {page_num + 1} not shown: {e}")
+            return False
+
+        with self.lock:
+            if self.document_digest != digest or page_num >= self.total_pages:
+                return False  # Another document was opened meanwhile
+            img = rendered.image
+            self.current_page = page_num
+            self.page_image = img
+            self.strokes.clear()
+
+        self._emit("change_page", {
+            "page_image": rendered.png_b64,
+            "page_number": page_num,
+            "canvas_width": img.width,
+            "canvas_height": img.height
+        })
+        self._notify("page_changed", {
+            "page_number": page_num,
+            "total_pages": self.total_pages,
+            "image": img,
+        })
+        print(f"Displayed PDF page {page_num+1}/{self.total_pages}")
+        return True
+
+    def next_page(self):
+        return self.goto_page(self.current_page + 1)
+
+    def previous_page(self):
+        return self.goto_page(self.current_page - 1)
+
+    def _close_document(self):
+        if self.pdf_document:
+            with self.render_lock:
+                self.pdf_document.close()
+        if self.document_digest:
+            self.cache.release_document(self.document_digest)
+        self.pdf_document = None
+        self.document_digest = None
+
+    def close_document(self):
+        with self.lock:
+            self._close_document()
+            self.document_name = None
+            self.page_image = None
+            self.total_pages = 0
+            self.current_page = 0
+
+    # ------------------------------------------------------------------
+    # Ink
+    # ------------------------------------------------------------------
+
+    def add_point(self, data, origin=TEACHER, skip_sid=None):
+        """Record one pen sample and fan it out to students.
+
+        ``data`` is the wire payload with normalized ``x``/``y``,
+        ``is_start``, ``line_width`` and ``pen_color``. The id of the stroke
+        the point joined is added to it as ``stroke_id`` and returned.
+        Raises ValueError for a malformed sample, which is dropped.
+        """
+        with self.lock:
+            stroke_id = self.strokes.add_point(data, origin).id
+        data["stroke_id"] = stroke_id
+        self._emit("coordinate_update", data, skip_sid=skip_sid)
+        self._notify("point", {"data": data, "origin": origin})
+        return stroke_id
+
+    def end_stroke(self, origin=TEACHER):
+        with self.lock:
+            ended = self.strokes.end_stroke(origin)
+        if ended:
+            self._notify("stroke_ended", {"origin": origin})
+
+    def erase_strokes(self, stroke_ids, skip_sid=None):
+        """Delete strokes by id and tell students which ones went. Returns the ids deleted."""
+        with self.lock:
+            erased = self.strokes.remove(stroke_ids)
+        if erased:
+            self._emit("erase_strokes", {"stroke_ids": erased}, skip_sid=skip_sid)
+            self._notify("strokes_erased", {"stroke_ids": erased})
+        return erased
+
+    def erase_at(self, x, y, radius=ERASER_RADIUS, skip_sid=None):
+        """Stroke eraser: delete every stroke passing within radius of (x, y)."""
+        with self.lock:
+            hits = self.strokes.hit_test(x, y, radius)
+        return self.erase_strokes(hits, skip_sid=skip_sid) if hits else []
+
+    def select_lasso(self, polygon):
+        """Return the ids of the strokes entirely inside polygon (normalized vertices)."""
+        with self.lock:
+            return self.strokes.select_polygon(polygon)
+
+    def clear_annotations(self):
+        """Clear the ink on the current page."""
+        with self.lock:
+            self.strokes.clear()
+        self._emit("clear_annotations")
+        self._notify("clear_annotations")
+
+    def clear_all(self):
+        """Clear ink and close the current document."""
+        with self.lock:
+            self.strokes.clear()
+        self.close_document()
+        self._emit("clear_all")
+        self._notify("clear_all")
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def get_strokes(self):
+        """Return a copy of the strokes on the current page."""
+        with self.lock:
+            return self.strokes.to_points()
+
+    def state(self):
+        """Return a JSON-serializable summary of the session."""
+        admission = self.admission.snapshot()
+        with self.lock:
+            return {
+                "document": self.document_name,
+                "current_page": self.current_page,
+                "total_pages": self.total_pages,
+                "strokes": len(self.strokes),
+                "points": self.strokes.point_count(),
+                "connected_clients": sorted(admission.connected_clients),
+                "client_viewports": {cid: dict(v) for cid, v in admission.client_viewports.items()},
+                "pending_requests": [
+                    {k: r[k] for k in ("client_id", "client_ip", "timestamp", "question")}
+                    for r in admission.pending_requests.values()
+                ],
+                "auto_approve": self.auto_approve,
+                "admission_version": admission.version,
+            }
@@ -0,0 +1,153 @@
+"""Uniform-grid spatial index and hit tests for strokes.
+
+Strokes live in normalized page coordinates (0-1), so a fixed grid over
+the unit square works for every page and zoom level. Each stroke is
+registered in every cell its bounding box touches; a query only looks at
+the cells under the query rectangle and then filters by bounding box, so
+its cost depends on the ink near the pointer rather than on the ink on the
+page. Exact geometry (distance to segments, point in polygon) is only
+computed for the few strokes that survive.
+"""
+
+# Cells per side of the unit square
+GRID_SIZE = 64
+
+
+class StrokeGrid:
+    """Maps grid cells to the ids of the strokes whose bounding box touches them."""
+
+    def __init__(self, size=GRID_SIZE):
+        self.size = size
+        self.cells = {}  # {(column, row): set of stroke ids}
+        self.boxes = {}  # {stroke id: [x0, y0, x1, y1, first column, first row, last column, last row]}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cell(self, v):
+        return min(self.size - 1, max(0, int(v * self.size)))
+
+    def _cell_range(self, box):
+        return self._cell(box[0]), self._cell(box[1]), self._cell(box[2]), self._cell(box[3])
+
+    def _add_cells(self, stroke_id, c0, r0, c1, r1, skip=None):
+        cells = self.cells
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                if skip and skip[0] <= column <= skip[2] and skip[1] <= row <= skip[3]:
+                    continue
+                ids = cells.get((column, row))
+                if ids is None:
+                    cells[(column, row)] = {stroke_id}
+                else:
+                    ids.add(stroke_id)
+
+    def insert(self, stroke_id, x0, y0, x1, y1):
+        cells = self._cell_range((x0, y0, x1, y1))
+        self.boxes[stroke_id] = [x0, y0, x1, y1, *cells]
+        self._add_cells(stroke_id, *cells)
+
+    def extend(self, stroke_id, x, y):
+        """Grow a stroke's box to include (x, y), registering it in any new cells."""
+        box = self.boxes.get(stroke_id)
+        if box is None:
+            self.insert(stroke_id, x, y, x, y)
+            return
+        # Called for every pen sample, so the common "still inside" case is kept cheap
+        grew = False
+        if x < box[0]:
+            box[0], grew = x, True
+        elif x > box[2]:
+            box[2], grew = x, True
+        if y < box[1]:
+            box[1], grew = y, True
+        elif y > box[3]:
+            box[3], grew = y, True
+        if not grew:
+            return
+        new = self._cell_range(box)
+        old = tuple(box[4:])
+        if new != old:
+            box[4:] = new
+            self._add_cells(stroke_id, *new, skip=old)
+
+    def remove(self, stroke_id):
+        box = self.boxes.pop(stroke_id, None)
+        if box is None:
+            return
+        c0, r0, c1, r1 = box[4:]
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                ids = self.cells.get((column, row))
+                if ids is not None:
+                    ids.discard(stroke_id)
+                    if not ids:
+                        del self.cells[(column, row)]
+
+    def clear(self):
+        self.cells = {}
+        self.boxes = {}
+
+    def query(self, x0, y0, x1, y1):
+        """Ids of the strokes whose bounding box intersects the rectangle."""
+        c0, r0, c1, r1 = self._cell(x0), self._cell(y0), self._cell(x1), self._cell(y1)
+        candidates = set()
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                ids = self.cells.get((column, row))
+                if ids:
+                    candidates |= ids
+        boxes = self.boxes
+        return [i for i in candidates
+                if boxes[i][0] <= x1 and boxes[i][2] >= x0 and boxes[i][1] <= y1 and boxes[i][3] >= y0]
+
+
+def _concatenate(polylines):
+    """Stack (n, 2) arrays into one float64 array plus each polyline's first row."""
+    import numpy as np
+
+    points = np.concatenate(polylines).astype(np.float64)
+    lengths = np.fromiter((len(p) for p in polylines), dtype=np.intp, count=len(polylines))
+    starts = np.zeros(len(polylines), dtype=np.intp)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    return points, starts, lengths
+
+
+def polyline_distances(polylines, x, y):
+    """Smallest distance from (x, y) to each of a list of (n, 2) polylines.
+
+    All candidates are handled in one vectorized pass; each row is the
+    segment from a point to the next one, and the last point of a polyline
+    is paired with itself so single-point strokes work too.
+    """
+    import numpy as np
+
+    points, starts, lengths = _concatenate(polylines)
+    ends = starts + lengths - 1
+    b = np.empty_like(points)
+    b[:-1] = points[1:]
+    b[ends] = points[ends]
+    ab = b - points
+    ap = np.array((x, y)) - points
+    length2 = np.einsum("ij,ij->i", ab, ab)
+    t = np.clip(np.einsum("ij,ij->i", ap, ab) / np.where(length2 > 0, length2, 1), 0, 1)
+    offset = ap - ab * t[:, None]
+    return np.sqrt(np.minimum.reduceat(np.einsum("ij,ij->i", offset, offset), starts))
+
+
+def polylines_in_polygon(polylines, polygon):
+    """Boolean per polyline: are all of its points inside polygon (even-odd rule)?"""
+    import numpy as np
+
+    points, starts, _ = _concatenate(polylines)
+    px, py = points[:, 0], points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    vertices = np.asarray(polygon, dtype=np.float64)
+    for (x0, y0), (x1, y1) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        crosses = (y0 > py) != (y1 > py)
+        if not crosses.any():
+            continue
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (px < x_at)
+    return np.logical_and.reduceat(inside, starts)
@@ -0,0 +1,332 @@
+"""Compact storage for the ink on a page.
+
+A stroke keeps its style (origin, pen color, line width) once and its pen
+samples as packed float32 ``x, y`` pairs in an ``array('f')``, instead of
+one dict per sample as they arrive over the wire. Strokes can be appended
+to in bulk, sliced, viewed as NumPy arrays and serialized without ever
+creating per-point objects; dicts are only built again when a caller asks
+for the wire format.
+
+Every stroke gets an id, unique within its store for the store's lifetime,
+which front ends and students use to delete it again. The store keeps a
+``StrokeGrid`` over the stroke bounding boxes for the eraser and lasso.
+
+The trade-off (``benchmarks/stroke_store.py``, 2000 strokes x 100
+points): about 22 bytes held per point against 193 for dicts, roughly
+half of it the grid, but single-sample appends run at about 0.6 million
+points/s against 3 million for appending a dict, because every sample is
+packed and grows its stroke's grid box. Bulk appends (``begin_stroke``
+with ``points``) reach about 5 million.
+
+Serialized layout (little-endian)::
+
+    STORE_HEADER  <4sI>        b"STRK", stroke count
+    per stroke:
+      STROKE_HEADER <IfIBB>    id, line width, point count, color length, origin length
+      color, origin            utf-8
+      coords                   point count * 2 float32
+"""
+import math
+import struct
+import sys
+from array import array
+
+from spatial import StrokeGrid, polyline_distances, polylines_in_polygon
+
+DEFAULT_LINE_WIDTH = 3
+DEFAULT_PEN_COLOR = "blue"
+MAX_COLOR_LENGTH = 63  # Characters, so the utf-8 color fits its one-byte length
+
+STORE_MAGIC = b"STRK"
+STORE_HEADER = struct.Struct("<4sI")
+STROKE_HEADER = struct.Struct("<IfIBB")
+
+
+def _to_le(coords):
+    """Return coords as little-endian bytes."""
+    if sys.byteorder == "little":
+        return coords.tobytes()
+    swapped = array("f", coords)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+class Stroke:
+    """One stroke: style stored once plus packed coordinates."""
+
+    __slots__ = ("id", "origin", "pen_color", "line_width", "coords")
+
+    def __init__(self, origin, pen_color=DEFAULT_PEN_COLOR, line_width=DEFAULT_LINE_WIDTH, coords=None,
+                 stroke_id=None):
+        self.id = stroke_id
+        self.origin = origin
+        self.pen_color = pen_color
+        self.line_width = line_width
+        self.coords = coords if coords is not None else array("f")  # x0, y0, x1, y1, ...
+
+    def __len__(self):
+        return len(self.coords) // 2
+
+    def __getitem__(self, index):
+        """Return point ``index`` as ``(x, y)``, or a new Stroke for a slice."""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                coords = self.coords[2 * start:2 * stop]
+            else:
+                coords = array("f")
+                for i in range(start, stop, step):
+                    coords.extend(self.coords[2 * i:2 * i + 2])
+            return Stroke(self.origin, self.pen_color, self.line_width, coords)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("stroke index out of range")
+        return self.coords[2 * index], self.coords[2 * index + 1]
+
+    def append(self, x, y):
+        self.coords.append(x)
+        self.coords.append(y)
+
+    def extend(self, points):
+        """Append many points: flat ``x, y`` floats, ``(x, y)`` pairs or an (n, 2) array."""
+        if hasattr(points, "dtype"):
+            self.coords.frombytes(points.astype("f4").tobytes())
+        elif isinstance(points, array) and points.typecode == "f":
+            self.coords.extend(points)
+        else:
+            points = list(points)
+            if points and isinstance(points[0], (tuple, list)):
+                for x, y in points:
+                    self.coords.append(x)
+                    self.coords.append(y)
+            else:
+                self.coords.extend(points)
+
+    def as_array(self):
+        """Return an (n, 2) float32 NumPy view of the coordinates (no copy)."""
+        import numpy as np
+
+        return np.frombuffer(self.coords, dtype=np.float32).reshape(-1, 2)
+
+    def points(self):
+        """Return the stroke in the wire format: one dict per point."""
+        return [
+            {"x": self.coords[i], "y": self.coords[i + 1], "is_start": i == 0,
+             "line_width": self.line_width, "pen_color": self.pen_color}
+            for i in range(0, len(self.coords), 2)
+        ]
+
+    def bounds(self):
+        """Bounding box ``(x0, y0, x1, y1)`` of the points."""
+        xs, ys = self.coords[0::2], self.coords[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def nbytes(self):
+        """Approximate memory held by the coordinates."""
+        return self.coords.buffer_info()[1] * self.coords.itemsize
+
+    def to_bytes(self):
+        color = self.pen_color.encode("utf-8")[:255]
+        origin = str(self.origin).encode("utf-8")[:255]
+        header = STROKE_HEADER.pack(self.id or 0, self.line_width, len(self), len(color), len(origin))
+        return header + color + origin + _to_le(self.coords)
+
+    @classmethod
+    def from_bytes(cls, buffer, offset=0):
+        """Decode one stroke at ``offset``; returns ``(stroke, next_offset)``."""
+        stroke_id, line_width, count, color_len, origin_len = STROKE_HEADER.unpack_from(buffer, offset)
+        offset += STROKE_HEADER.size
+        color = bytes(buffer[offset:offset + color_len]).decode("utf-8")
+        offset += color_len
+        origin = bytes(buffer[offset:offset + origin_len]).decode("utf-8")
+        offset += origin_len
+        coords = array("f")
+        coords.frombytes(bytes(buffer[offset:offset + count * 8]))
+        if sys.byteorder != "little":
+            coords.byteswap()
+        if line_width == int(line_width):
+            line_width = int(line_width)
+        return cls(origin, color, line_width, coords, stroke_id or None), offset + count * 8
+
+
+def parse_point(data):
+    """Validate a wire-format pen sample; returns (x, y, pen color, line width).
+
+    Raises ValueError for anything that can't be stored and drawn.
+    """
+    try:
+        x, y = float(data["x"]), float(data["y"])
+        line_width = data.get("line_width", DEFAULT_LINE_WIDTH)
+        pen_color = data.get("pen_color", DEFAULT_PEN_COLOR)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError(f"Malformed pen sample: {data!r}") from None
+    if (not (math.isfinite(x) and math.isfinite(y))
+            or isinstance(line_width, bool) or not isinstance(line_width, (int, float))
+            or not 0 < line_width < math.inf
+            or not isinstance(pen_color, str) or len(pen_color) > MAX_COLOR_LENGTH):
+        raise ValueError(f"Malformed pen sample: {data!r}")
+    return x, y, pen_color, line_width
+
+class StrokeStore:
+    """The strokes on a page plus the stroke each origin is currently drawing.
+
+    Strokes are kept in creation order, keyed by id. Not thread-safe on its
+    own; ``WhiteboardSession`` guards it with its lock.
+    """
+
+    def __init__(self, strokes=None):
+        self.strokes = {}  # {stroke id: Stroke}, oldest first
+        self.open_strokes = {}  # {origin: Stroke currently being drawn}
+        self.grid = StrokeGrid()
+        self.next_id = 1
+        for stroke in strokes or ():
+            self._insert(stroke)
+
+    def __len__(self):
+        return len(self.strokes)
+
+    def __iter__(self):
+        return iter(self.strokes.values())
+
+    def __contains__(self, stroke_id):
+        return stroke_id in self.strokes
+
+    def __getitem__(self, index):
+        """Return the stroke at a position, or a new StrokeStore sharing the strokes of a slice."""
+        strokes = list(self.strokes.values())
+        if isinstance(index, slice):
+            return StrokeStore(strokes[index])
+        return strokes[index]
+
+    def get(self, stroke_id):
+        return self.strokes.get(stroke_id)
+
+    def _insert(self, stroke):
+        if stroke.id is None:
+            stroke.id = self.next_id
+        self.next_id = max(self.next_id, stroke.id + 1)
+        self.strokes[stroke.id] = stroke
+        if len(stroke):
+            self.grid.insert(stroke.id, *stroke.bounds())
+        return stroke
+
+    def add_point(self, data, origin):
+        """Append one wire-format pen sample; returns the stroke it went to.
+
+        Raises ValueError, leaving the store untouched, for a sample that
+        can't be drawn (missing or non-numeric coordinates, bad style).
+        """
+        x, y, pen_color, line_width = parse_point(data)
+        stroke = self.open_strokes.get(origin)
+        if data.get("is_start", False) or stroke is None:
+            stroke = self.begin_stroke(origin, pen_color, line_width)
+        elif stroke.pen_color != pen_color or stroke.line_width != line_width:
+            # Style changed mid-stroke: continue from the last point in the new style
+            last = stroke[-1] if len(stroke) else None
+            stroke = self.begin_stroke(origin, pen_color, line_width)
+            if last is not None:
+                stroke.append(*last)
+                self.grid.extend(stroke.id, *last)
+        coords = stroke.coords
+        coords.append(x)
+        coords.append(y)
+        self.grid.extend(stroke.id, x, y)
+        return stroke
+
+    def add_points(self, points, origin):
+        """Append a batch of wire-format pen samples from one origin."""
+        for data in points:
+            self.add_point(data, origin)
+
+    def begin_stroke(self, origin, pen_color=DEFAULT_PEN_COLOR, line_width=DEFAULT_LINE_WIDTH, points=None):
+        """Start a new stroke for origin, optionally filled with ``points`` in bulk."""
+        stroke = Stroke(origin, pen_color, line_width)
+        if points is not None:
+            stroke.extend(points)
+        self._insert(stroke)
+        self.open_strokes[origin] = stroke
+        return stroke
+
+    def end_stroke(self, origin):
+        """Close origin's open stroke; returns False if it had none."""
+        return self.open_strokes.pop(origin, None) is not None
+
+    def remove(self, stroke_ids):
+        """Delete strokes by id; returns the ids that were present."""
+        removed = []
+        for stroke_id in stroke_ids:
+            stroke = self.strokes.pop(stroke_id, None)
+            if stroke is None:
+                continue
+            self.grid.remove(stroke_id)
+            if self.open_strokes.get(stroke.origin) is stroke:
+                del self.open_strokes[stroke.origin]
+            removed.append(stroke_id)
+        return removed
+
+    def clear(self):
+        # Ids keep counting up so late deletions can't hit new strokes
+        self.strokes = {}
+        self.open_strokes = {}
+        self.grid.clear()
+
+    def hit_test(self, x, y, radius):
+        """Ids of the strokes passing within radius of (x, y), in normalized units."""
+        candidates = self.grid.query(x - radius, y - radius, x + radius, y + radius)
+        if not candidates:
+            return []
+        distances = polyline_distances([self.strokes[i].as_array() for i in candidates], x, y)
+        return [i for i, distance in zip(candidates, distances) if distance <= radius]
+
+    def select_polygon(self, polygon):
+        """Ids of the strokes lying entirely inside polygon, a list of (x, y) vertices."""
+        if len(polygon) < 3:
+            return []
+        xs = [p[0] for p in polygon]
+        ys = [p[1] for p in polygon]
+        x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+        boxes = self.grid.boxes
+        # Strokes sticking out of the lasso's bounding box can't be inside it
+        candidates = [i for i in self.grid.query(x0, y0, x1, y1)
+                      if boxes[i][0] >= x0 and boxes[i][1] >= y0 and boxes[i][2] <= x1 and boxes[i][3] <= y1]
+        if not candidates:
+            return []
+        inside = polylines_in_polygon([self.strokes[i].as_array() for i in candidates], polygon)
+        return [i for i, enclosed in zip(candidates, inside) if enclosed]
+
+    def bounds(self, stroke_ids):
+        """Bounding box of the given strokes, or None if there are none."""
+        boxes = [self.grid.boxes[i] for i in stroke_ids if i in self.grid.boxes]
+        if not boxes:
+            return None
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def point_count(self):
+        return sum(len(stroke) for stroke in self)
+
+    def nbytes(self):
+        return sum(stroke.nbytes() for stroke in self)
+
+    def to_points(self):
+        """Return the strokes in the wire format: a list of lists of point dicts."""
+        return [stroke.points() for stroke in self]
+
+    def to_bytes(self):
+        parts = [STORE_HEADER.pack(STORE_MAGIC, len(self.strokes))]
+        parts.extend(stroke.to_bytes() for stroke in self)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        buffer = memoryview(data)
+        magic, count = STORE_HEADER.unpack_from(buffer, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError("Not a serialized stroke store")
+        offset = STORE_HEADER.size
+        strokes = []
+        for _ in range(count):
+            stroke, offset = Stroke.from_bytes(buffer, offset)
+            strokes.append(stroke)
+        return cls(strokes)
@@ -1,37 +1,845 @@
+import select
 import socket
-import pyaudio
+import struct
 import threading
+import math
 import time
-from tkinter import StringVar
+import warnings
+from collections import deque, namedtuple
+
+import numpy as np
+
+from audio_backend import PyAudioBackend
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop  # C implementation of IMA-ADPCM; removed in Python 3.13
+    except ImportError:
+        audioop = None
 
 # Audio settings
 CHUNK = 512
-FORMAT = pyaudio.paInt16
+FORMAT = 8  # pyaudio.paInt16; pyaudio itself is imported on first connection
 CHANNELS = 1
 RATE = 22050
 VOICE_PORT = 8000
 
+# Full scale of 16-bit PCM
+FULL_SCALE = 32768.0
+
+# Connection handshake: a client that wants a codec sends
+#   b"VOICE/1 adpcm,ulaw,pcm\n"
+# and the server answers b"VOICE/1 <chosen>\n". After that every chunk travels
+# as a FRAME_HEADER (type, payload length) followed by the encoded payload.
+# Peers that don't send the handshake get the legacy raw PCM byte stream.
+HANDSHAKE_MAGIC = b"VOICE/1 "
+HANDSHAKE_TIMEOUT = 0.5
+FRAME_HEADER = struct.Struct("!BH")
+FRAME_AUDIO = 0
+FRAME_SILENCE = 1  # payload: one byte, the comfort-noise level as -dBFS
+
+# Silence suppression: while the speaker is quiet only a comfort-noise
+# marker is sent, once at the start of the pause and then every
+# SID_INTERVAL chunks so the peer's background noise (and a UDP session)
+# stays alive.
+SID_INTERVAL = 8
+
+LevelReading = namedtuple("LevelReading", "rms_dbfs peak_dbfs clipping meter percent clip_count")
+
+class LevelMeter:
+    """Vectorized level metering for 16-bit PCM capture buffers.
+
+    ``update`` does a handful of NumPy reductions per chunk and publishes the
+    result as a single immutable ``LevelReading``, so UI code can poll
+    ``reading`` from any thread without locking.
+    """
+
+    def __init__(self, attack=0.5, release=0.1, clip_level=32000, floor_dbfs=-60.0):
+        self.attack = attack
+        self.release = release
+        self.clip_level = clip_level
+        self.floor_dbfs = floor_dbfs
+        self.meter = 0.0
+        self.clip_count = 0
+        self.reading = LevelReading(floor_dbfs, floor_dbfs, False, 0.0, 0, 0)
+
+    def _to_dbfs(self, value):
+        if value <= 0:
+            return self.floor_dbfs
+        return max(self.floor_dbfs, 20.0 * np.log10(value / FULL_SCALE))
+
+    def update(self, data):
+        """Meter one buffer of little-endian int16 samples."""
+        samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+        if samples.size == 0:
+            return self.reading
+        as_float = samples.astype(np.float32)
+        rms = float(np.sqrt(np.dot(as_float, as_float) / samples.size))
+        # max/min instead of abs() so -32768 can't overflow int16
+        peak = max(int(samples.max()), -int(samples.min()))
+        clipping = peak >= self.clip_level
+        if clipping:
+            self.clip_count += 1
+
+        # Meter ballistics: fast attack, slow release
+        level = rms / FULL_SCALE
+        coeff = self.attack if level > self.meter else self.release
+        self.meter += coeff * (level - self.meter)
+
+        meter_dbfs = self._to_dbfs(self.meter * FULL_SCALE)
+        percent = int(100 * (meter_dbfs - self.floor_dbfs) / -self.floor_dbfs)
+        self.reading = LevelReading(self._to_dbfs(rms), self._to_dbfs(peak), clipping,
+                                    self.meter, percent, self.clip_count)
+        return self.reading
+
+    def reset(self):
+        self.meter = 0.0
+        self.clip_count = 0
+        self.reading = LevelReading(self.floor_dbfs, self.floor_dbfs, False, 0.0, 0, 0)
+
+class VoiceActivityDetector:
+    """Energy-based voice activity detection with an adaptive noise floor.
+
+    Each chunk is split into ``blocks`` sub-blocks and judged by its loudest
+    one, so a word starting in the last few milliseconds of a chunk still
+    counts. The noise floor is the quietest chunk of the last ``window``
+    chunks, which follows steady background noise (fans, projectors) but
+    not speech. After the last speech chunk the detector stays active for
+    ``hangover`` chunks so word endings and short pauses aren't clipped.
+    """
+
+    def __init__(self, threshold_db=9.0, min_speech_dbfs=-50.0, hangover=8, blocks=4,
+                 window=86, floor_dbfs=-90.0):
+        self.threshold_db = threshold_db
+        self.min_speech_dbfs = min_speech_dbfs
+        self.hangover = hangover
+        self.blocks = blocks
+        self.floor_dbfs = floor_dbfs
+        self.history = np.full(window, floor_dbfs)
+        self.filled = 0
+        self.hold = 0
+        self.level_dbfs = floor_dbfs
+        self.noise_dbfs = floor_dbfs
+
+    def _dbfs(self, power):
+        return np.maximum(self.floor_dbfs, 10.0 * np.log10(power / FULL_SCALE ** 2 + 1e-12))
+
+    def update(self, data):
+        """Classify one buffer of little-endian int16 samples; True while speech is active."""
+        samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+        usable = samples.size - samples.size % self.blocks
+        if usable == 0:
+            return self.hold > 0
+        blocks = samples[:usable].astype(np.float32).reshape(self.blocks, -1)
+        block_power = np.einsum("ij,ij->i", blocks, blocks) / blocks.shape[1]
+        block_dbfs = self._dbfs(block_power)
+        self.level_dbfs = float(self._dbfs(block_power.mean()))
+
+        self.history[self.filled % self.history.size] = self.level_dbfs
+        self.filled += 1
+        self.noise_dbfs = float(self.history.min())
+
+        threshold = max(self.noise_dbfs + self.threshold_db, self.min_speech_dbfs)
+        if block_dbfs.max() > threshold:
+            self.hold = self.hangover + 1
+        if self.hold:
+            self.hold -= 1
+            return True
+        return False
+
+    def reset(self):
+        self.history.fill(self.floor_dbfs)
+        self.filled = 0
+        self.hold = 0
+        self.level_dbfs = self.noise_dbfs = self.floor_dbfs
+
+class SilenceSuppressor:
+    """Decides per captured chunk what to transmit.
+
+    ``process`` returns FRAME_AUDIO for speech, FRAME_SILENCE when a
+    comfort-noise marker (see ``marker``) is due, or None to send nothing.
+    Speech resumes on the first loud chunk; there is no onset delay.
+    """
+
+    def __init__(self, detector=None, sid_interval=SID_INTERVAL):
+        self.detector = detector or VoiceActivityDetector()
+        self.sid_interval = sid_interval
+        self.since_marker = None
+        self.frames = self.speech = self.markers = 0
+
+    def process(self, data):
+        self.frames += 1
+        if self.detector.update(data):
+            self.speech += 1
+            self.since_marker = None
+            return FRAME_AUDIO
+        if self.since_marker is None or self.since_marker >= self.sid_interval - 1:
+            self.since_marker = 0
+            self.markers += 1
+            return FRAME_SILENCE
+        self.since_marker += 1
+        return None
+
+    def marker(self):
+        """Comfort-noise marker payload: the background level as -dBFS."""
+        return bytes([int(min(127, max(0, round(-self.detector.level_dbfs))))])
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "speech_frames": self.speech,
+            "markers": self.markers,
+            "suppressed_fraction": 1 - self.speech / self.frames if self.frames else 0.0,
+        }
+
+    def reset(self):
+        self.detector.reset()
+        self.since_marker = None
+        self.frames = self.speech = self.markers = 0
+
+class ComfortNoise:
+    """Receiver side of silence suppression: noise at the level of the last marker."""
+
+    def __init__(self, samples=CHUNK, seed=None):
+        self.samples = samples
+        self.rng = np.random.default_rng(seed)
+        self.active = False
+        self.scale = 0.0
+
+    def start(self, marker):
+        self.scale = FULL_SCALE * 10 ** (-marker[0] / 20) if marker else 0.0
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def generate(self):
+        noise = self.rng.standard_normal(self.samples, dtype=np.float32) * self.scale
+        return np.clip(noise, -32768, 32767).astype("<i2").tobytes()
+
+class Codec:
+    """Base class for voice codecs.
+
+    A codec instance belongs to one direction of one connection and may keep
+    state between frames, but every encoded frame carries what is needed to
+    decode it on its own so frames can be dropped or skipped.
+    """
+    name = None
+    bits_per_sample = 16
+    min_payload = 0  # Shortest well-formed frame in bytes; shorter ones are malformed
+
+    def encode(self, pcm):
+        """Encode little-endian int16 mono PCM bytes into one frame."""
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """Decode one frame back to little-endian int16 PCM bytes."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget inter-frame state; call before encoding audio that doesn't follow the last frame."""
+
+    def frame_bytes(self, samples=CHUNK):
+        """Encoded size of a frame of the given number of samples."""
+        return samples * self.bits_per_sample // 8
+
+
+class PcmCodec(Codec):
+    """Uncompressed 16-bit PCM (353 kbit/s at 22050 Hz)."""
+    name = "pcm"
+
+    def encode(self, pcm):
+        return pcm
+
+    def decode(self, payload):
+        return payload
+
+
+def _build_ulaw_tables():
+    """Build G.711 mu-law lookup tables for all 65536 inputs and 256 codes.
+
+    Bit-exact with audioop.lin2ulaw/ulaw2lin (the Sun g711.c reference).
+    """
+    bias = 0x84
+    samples = np.arange(-32768, 32768, dtype=np.int32)
+    value = samples >> 2  # 14-bit
+    negative = value < 0
+    mask = np.where(negative, 0x7F, 0xFF)
+    value = np.minimum(np.where(negative, -value, value), 8159) + (bias >> 2)
+    segment = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), value)
+    codes = np.where(segment >= 8, 0x7F,
+                     (np.minimum(segment, 7) << 4) | ((value >> (np.minimum(segment, 7) + 1)) & 0x0F))
+    codes = codes ^ mask
+    # Index the encode table with the int16 sample reinterpreted as uint16
+    encode_table = np.empty(65536, dtype=np.uint8)
+    encode_table[samples.astype(np.int16).view(np.uint16)] = codes
+
+    inverted = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (inverted >> 4) & 0x07
+    mantissa = inverted & 0x0F
+    magnitude = (((mantissa << 3) + bias) << exponent) - bias
+    decode_table = np.where(inverted & 0x80, -magnitude, magnitude).astype("<i2")
+    return encode_table, decode_table
+
+
+_ULAW_ENCODE, _ULAW_DECODE = _build_ulaw_tables()
+
+
+class MuLawCodec(Codec):
+    """G.711 mu-law, 8 bits per sample, encoded with table lookups."""
+    name = "ulaw"
+    bits_per_sample = 8
+
+    def encode(self, pcm):
+        samples = np.frombuffer(pcm, dtype="<u2", count=len(pcm) // 2)
+        return _ULAW_ENCODE[samples].tobytes()
+
+    def decode(self, payload):
+        return _ULAW_DECODE[np.frombuffer(payload, dtype=np.uint8)].tobytes()
+
+
+_ADPCM_INDEX_TABLE = (-1, -1, -1, -1, 2, 4, 6, 8) * 2
+_ADPCM_STEP_TABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+)
+
+
+def _adpcm_encode(pcm, valpred, index):
+    """Pure-Python IMA-ADPCM encoder, bit-compatible with audioop.lin2adpcm."""
+    out = bytearray((len(pcm) // 2 + 1) // 2)
+    step = _ADPCM_STEP_TABLE[index]
+    high = True
+    pos = 0
+    for val in np.frombuffer(pcm, dtype="<i2").tolist():
+        diff = val - valpred
+        sign = 8 if diff < 0 else 0
+        if sign:
+            diff = -diff
+        delta = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            delta = 4
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 2
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            delta |= 1
+            vpdiff += step
+        valpred = max(-32768, min(32767, valpred - vpdiff if sign else valpred + vpdiff))
+        delta |= sign
+        index = max(0, min(88, index + _ADPCM_INDEX_TABLE[delta]))
+        step = _ADPCM_STEP_TABLE[index]
+        if high:
+            out[pos] = delta << 4
+        else:
+            out[pos] |= delta
+            pos += 1
+        high = not high
+    return bytes(out), (valpred, index)
+
+
+def _adpcm_decode(payload, valpred, index):
+    """Pure-Python IMA-ADPCM decoder, bit-compatible with audioop.adpcm2lin."""
+    out = np.empty(len(payload) * 2, dtype="<i2")
+    step = _ADPCM_STEP_TABLE[index]
+    i = 0
+    for byte in payload:
+        for delta in (byte >> 4, byte & 0x0F):
+            index = max(0, min(88, index + _ADPCM_INDEX_TABLE[delta]))
+            vpdiff = step >> 3
+            if delta & 4:
+                vpdiff += step
+            if delta & 2:
+                vpdiff += step >> 1
+            if delta & 1:
+                vpdiff += step >> 2
+            valpred = max(-32768, min(32767, valpred - vpdiff if delta & 8 else valpred + vpdiff))
+            step = _ADPCM_STEP_TABLE[index]
+            out[i] = valpred
+            i += 1
+    return out.tobytes(), (valpred, index)
+
+
+class ImaAdpcmCodec(Codec):
+    """IMA-ADPCM, 4 bits per sample plus a 4-byte block header per frame.
+
+    Like WAV IMA-ADPCM blocks, each frame starts with the predictor and step
+    index it was encoded from, so frames decode independently. The predictor
+    recursion is inherently sequential and can't be vectorized; the C
+    implementation in audioop is used where available and a table-driven
+    Python fallback otherwise.
+    """
+    name = "adpcm"
+    bits_per_sample = 4
+    BLOCK_HEADER = struct.Struct("<hBx")
+    min_payload = BLOCK_HEADER.size
+
+    def __init__(self):
+        self.state = (0, 0)
+
+    def frame_bytes(self, samples=CHUNK):
+        return self.BLOCK_HEADER.size + (samples + 1) // 2
+
+    def reset(self):
+        # A predictor left over from other audio would start the frame with a click
+        self.state = (0, 0)
+
+    def encode(self, pcm):
+        header = self.BLOCK_HEADER.pack(*self.state)
+        if audioop:
+            payload, self.state = audioop.lin2adpcm(pcm, 2, self.state)
+        else:
+            payload, self.state = _adpcm_encode(pcm, *self.state)
+        return header + payload
+
+    def decode(self, payload):
+        if len(payload) < self.min_payload:
+            raise ValueError(f"ADPCM frame of {len(payload)} bytes is shorter than its header")
+        valpred, index = self.BLOCK_HEADER.unpack_from(payload)
+        body = payload[self.BLOCK_HEADER.size:]
+        if audioop:
+            pcm, _ = audioop.adpcm2lin(body, 2, (valpred, index))
+        else:
+            pcm, _ = _adpcm_decode(body, valpred, index)
+        return pcm
+
+
+CODECS = {codec.name: codec for codec in (ImaAdpcmCodec, MuLawCodec, PcmCodec)}
+
+# Best first; the server picks the first of these the client offers
+CODEC_PREFERENCE = ("adpcm", "ulaw", "pcm")
+
+
+def create_codec(name):
+    """Return a fresh codec instance by name."""
+    return CODECS[name]()
+
+
+def choose_codec(offered, preference=CODEC_PREFERENCE):
+    """Pick the most preferred codec from a peer's offer (falls back to pcm)."""
+    return next((name for name in preference if name in offered), "pcm")
+
+
+def recv_exact(connection, size):
+    """Read exactly size bytes, or return None if the peer closed first."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = connection.recv_into(view[received:], size - received)
+        if n == 0:
+            return None
+        received += n
+    return bytes(buffer)
+
+
+def negotiate_codec(connection, preference=CODEC_PREFERENCE):
+    """Server side of the handshake.
+
+    Returns the codec name agreed with the peer, or None for a legacy peer
+    that started streaming raw PCM (its bytes are left unread).
+    """
+    # The whole handshake gets HANDSHAKE_TIMEOUT, however the peer trickles it in
+    deadline = time.monotonic() + HANDSHAKE_TIMEOUT
+
+    def limit_to_deadline():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout("Voice handshake took too long")
+        connection.settimeout(left)
+
+    try:
+        peeked = b""
+        while len(peeked) < len(HANDSHAKE_MAGIC):
+            limit_to_deadline()
+            peeked = connection.recv(len(HANDSHAKE_MAGIC), socket.MSG_PEEK)
+            if not peeked or not HANDSHAKE_MAGIC.startswith(peeked):
+                return None
+            if len(peeked) < len(HANDSHAKE_MAGIC):
+                time.sleep(0.01)  # Wait for the rest of the magic to arrive
+        line = b""
+        while not line.endswith(b"\n") and len(line) < 256:
+            limit_to_deadline()
+            chunk = connection.recv(1)
+            if not chunk:
+                return None
+            line += chunk
+    except socket.timeout:
+        return None
+    finally:
+        connection.settimeout(None)
+
+    offered = line[len(HANDSHAKE_MAGIC):].strip().decode("ascii", "replace").split(",")
+    chosen = choose_codec(offered, preference)
+    connection.sendall(HANDSHAKE_MAGIC + chosen.encode("ascii") + b"\n")
+    return chosen
+
+
+def request_codec(connection, offered=CODEC_PREFERENCE):
+    """Client side of the handshake; returns the codec name the server chose."""
+    connection.sendall(HANDSHAKE_MAGIC + ",".join(offered).encode("ascii") + b"\n")
+    line = b""
+    while not line.endswith(b"\n"):
+        chunk = connection.recv(1)
+        if not chunk:
+            raise ConnectionResetError("Voice server closed during handshake")
+        line += chunk
+    if not line.startswith(HANDSHAKE_MAGIC):
+        raise ConnectionError("Unexpected voice handshake reply")
+    return line[len(HANDSHAKE_MAGIC):].strip().decode("ascii")
+
+
+# ----------------------------------------------------------------------
+# Datagram transport
+# ----------------------------------------------------------------------
+
+# Every UDP datagram starts with: packet type, codec id, 16-bit sequence
+# number, media timestamp (in samples) and the sender's wall-clock send time.
+PACKET_HEADER = struct.Struct("!BBHId")
+PACKET_HELLO = 1    # client -> server, payload: offered codecs "adpcm,ulaw,pcm"
+PACKET_WELCOME = 2  # server -> client, payload: chosen codec name
+PACKET_AUDIO = 3
+PACKET_BYE = 4
+PACKET_SILENCE = 5  # comfort-noise marker, payload as FRAME_SILENCE
+MAX_DATAGRAM = 2048
+
+CODEC_IDS = {"pcm": 0, "ulaw": 1, "adpcm": 2}
+
+# Frames of audio per packet and how long a silent peer is kept
+FRAME_DURATION = CHUNK / RATE
+PEER_TIMEOUT = 5.0
+
+JitterStats = namedtuple(
+    "JitterStats",
+    "received played lost late duplicates dropped underruns loss_rate "
+    "jitter_ms target_delay_ms latency_ms latency_p95_ms",
+)
+
+# Jitter buffer entry for a received comfort-noise marker
+SilenceMarker = namedtuple("SilenceMarker", "payload")
+
+
+def make_packet(kind, seq, timestamp, payload=b"", codec_id=0, sent_at=None):
+    return PACKET_HEADER.pack(kind, codec_id, seq & 0xFFFF, timestamp & 0xFFFFFFFF,
+                              time.time() if sent_at is None else sent_at) + payload
+
+
+def parse_packet(packet):
+    """Return (kind, codec_id, seq, timestamp, sent_at, payload) or None if malformed."""
+    if len(packet) < PACKET_HEADER.size:
+        return None
+    return PACKET_HEADER.unpack_from(packet) + (packet[PACKET_HEADER.size:],)
+
+
+class JitterBuffer:
+    """Adaptive playout buffer for sequence-numbered voice frames.
+
+    Frames are stored by (unwrapped) sequence number and released one per
+    playout tick. The target depth follows an RFC 3550 style estimate of
+    transit-time jitter: it grows when packets arrive unevenly and the
+    buffer drops its oldest frames when it runs well over target, so a
+    burst of delay doesn't turn into permanent latency.
+    """
+
+    def __init__(self, frame_duration=FRAME_DURATION, min_frames=2, max_frames=25,
+                 slack_frames=3, history=500):
+        self.frame_duration = frame_duration
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.slack_frames = slack_frames
+        self.lock = threading.Lock()
+        self.frames = {}  # {sequence: (payload, sent_at)}
+        self.next_seq = None
+        self.highest_seq = None
+        self.playing = False
+        self.jitter = 0.0
+        self.target_frames = min_frames
+        self._last_transit = None
+        self.latencies = deque(maxlen=history)
+        self.received = self.played = self.lost = self.late = 0
+        self.duplicates = self.dropped = self.underruns = 0
+        self.silent = False  # Last frame played was a comfort-noise marker
+
+    def _unwrap(self, seq):
+        if self.highest_seq is None:
+            return seq
+        delta = (seq - self.highest_seq) & 0xFFFF
+        if delta >= 0x8000:
+            delta -= 0x10000
+        return self.highest_seq + delta
+
+    def depth(self):
+        if self.next_seq is None:
+            return 0
+        return self.highest_seq - self.next_seq + 1
+
+    def put(self, seq, sent_at, payload, arrival=None):
+        """Add a received frame."""
+        arrival = time.time() if arrival is None else arrival
+        with self.lock:
+            self.received += 1
+            seq = self._unwrap(seq)
+
+            transit = arrival - sent_at
+            if self._last_transit is not None:
+                self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+            self._last_transit = transit
+            wanted = math.ceil(3 * self.jitter / self.frame_duration) + 1
+            self.target_frames = max(self.min_frames, min(self.max_frames, wanted))
+
+            if self.next_seq is not None and seq < self.next_seq:
+                self.late += 1
+                return
+            if seq in self.frames:
+                self.duplicates += 1
+                return
+            self.frames[seq] = (payload, sent_at)
+            if self.highest_seq is None or seq > self.highest_seq:
+                self.highest_seq = seq
+            if self.next_seq is None:
+                self.next_seq = seq
+
+    def get(self):
+        """Return the payload for the next playout slot, or None to conceal."""
+        with self.lock:
+            if self.next_seq is None:
+                return None
+            if not self.playing:
+                # (Re)buffering until the target depth is reached
+                if self.depth() < self.target_frames:
+                    return None
+                self.playing = True
+
+            # Catch up if delay has built up well beyond what jitter requires
+            while self.depth() > self.target_frames + self.slack_frames:
+                if self.frames.pop(self.next_seq, None) is not None:
+                    self.dropped += 1
+                self.next_seq += 1
+
+            entry = self.frames.pop(self.next_seq, None)
+            if entry is None:
+                if self.next_seq > self.highest_seq:
+                    # Nothing newer has arrived: underrun, rebuffer. During a
+                    # suppressed pause that is expected, not a glitch.
+                    if not self.silent:
+                        self.underruns += 1
+                    self.playing = False
+                    return None
+                self.lost += 1
+                self.next_seq += 1
+                return None
+            self.next_seq += 1
+            self.played += 1
+            payload, sent_at = entry
+            self.silent = isinstance(payload, SilenceMarker)
+            self.latencies.append(time.time() - sent_at)
+            return payload
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            expected = self.played + self.lost
+            return JitterStats(
+                received=self.received,
+                played=self.played,
+                lost=self.lost,
+                late=self.late,
+                duplicates=self.duplicates,
+                dropped=self.dropped,
+                underruns=self.underruns,
+                loss_rate=self.lost / expected if expected else 0.0,
+                jitter_ms=self.jitter * 1000,
+                target_delay_ms=self.target_frames * self.frame_duration * 1000,
+                latency_ms=1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                latency_p95_ms=1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            )
+
+
+class LossConcealer:
+    """Simple packet-loss concealment: repeat the last good frame, fading out."""
+
+    def __init__(self, samples=CHUNK, max_repeats=3, fade=0.5):
+        self.silence = bytes(samples * 2)
+        self.max_repeats = max_repeats
+        self.fade = fade
+        self.last = None
+        self.repeats = 0
+        self.concealed = 0
+
+    def good(self, pcm):
+        self.last = np.frombuffer(pcm, dtype="<i2")
+        self.repeats = 0
+        return pcm
+
+    def conceal(self):
+        if self.last is None or self.repeats >= self.max_repeats:
+            return self.silence
+        self.repeats += 1
+        self.concealed += 1
+        return (self.last * self.fade ** self.repeats).astype("<i2").tobytes()
+
+
+class UdpVoiceLink:
+    """One end of a datagram voice connection to a single peer."""
+
+    def __init__(self, sock, peer, codec_name):
+        self.sock = sock
+        self.peer = peer
+        self.codec_name = codec_name
+        self.codec_id = CODEC_IDS[codec_name]
+        self.encoder = create_codec(codec_name)
+        self.decoder = create_codec(codec_name)
+        self.jitter_buffer = JitterBuffer()
+        self.concealer = LossConcealer()
+        self.comfort_noise = ComfortNoise()
+        self.seq = 0
+        self.timestamp = 0
+        self.last_heard = time.time()
+        self.closed = False
+
+    def send_pcm(self, pcm, sent_at=None):
+        """Encode and send one captured chunk."""
+        self.send_payload(self.encoder.encode(pcm), len(pcm) // 2, sent_at)
+
+    def send_silence(self, marker, sent_at=None):
+        """Send a comfort-noise marker in place of a silent chunk."""
+        self.send_payload(marker, sent_at=sent_at, kind=PACKET_SILENCE)
+
+    def send_payload(self, payload, samples=CHUNK, sent_at=None, kind=PACKET_AUDIO):
+        """Send a frame already encoded with this link's codec.
+
+        The payload may be shared with other links (e.g. a broadcast frame);
+        it is passed to the kernel alongside the header without copying.
+        """
+        header = PACKET_HEADER.pack(kind, self.codec_id, self.seq & 0xFFFF,
+                                    self.timestamp & 0xFFFFFFFF,
+                                    time.time() if sent_at is None else sent_at)
+        if hasattr(self.sock, "sendmsg"):
+            self.sock.sendmsg([header, payload], [], 0, self.peer)
+        else:
+            self.sock.sendto(header + bytes(payload), self.peer)
+        self.seq += 1
+        self.timestamp += samples
+
+    def handle_packet(self, packet, arrival=None):
+        """Feed one datagram from the peer into the link."""
+        parsed = parse_packet(packet)
+        if parsed is None:
+            return
+        kind, codec_id, seq, _, sent_at, payload = parsed
+        self.last_heard = time.time()
+        if kind == PACKET_AUDIO and codec_id == self.codec_id:
+            if len(payload) < self.decoder.min_payload:
+                return  # Malformed; treated like a lost packet
+            self.jitter_buffer.put(seq, sent_at, payload, arrival)
+        elif kind == PACKET_SILENCE:
+            self.jitter_buffer.put(seq, sent_at, SilenceMarker(payload), arrival)
+        elif kind == PACKET_HELLO:
+            # Our WELCOME was lost; answer the retransmitted HELLO again
+            self.sock.sendto(make_packet(PACKET_WELCOME, 0, 0, self.codec_name.encode("ascii")), self.peer)
+        elif kind == PACKET_BYE:
+            self.closed = True
+
+    def next_pcm(self):
+        """PCM for the next playout tick, concealing lost or missing frames."""
+        payload = self.jitter_buffer.get()
+        if isinstance(payload, SilenceMarker):
+            self.comfort_noise.start(payload.payload)
+            return self.comfort_noise.generate()
+        if payload is None:
+            if self.comfort_noise.active:
+                return self.comfort_noise.generate()
+            return self.concealer.conceal()
+        self.comfort_noise.stop()
+        return self.concealer.good(self.decoder.decode(payload))
+
+    def timed_out(self):
+        return time.time() - self.last_heard > PEER_TIMEOUT
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.sock.sendto(make_packet(PACKET_BYE, self.seq, self.timestamp), self.peer)
+            except OSError:
+                pass
+        self.closed = True
+
+    def stats(self):
+        return self.jitter_buffer.stats()
+
+
+def udp_handshake(sock, server, offered=CODEC_PREFERENCE, timeout=2.0, attempts=3):
+    """Client side: send HELLO until the server WELCOMEs us; returns a UdpVoiceLink."""
+    sock.settimeout(timeout / attempts)
+    try:
+        for _ in range(attempts):
+            sock.sendto(make_packet(PACKET_HELLO, 0, 0, ",".join(offered).encode("ascii")), server)
+            try:
+                packet, addr = sock.recvfrom(MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            parsed = parse_packet(packet)
+            if parsed and parsed[0] == PACKET_WELCOME:
+                return UdpVoiceLink(sock, addr, parsed[5].decode("ascii"))
+    finally:
+        sock.settimeout(None)
+    raise ConnectionError("No answer from voice server")
+
+
 class VoiceChat:
-    def __init__(self, host):
+    def __init__(self, host, transport="tcp", audio_backend=PyAudioBackend, port=VOICE_PORT):
         self.host = host
+        self.port = port
+        self.transport = transport  # "tcp" or "udp"
+        self.audio_backend = audio_backend  # Factory called once per session
         self.running = False
         self.connected = False
         self.stop_event = threading.Event()
         self.server_socket = None
         self.connection = None
         self.client_address = None
+        self.codec_name = None  # None for legacy raw PCM peers
+        self.encoder = None
+        self.decoder = None
+        self.udp_link = None
 
         self.audio = None
         self.input_stream = None
         self.output_stream = None
 
-        self.status_var = StringVar()
-        self.status_var.set("Voice Chat: Disconnected")
-        self.audio_level = 0
+        self.status = "Voice Chat: Disconnected"
+        self.on_status = None  # Called with each new status text, from any thread
+        self.level_meter = LevelMeter()
+        self.silence_suppression = True
+        self.suppressor = SilenceSuppressor()
+        self.comfort_noise = ComfortNoise()
+
+    def set_status(self, text):
+        """Publish a status line for the UI."""
+        self.status = text
+        if self.on_status:
+            self.on_status(text)
+
+    @property
+    def audio_level(self):
+        """Smoothed input level as 0-100 for the UI."""
+        return self.level_meter.reading.percent
 
     def initialize_audio(self):
         self.cleanup_audio()
-        self.audio = pyaudio.PyAudio()
+        self.audio = self.audio_backend()
         self.input_stream = self.audio.open(
             format=FORMAT,
             channels=CHANNELS,
@@ -75,80 +883,211 @@ class VoiceChat:
         if self.running:
             return
 
-        self.status_var.set("Voice Chat: Waiting for connection...")
+        self.set_status("Voice Chat: Waiting for connection...")
+        target = self._serve_udp if self.transport == "udp" else self._serve_tcp
+        server_thread_handle = threading.Thread(target=target)
+        server_thread_handle.daemon = True
+        server_thread_handle.start()
 
-        def server_thread():
-            try:
-                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                self.server_socket.bind((self.host, VOICE_PORT))
-                self.server_socket.settimeout(1.0)
-                self.server_socket.listen(1)
-                print(f"Voice server listening on {self.host}:{VOICE_PORT}")
+    def _serve_tcp(self):
+        try:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.settimeout(1.0)
+            self.server_socket.listen(1)
+            print(f"Voice server listening on {self.host}:{self.port}")
 
-                while not self.stop_event.is_set():
-                    try:
-                        connection, addr = self.server_socket.accept()
-                        print(f"Voice connection from {addr[0]} accepted")
+            while not self.stop_event.is_set():
+                try:
+                    connection, addr = self.server_socket.accept()
+                    print(f"Voice connection from {addr[0]} accepted")
 
-                        self.initialize_audio()
+                    self.set_codec(negotiate_codec(connection))
+                    self.initialize_audio()
 
-                        self.connection = connection
-                        self.client_address = addr
-                        self.running = True
-                        self.connected = True
-                        self.status_var.set(f"Voice Chat: Connected to {addr[0]}")
+                    self.connection = connection
+                    self.client_address = addr
+                    self.running = True
+                    self.connected = True
+                    self.set_status(f"Voice Chat: Connected to {addr[0]} ({self.codec_name or 'raw PCM'})")
 
-                        send_thread = threading.Thread(target=self.send_audio)
-                        receive_thread = threading.Thread(target=self.receive_audio)
+                    self._run_session(self.receive_audio)
 
-                        send_thread.start()
-                        receive_thread.start()
+                    if self.connection:
+                        self.connection.close()
+                        self.connection = None
 
-                        send_thread.join()
-                        receive_thread.join()
+                    self._end_session()
 
-                        if self.connection:
-                            self.connection.close()
-                            self.connection = None
+                except socket.timeout:
+                    continue
+                except Exception as e:
+                    print(f"Error in voice server loop: {e}")
+                    break
 
-                        self.connected = False
-                        self.running = False
-                        self.status_var.set("Voice Chat: Waiting for connection...")
+        except Exception as e:
+            print(f"Voice server error: {e}")
+            self.set_status(f"Voice Chat: Error - {e}")
+        finally:
+            if self.server_socket:
+                self.server_socket.close()
+                self.server_socket = None
 
-                        self.cleanup_audio()
+    def _serve_udp(self):
+        try:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.settimeout(1.0)
+            print(f"Voice server listening on {self.host}:{self.port} (UDP)")
 
-                    except socket.timeout:
-                        continue
-                    except Exception as e:
-                        print(f"Error in voice server loop: {e}")
-                        break
+            while not self.stop_event.is_set():
+                try:
+                    packet, addr = self.server_socket.recvfrom(MAX_DATAGRAM)
+                except socket.timeout:
+                    continue
+                parsed = parse_packet(packet)
+                if not parsed or parsed[0] != PACKET_HELLO:
+                    continue
 
-            except Exception as e:
-                print(f"Voice server error: {e}")
-                self.status_var.set(f"Voice Chat: Error - {e}")
-            finally:
-                if self.server_socket:
-                    self.server_socket.close()
-                    self.server_socket = None
+                offered = parsed[5].decode("ascii", "replace").split(",")
+                codec_name = choose_codec(offered)
+                self.server_socket.sendto(make_packet(PACKET_WELCOME, 0, 0, codec_name.encode("ascii")), addr)
+                print(f"Voice datagram session with {addr[0]} ({codec_name})")
 
-        server_thread_handle = threading.Thread(target=server_thread)
-        server_thread_handle.daemon = True
-        server_thread_handle.start()
+                self.initialize_audio()
+                self.udp_link = UdpVoiceLink(self.server_socket, addr, codec_name)
+                self.codec_name = codec_name
+                self.client_address = addr
+                self.running = True
+                self.connected = True
+                self.set_status(f"Voice Chat: Connected to {addr[0]} (UDP, {codec_name})")
+
+                self._run_session(self.receive_datagrams, self.play_datagrams)
+
+                self.udp_link.close()
+                stats = self.udp_link.stats()
+                print(f"Voice session stats: {stats.loss_rate:.1%} loss, "
+                      f"{stats.latency_ms:.0f} ms latency, {stats.underruns} underruns")
+                self.udp_link = None
+                self._end_session()
+
+        except Exception as e:
+            print(f"Voice server error: {e}")
+            self.set_status(f"Voice Chat: Error - {e}")
+        finally:
+            if self.server_socket:
+                self.server_socket.close()
+                self.server_socket = None
+
+    def connect(self, server_host, codecs=CODEC_PREFERENCE):
+        """Join another voice server as its peer (the student side)."""
+        if self.running:
+            return
+        self.set_status(f"Voice Chat: Connecting to {server_host}...")
+        client_thread_handle = threading.Thread(target=self._run_client, args=(server_host, codecs))
+        client_thread_handle.daemon = True
+        client_thread_handle.start()
+
+    def _run_client(self, server_host, codecs):
+        try:
+            if self.transport == "udp":
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.server_socket = sock
+                self.udp_link = udp_handshake(sock, (server_host, self.port), codecs)
+                sock.settimeout(1.0)
+                self.codec_name = self.udp_link.codec_name
+                receivers = (self.receive_datagrams, self.play_datagrams)
+            else:
+                connection = socket.create_connection((server_host, self.port), timeout=5)
+                connection.settimeout(None)
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.connection = connection
+                self.set_codec(request_codec(connection, codecs))
+                receivers = (self.receive_audio,)
+
+            self.initialize_audio()
+            self.client_address = (server_host, self.port)
+            self.running = True
+            self.connected = True
+            self.set_status(f"Voice Chat: Connected to {server_host} ({self.codec_name or 'raw PCM'})")
+            print(f"Voice connection to {server_host}:{self.port} established ({self.codec_name})")
+
+            self._run_session(*receivers)
+        except Exception as e:
+            print(f"Voice client error: {e}")
+            self.set_status(f"Voice Chat: Error - {e}")
+        finally:
+            if self.udp_link:
+                self.udp_link.close()
+                self.udp_link = None
+            for sock in (self.connection, self.server_socket):
+                if sock:
+                    sock.close()
+            self.connection = None
+            self.server_socket = None
+            self._end_session()
+
+    def _run_session(self, *receivers):
+        """Run the capture thread and the given receive threads until one stops."""
+        threads = [threading.Thread(target=target) for target in (self.send_audio,) + receivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _end_session(self):
+        self.connected = False
+        self.running = False
+        self.set_status("Voice Chat: Waiting for connection...")
+
+        self.cleanup_audio()
+        self.level_meter.reset()
+        self._report_suppression()
+
+    def _report_suppression(self):
+        stats = self.suppressor.stats()
+        if stats["frames"]:
+            print(f"Voice session: {stats['suppressed_fraction']:.0%} of chunks suppressed as silence")
+        self.suppressor.reset()
+        self.comfort_noise.stop()
 
     def send_audio(self):
+        resuming = False
         try:
             while self.running:
                 if self.input_stream:
                     data = self.input_stream.read(CHUNK, exception_on_overflow=False)
-                    if len(data) > 0:
-                        signal = [int.from_bytes(data[i:i+2], byteorder='little', signed=True)
-                                  for i in range(0, len(data), 2)]
-                        rms = sum(x*x for x in signal) / len(signal) if signal else 0
-                        self.audio_level = min(100, int(rms / 100))
+                    self.level_meter.update(data)
 
-                    if self.connection:
-                        self.connection.sendall(data)
+                    # The legacy raw stream has no way to mark silence
+                    action = FRAME_AUDIO
+                    if self.silence_suppression and (self.udp_link or self.encoder):
+                        action = self.suppressor.process(data)
+                    if action != FRAME_AUDIO:
+                        resuming = True
+                        if action is None:
+                            continue
+                    elif resuming:
+                        resuming = False
+                        encoder = self.udp_link.encoder if self.udp_link else self.encoder
+                        encoder.reset()
+
+                    if self.udp_link:
+                        if action == FRAME_SILENCE:
+                            self.udp_link.send_silence(self.suppressor.marker())
+                        else:
+                            self.udp_link.send_pcm(data)
+                    elif self.connection:
+                        if self.encoder:
+                            if action == FRAME_SILENCE:
+                                payload = self.suppressor.marker()
+                            else:
+                                payload = self.encoder.encode(data)
+                            self.connection.sendall(FRAME_HEADER.pack(action, len(payload)) + payload)
+                        else:
+                            self.connection.sendall(data)
         except (ConnectionResetError, BrokenPipeError) as e:
             print(f"Error sending audio: {e}")
         except IOError as e:
@@ -158,15 +1097,45 @@ class VoiceChat:
         finally:
             self.running = False
 
+    def set_codec(self, codec_name):
+        """Select the negotiated codec, or None for the legacy raw stream."""
+        self.codec_name = codec_name
+        self.encoder = create_codec(codec_name) if codec_name else None
+        self.decoder = create_codec(codec_name) if codec_name else None
+
+    def receive_frame(self):
+        """Read one framed payload and return the decoded PCM (None on EOF)."""
+        header = recv_exact(self.connection, FRAME_HEADER.size)
+        if header is None:
+            return None
+        frame_type, length = FRAME_HEADER.unpack(header)
+        payload = recv_exact(self.connection, length)
+        if payload is None:
+            return None
+        if frame_type == FRAME_SILENCE:
+            self.comfort_noise.start(payload)
+            return self.comfort_noise.generate()
+        if frame_type != FRAME_AUDIO:
+            return b""
+        self.comfort_noise.stop()
+        return self.decoder.decode(payload)
+
     def receive_audio(self):
         try:
             while self.running:
                 if self.connection and self.output_stream:
-                    data = self.connection.recv(CHUNK)
-                    if not data:
+                    if self.decoder:
+                        # Keep the comfort noise going while the peer sends nothing
+                        idle = self.comfort_noise.active and not select.select(
+                            [self.connection], [], [], FRAME_DURATION)[0]
+                        data = self.comfort_noise.generate() if idle else self.receive_frame()
+                    else:
+                        data = self.connection.recv(CHUNK) or None
+                    if data is None:
                         print("Peer disconnected.")
                         break
-                    self.output_stream.write(data)
+                    if data:
+                        self.output_stream.write(data)
         except (ConnectionResetError, BrokenPipeError) as e:
             print(f"Error receiving audio: {e}")
         except IOError as e:
@@ -176,6 +1145,62 @@ class VoiceChat:
         finally:
             self.running = False
 
+    def receive_datagrams(self):
+        """Feed datagrams from the peer into its jitter buffer."""
+        link = self.udp_link
+        try:
+            while self.running and not link.closed:
+                try:
+                    packet, addr = self.server_socket.recvfrom(MAX_DATAGRAM)
+                except socket.timeout:
+                    if link.timed_out():
+                        print("Voice peer timed out.")
+                        break
+                    continue
+                if addr == link.peer:
+                    link.handle_packet(packet)
+                elif link.timed_out():
+                    break
+        except OSError as e:
+            print(f"Error receiving audio: {e}")
+        finally:
+            self.running = False
+
+    def play_datagrams(self):
+        """Playout loop: one frame per tick from the jitter buffer, paced by the output device."""
+        link = self.udp_link
+        last_report = time.time()
+        try:
+            while self.running and self.output_stream:
+                self.output_stream.write(link.next_pcm())
+                if time.time() - last_report > 2.0:
+                    last_report = time.time()
+                    stats = link.stats()
+                    self.set_status(
+                        f"Voice Chat: Connected to {link.peer[0]} (UDP, {link.codec_name}) - "
+                        f"{stats.latency_ms:.0f} ms, {stats.loss_rate:.1%} loss"
+                    )
+        except IOError as e:
+            print(f"Audio stream error: {e}")
+        finally:
+            self.running = False
+
+    def disconnect(self):
+        """Drop the current peer; the server keeps listening for the next one."""
+        self.running = False
+        if self.udp_link:
+            self.udp_link.close()
+        if self.connection:
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def transport_stats(self):
+        """Latency and loss statistics of the current datagram session, if any."""
+        link = self.udp_link
+        return link.stats() if link else None
+
     def cleanup(self):
         self.stop_event.set()
         if self.connection:
@@ -0,0 +1,755 @@
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from voice_chat import (CHUNK, CODEC_PREFERENCE, FRAME_AUDIO, FRAME_DURATION, FRAME_HEADER,
+                        FRAME_SILENCE, HANDSHAKE_MAGIC, HANDSHAKE_TIMEOUT, MAX_DATAGRAM,
+                        PACKET_HELLO, PACKET_WELCOME, SilenceMarker, UdpVoiceLink,
+                        VoiceChat, choose_codec, create_codec, make_packet, parse_packet)
+
+# Decoded frames a participant must have queued before it is mixed in
+START_FRAMES = 2
+# Most frames queued per participant; older ones are dropped to bound latency
+MAX_QUEUED_FRAMES = 8
+# Outbound frames queued for a slow participant before older ones are dropped
+MAX_PENDING_FRAMES = 8
+MAX_PARTICIPANTS = 64
+# Wait after the audio device fails before opening it again, doubling up to
+# the maximum (seconds); participants are dropped meanwhile
+AUDIO_RETRY_MIN = 1.0
+AUDIO_RETRY_MAX = 60.0
+
+# Lecture broadcast: frames kept in the shared ring, and how far a listener
+# may fall behind before it skips ahead to the newest frame
+RING_SLOTS = 32
+MAX_LAG_FRAMES = 6
+
+FRAME_BYTES = CHUNK * 2
+
+
+def clip16(mix):
+    """Saturate an int32 mix to little-endian int16."""
+    return np.clip(mix, -32768, 32767).astype("<i2")
+
+
+def as_frame(pcm):
+    """Turn decoded PCM bytes into exactly one CHUNK of int16 samples."""
+    samples = np.frombuffer(pcm, dtype="<i2")
+    if samples.size == CHUNK:
+        return samples
+    frame = np.zeros(CHUNK, dtype="<i2")
+    frame[:min(CHUNK, samples.size)] = samples[:CHUNK]
+    return frame
+
+
+class StreamParticipant:
+    """A student connected to the hub over TCP.
+
+    The network thread feeds received bytes in with ``feed``; the mixer
+    thread takes decoded frames with ``next_frame`` and queues its return
+    mix with ``send_payload``. Sends are non-blocking, so a slow student
+    loses old frames instead of stalling the mixer.
+    """
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.connected_at = time.time()
+        self.handshaking = True
+        self.codec_name = None  # None for legacy raw PCM peers
+        self.decoder = None
+        self.encoder = None
+        self.inbuf = bytearray()
+        self.frames = deque(maxlen=MAX_QUEUED_FRAMES)
+        self.buffering = True
+        self.pending = deque()
+        self.pending_offset = 0
+        self.send_lock = threading.Lock()
+        self.broadcast_cursor = None
+        self.closed = False
+
+    @property
+    def broadcast_key(self):
+        return ("tcp", self.codec_name)
+
+    # Network thread ----------------------------------------------------
+
+    def feed(self, data):
+        self.inbuf += data
+        if self.handshaking:
+            self._handshake()
+        if not self.handshaking:
+            self._parse()
+
+    def check_handshake_timeout(self):
+        """Peers that stay silent during the handshake window are legacy peers."""
+        if self.handshaking and time.time() - self.connected_at > HANDSHAKE_TIMEOUT:
+            self._set_codec(None)
+            self._parse()
+
+    def _handshake(self):
+        prefix = bytes(self.inbuf[:len(HANDSHAKE_MAGIC)])
+        if not HANDSHAKE_MAGIC.startswith(prefix):
+            self._set_codec(None)  # Raw PCM from a legacy client
+            return
+        end = self.inbuf.find(b"\n")
+        if len(prefix) < len(HANDSHAKE_MAGIC) or end < 0:
+            return  # Wait for the rest of the line
+        offered = bytes(self.inbuf[len(HANDSHAKE_MAGIC):end]).strip().decode("ascii", "replace").split(",")
+        del self.inbuf[:end + 1]
+        codec_name = choose_codec(offered, CODEC_PREFERENCE)
+        # Reply before leaving the handshake so no mixed audio can precede it
+        with self.send_lock:
+            self.pending.append(memoryview(HANDSHAKE_MAGIC + codec_name.encode("ascii") + b"\n"))
+            self.flush()
+        self._set_codec(codec_name)
+
+    def _set_codec(self, codec_name):
+        self.handshaking = False
+        self.codec_name = codec_name
+        if codec_name:
+            self.decoder = create_codec(codec_name)
+            self.encoder = create_codec(codec_name)
+
+    def _parse(self):
+        if self.codec_name is None:
+            while len(self.inbuf) >= FRAME_BYTES:
+                self.frames.append(as_frame(bytes(self.inbuf[:FRAME_BYTES])))
+                del self.inbuf[:FRAME_BYTES]
+            return
+        while len(self.inbuf) >= FRAME_HEADER.size:
+            frame_type, length = FRAME_HEADER.unpack_from(self.inbuf)
+            end = FRAME_HEADER.size + length
+            if len(self.inbuf) < end:
+                break
+            payload = bytes(self.inbuf[FRAME_HEADER.size:end])
+            del self.inbuf[:end]
+            if frame_type == FRAME_AUDIO:
+                if length < self.decoder.min_payload:
+                    raise ValueError(f"{self.codec_name} frame of {length} bytes is too short")
+                self.frames.append(as_frame(self.decoder.decode(payload)))
+
+    # Mixer thread ------------------------------------------------------
+
+    def next_frame(self):
+        """Next decoded frame to mix, or None while (re)buffering."""
+        if self.buffering:
+            if len(self.frames) < START_FRAMES:
+                return None
+            self.buffering = False
+        try:
+            return self.frames.popleft()
+        except IndexError:
+            self.buffering = True
+            return None
+
+    def encode(self, pcm):
+        return self.encoder.encode(pcm) if self.encoder else pcm
+
+    def reset_encoder(self):
+        if self.encoder:
+            self.encoder.reset()
+
+    def send_payload(self, payload, frame_type=FRAME_AUDIO):
+        """Queue one encoded frame (from encode or a shared encoder) and send what we can."""
+        if self.handshaking or self.closed:
+            return
+        if self.codec_name:
+            payload = FRAME_HEADER.pack(frame_type, len(payload)) + payload
+        elif frame_type != FRAME_AUDIO:
+            return  # Legacy raw streams can't carry markers
+        with self.send_lock:
+            self.pending.append(memoryview(payload))
+            # Skip ahead for slow students, never dropping a partially sent frame
+            while len(self.pending) > MAX_PENDING_FRAMES:
+                if self.pending_offset:
+                    partial = self.pending.popleft()
+                    self.pending.popleft()
+                    self.pending.appendleft(partial)
+                else:
+                    self.pending.popleft()
+            self.flush()
+
+    def send_broadcast(self, frame, sent_at=None):
+        """Try to send one shared broadcast frame without copying it.
+
+        Returns False if the socket is full (the frame was not taken). A
+        partially sent frame keeps its remainder as a view into the shared
+        buffer so the byte stream stays aligned.
+        """
+        with self.send_lock:
+            self.flush()
+            if self.pending or self.closed:
+                return False
+            try:
+                sent = self.sock.send(frame)
+            except (BlockingIOError, InterruptedError):
+                return False
+            except OSError:
+                self.closed = True
+                return False
+            if sent < len(frame):
+                self.pending.append(memoryview(frame)[sent:])
+            return True
+
+    def send_silence(self, marker):
+        self.send_payload(marker, FRAME_SILENCE)
+
+    def flush(self):
+        while self.pending:
+            frame = self.pending[0]
+            try:
+                sent = self.sock.send(frame[self.pending_offset:])
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self.closed = True
+                return
+            self.pending_offset += sent
+            if self.pending_offset < len(frame):
+                return
+            self.pending.popleft()
+            self.pending_offset = 0
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class DatagramParticipant:
+    """A student connected to the hub over UDP, with its own jitter buffer."""
+
+    def __init__(self, link):
+        self.link = link
+        self.addr = link.peer
+        self.codec_name = link.codec_name
+        self.broadcast_cursor = None
+        self.handshaking = False
+
+    @property
+    def broadcast_key(self):
+        return ("udp", self.codec_name)
+
+    def send_broadcast(self, payload, sent_at=None):
+        if isinstance(payload, SilenceMarker):
+            self.send_silence(payload.payload, sent_at)
+        else:
+            self.send_payload(payload, sent_at)
+        return True
+
+    @property
+    def closed(self):
+        return self.link.closed or self.link.timed_out()
+
+    def next_frame(self):
+        payload = self.link.jitter_buffer.get()
+        if payload is None or isinstance(payload, SilenceMarker):
+            return None
+        try:
+            return as_frame(self.link.decoder.decode(payload))
+        except Exception as e:
+            # Dropped by the network thread's housekeeping; the others keep mixing
+            print(f"Malformed audio from voice participant {self.addr[0]}: {e}")
+            self.link.closed = True
+            return None
+
+    def encode(self, pcm):
+        return self.link.encoder.encode(pcm)
+
+    def reset_encoder(self):
+        self.link.encoder.reset()
+
+    def send_payload(self, payload, sent_at=None):
+        try:
+            self.link.send_payload(payload, sent_at=sent_at)
+        except OSError:
+            self.link.closed = True
+
+    def send_silence(self, marker, sent_at=None):
+        try:
+            self.link.send_silence(marker, sent_at=sent_at)
+        except OSError:
+            self.link.closed = True
+
+    def close(self):
+        self.link.close()
+
+
+class LectureBroadcaster:
+    """One-to-many fan-out of the teacher's microphone.
+
+    The capture side only calls ``publish``, which stores the chunk in a
+    fixed ring and wakes the sender thread. The sender encodes each chunk
+    once per codec on first use, frames it once per transport, and hands
+    the same buffer to every listener; each listener is just a cursor into
+    the ring. Listeners whose sockets are full keep their place, and any
+    that fall more than ``max_lag`` frames behind jump to the newest frame
+    instead of holding anything up.
+    """
+
+    def __init__(self, slots=RING_SLOTS, max_lag=MAX_LAG_FRAMES):
+        self.slots = [None] * slots
+        self.max_lag = min(max_lag, slots - 1)
+        self.head = 0  # Sequence number of the next frame to publish
+        self.listeners = []
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.shared_encoders = {}
+        self.encoded_seq = {}  # {codec_name: last sequence number encoded}
+        self.published = self.sent = self.skipped = 0
+        self.cpu_seconds = 0.0
+
+    def start(self):
+        if self.thread:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.thread = None
+
+    def publish(self, pcm, listeners, sent_at=None):
+        """Add one captured chunk; cheap enough for the capture thread."""
+        with self.condition:
+            # (pcm, sent_at, {codec_name: payload}, {(transport, codec_name): frame})
+            self.slots[self.head % len(self.slots)] = (pcm, time.time() if sent_at is None else sent_at, {}, {})
+            self.head += 1
+            self.published += 1
+            self.listeners = listeners
+            self.condition.notify()
+
+    def _payload(self, seq, codec_name):
+        """The slot's audio encoded for codec_name, shared by both transports."""
+        pcm, _, payloads, _ = self.slots[seq % len(self.slots)]
+        payload = payloads.get(codec_name)
+        if payload is None:
+            # Each codec's frames are self-contained, so one encoder serves every listener
+            if codec_name not in self.shared_encoders:
+                self.shared_encoders[codec_name] = create_codec(codec_name)
+            encoder = self.shared_encoders[codec_name]
+            if self.encoded_seq.get(codec_name) != seq - 1:
+                encoder.reset()  # Not continuing from the previous frame
+            self.encoded_seq[codec_name] = seq
+            payload = payloads[codec_name] = encoder.encode(pcm)
+        return payload
+
+    def _frame(self, seq, key):
+        pcm, sent_at, _, frames = self.slots[seq % len(self.slots)]
+        frame = frames.get(key)
+        if frame is None:
+            transport, codec_name = key
+            if isinstance(pcm, SilenceMarker):
+                # Markers are a byte or two; legacy raw listeners just get nothing
+                if transport == "udp":
+                    frame = pcm
+                elif codec_name:
+                    frame = FRAME_HEADER.pack(FRAME_SILENCE, len(pcm.payload)) + pcm.payload
+                else:
+                    frame = b""
+            elif codec_name is None:
+                frame = pcm
+            else:
+                frame = self._payload(seq, codec_name)
+                if transport == "tcp":
+                    frame = FRAME_HEADER.pack(FRAME_AUDIO, len(frame)) + frame
+            frames[key] = frame
+        return frame, sent_at
+
+    def _run(self):
+        delivered = 0
+        while not self.stop_event.is_set():
+            with self.condition:
+                while self.head == delivered and not self.stop_event.is_set():
+                    self.condition.wait(timeout=0.5)
+                head = self.head
+                listeners = self.listeners
+            started = time.thread_time()
+            self._deliver(listeners, head)
+            self.cpu_seconds += time.thread_time() - started
+            delivered = head
+
+    def _deliver(self, listeners, head):
+        for listener in listeners:
+            if listener.handshaking or listener.closed:
+                continue
+            cursor = listener.broadcast_cursor
+            if cursor is None:
+                cursor = head - 1  # New listeners start at the live edge
+            if head - cursor > self.max_lag:
+                self.skipped += head - 1 - cursor
+                cursor = head - 1
+            while cursor < head:
+                frame, sent_at = self._frame(cursor, listener.broadcast_key)
+                if frame and not listener.send_broadcast(frame, sent_at):
+                    break
+                self.sent += 1
+                cursor += 1
+            listener.broadcast_cursor = cursor
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "listeners": len(self.listeners),
+            "cpu_seconds": self.cpu_seconds,
+        }
+
+
+class VoiceHub(VoiceChat):
+    """Voice server for a whole class.
+
+    Students connect over TCP (with or without the codec handshake) or UDP
+    on ``port``. One network thread multiplexes all sockets with a selector
+    and one mixer thread runs once per audio chunk:
+
+    * the active students' frames are summed into the teacher's output
+    * a shared return mix (teacher mic + all students) is encoded once per
+      codec for every student who isn't talking
+    * each active speaker gets the shared mix minus their own voice,
+      computed for all speakers in a single vectorized subtraction
+    """
+
+    def __init__(self, host, max_participants=MAX_PARTICIPANTS, **kwargs):
+        super().__init__(host, **kwargs)
+        self.max_participants = max_participants
+        self.participants = {}  # {("tcp"|"udp", addr): participant}
+        self.participants_lock = threading.Lock()
+        self.udp_socket = None
+        self._drop_all = False
+        self.audio_error = None  # Why the audio device can't be used, shown in the status
+        self._threads = []
+        self.lecture_mode = False
+        self.broadcaster = LectureBroadcaster()
+        self.recorder = None  # Optional SessionRecorder that gets the room's audio
+        # Who got their own mix / which shared encoders ran on the previous tick
+        self._last_speakers = set()
+        self._last_shared = set()
+
+    def start_server(self):
+        if self._threads:
+            if all(thread.is_alive() for thread in self._threads):
+                return
+            # A thread died (e.g. the sockets failed); stop the rest and start over
+            self.cleanup()
+        self.stop_event.clear()
+        self.set_status("Voice Hub: Waiting for participants...")
+        self._threads = [
+            threading.Thread(target=self._network_loop, daemon=True),
+            threading.Thread(target=self._mix_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        self.broadcaster.start()
+
+    def set_lecture_mode(self, enabled):
+        """Lecture mode: the teacher's mic goes to every student, students only reach the teacher."""
+        self.lecture_mode = bool(enabled)
+        print(f"Voice hub lecture mode {'on' if self.lecture_mode else 'off'}")
+
+    def participant_count(self):
+        return len(self.participants)
+
+    def _update_status(self):
+        count = len(self.participants)
+        if self.audio_error:
+            self.set_status(f"Voice Hub: Audio unavailable - {self.audio_error}")
+        elif count:
+            self.set_status(f"Voice Hub: {count} participant(s) connected")
+        else:
+            self.set_status("Voice Hub: Waiting for participants...")
+
+    def _add_participant(self, key, participant):
+        with self.participants_lock:
+            if len(self.participants) >= self.max_participants:
+                participant.close()
+                print(f"Voice hub full, refused {participant.addr[0]}")
+                return False
+            self.participants[key] = participant
+        print(f"Voice participant {participant.addr[0]} joined ({key[0]})")
+        self._update_status()
+        return True
+
+    def _remove_participant(self, key, selector=None):
+        with self.participants_lock:
+            participant = self.participants.pop(key, None)
+        if participant is None:
+            return
+        if selector and key[0] == "tcp":
+            try:
+                selector.unregister(participant.sock)
+            except (KeyError, ValueError):
+                pass
+        participant.close()
+        print(f"Voice participant {participant.addr[0]} left")
+        self._update_status()
+
+    # Network thread ----------------------------------------------------
+
+    def _network_loop(self):
+        selector = selectors.DefaultSelector()
+        try:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(16)
+            self.server_socket.setblocking(False)
+            selector.register(self.server_socket, selectors.EVENT_READ, "listen")
+
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.udp_socket.bind((self.host, self.port))
+            self.udp_socket.setblocking(False)
+            selector.register(self.udp_socket, selectors.EVENT_READ, "udp")
+            print(f"Voice hub listening on {self.host}:{self.port} (TCP and UDP)")
+
+            while not self.stop_event.is_set():
+                for key, _ in selector.select(timeout=0.05):
+                    if key.data == "listen":
+                        self._accept(selector)
+                    elif key.data == "udp":
+                        self._receive_datagrams()
+                    else:
+                        self._receive_stream(selector, key.data)
+                self._housekeeping(selector)
+        except Exception as e:
+            print(f"Voice hub error: {e}")
+            self.set_status(f"Voice Hub: Error - {e}")
+        finally:
+            for key in list(self.participants):
+                self._remove_participant(key, selector)
+            selector.close()
+            for sock in (self.server_socket, self.udp_socket):
+                if sock:
+                    sock.close()
+            self.server_socket = None
+            self.udp_socket = None
+
+    def _accept(self, selector):
+        try:
+            connection, addr = self.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        connection.setblocking(False)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        participant = StreamParticipant(connection, addr)
+        if self._add_participant(("tcp", addr), participant):
+            selector.register(connection, selectors.EVENT_READ, ("tcp", addr))
+
+    def _receive_stream(self, selector, key):
+        participant = self.participants.get(key)
+        if participant is None:
+            return
+        try:
+            data = participant.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._remove_participant(key, selector)
+            return
+        self._feed(key, participant, selector, participant.feed, data)
+
+    def _feed(self, key, participant, selector, method, *args):
+        """Run one participant's parsing; malformed input drops only that participant."""
+        try:
+            method(*args)
+        except Exception as e:
+            print(f"Malformed audio from voice participant {participant.addr[0]}: {e}")
+            self._remove_participant(key, selector)
+
+    def _receive_datagrams(self):
+        while True:
+            try:
+                packet, addr = self.udp_socket.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            arrival = time.time()
+            participant = self.participants.get(("udp", addr))
+            if participant:
+                participant.link.handle_packet(packet, arrival)
+                continue
+            parsed = parse_packet(packet)
+            if parsed and parsed[0] == PACKET_HELLO:
+                offered = parsed[5].decode("ascii", "replace").split(",")
+                codec_name = choose_codec(offered)
+                link = UdpVoiceLink(self.udp_socket, addr, codec_name)
+                if self._add_participant(("udp", addr), DatagramParticipant(link)):
+                    self.udp_socket.sendto(make_packet(PACKET_WELCOME, 0, 0, codec_name.encode("ascii")), addr)
+
+    def _housekeeping(self, selector):
+        if self._drop_all:
+            self._drop_all = False
+            for key in list(self.participants):
+                self._remove_participant(key, selector)
+            return
+        for key, participant in list(self.participants.items()):
+            if participant.closed:
+                self._remove_participant(key, selector)
+            elif key[0] == "tcp":
+                self._feed(key, participant, selector, participant.check_handshake_timeout)
+
+    # Mixer thread ------------------------------------------------------
+
+    def _mix_loop(self):
+        shared_encoders = {}
+        silence = np.zeros(CHUNK, dtype=np.int32)
+        retry_at = 0.0
+        backoff = AUDIO_RETRY_MIN
+        while not self.stop_event.is_set():
+            with self.participants_lock:
+                participants = list(self.participants.values())
+            if participants and not self.input_stream and time.monotonic() < retry_at:
+                self._drop_all = True  # No audio until the device is retried
+                participants = []
+            if not participants:
+                if self.input_stream:
+                    self.cleanup_audio()
+                    self.level_meter.reset()
+                    self.running = self.connected = False
+                    self._report_suppression()
+                time.sleep(FRAME_DURATION)
+                continue
+            try:
+                if not self.input_stream:
+                    self.initialize_audio()
+                    self.running = self.connected = True
+                # Reading the microphone paces the loop at one chunk per tick
+                mic_bytes = self.input_stream.read(CHUNK, exception_on_overflow=False)
+                if self.lecture_mode:
+                    self.lecture_tick(participants, mic_bytes, silence)
+                else:
+                    self.mix_tick(participants, mic_bytes, shared_encoders, silence)
+            except Exception as e:
+                self.cleanup_audio()
+                self.running = self.connected = False
+                print(f"Voice mixer error: {e}; dropping participants, retrying audio in {backoff:.0f} s")
+                self.audio_error = str(e) or type(e).__name__
+                self._drop_all = True
+                self._update_status()
+                retry_at = time.monotonic() + backoff
+                backoff = min(backoff * 2, AUDIO_RETRY_MAX)
+                continue
+            if self.audio_error:
+                self.audio_error = None
+                backoff = AUDIO_RETRY_MIN
+                self._update_status()
+        self.cleanup_audio()
+
+    def mix_tick(self, participants, mic_bytes, shared_encoders, silence):
+        """Mix one chunk: students to the teacher, everyone back to the students."""
+        self.level_meter.update(mic_bytes)
+        mic = np.frombuffer(mic_bytes, dtype="<i2")
+
+        speakers = []
+        frames = []
+        for participant in participants:
+            frame = participant.next_frame()
+            if frame is not None:
+                speakers.append(participant)
+                frames.append(frame)
+
+        if frames:
+            stacked = np.stack(frames).astype(np.int32)  # (speakers, CHUNK)
+            students = stacked.sum(axis=0)
+        else:
+            stacked = None
+            students = silence
+        if self.output_stream:
+            self.output_stream.write(clip16(students).tobytes())
+
+        # Nobody is talking: send comfort-noise markers instead of the mix
+        action = self._suppress(mic_bytes)
+        if self.recorder and (frames or action == FRAME_AUDIO):
+            self.recorder.record_audio(clip16(students + mic).tobytes())
+        if not frames and action != FRAME_AUDIO:
+            if action == FRAME_SILENCE:
+                marker = self.suppressor.marker()
+                for participant in participants:
+                    participant.send_silence(marker)
+            self._last_speakers = set()
+            self._last_shared = set()
+            return
+
+        shared = students + mic
+        shared_pcm = clip16(shared).tobytes()
+        # Every speaker hears everyone but themselves
+        own_mixes = clip16(shared[np.newaxis, :] - stacked) if stacked is not None else None
+
+        # Encoders that skipped the previous tick start over, or ADPCM would click
+        shared_payloads = {}
+        speaking = set(map(id, speakers))
+        for index, participant in enumerate(speakers):
+            if id(participant) not in self._last_speakers:
+                participant.reset_encoder()
+            participant.send_payload(participant.encode(own_mixes[index].tobytes()))
+        for participant in participants:
+            if id(participant) in speaking:
+                continue
+            codec_name = participant.codec_name
+            if codec_name not in shared_payloads:
+                if codec_name is None:
+                    shared_payloads[None] = shared_pcm
+                else:
+                    if codec_name not in shared_encoders:
+                        shared_encoders[codec_name] = create_codec(codec_name)
+                    encoder = shared_encoders[codec_name]
+                    if codec_name not in self._last_shared:
+                        encoder.reset()
+                    shared_payloads[codec_name] = encoder.encode(shared_pcm)
+            participant.send_payload(shared_payloads[codec_name])
+        self._last_speakers = speaking
+        self._last_shared = set(shared_payloads)
+
+    def _suppress(self, mic_bytes):
+        """Run the mic through silence suppression; returns FRAME_AUDIO, FRAME_SILENCE or None."""
+        if not self.silence_suppression:
+            return FRAME_AUDIO
+        return self.suppressor.process(mic_bytes)
+
+    def lecture_tick(self, participants, mic_bytes, silence):
+        """Broadcast the mic to everyone; students are mixed to the teacher only."""
+        self.level_meter.update(mic_bytes)
+        action = self._suppress(mic_bytes)
+        if action == FRAME_AUDIO:
+            self.broadcaster.publish(mic_bytes, participants)
+        elif action == FRAME_SILENCE:
+            self.broadcaster.publish(SilenceMarker(self.suppressor.marker()), participants)
+
+        frames = [frame for frame in (p.next_frame() for p in participants) if frame is not None]
+        students = np.stack(frames).astype(np.int32).sum(axis=0) if frames else silence
+        if self.output_stream:
+            self.output_stream.write(clip16(students).tobytes())
+        if self.recorder and (frames or action == FRAME_AUDIO):
+            mic = np.frombuffer(mic_bytes, dtype="<i2")
+            self.recorder.record_audio(clip16(students + mic).tobytes())
+
+    def disconnect(self):
+        """Drop every participant; the hub keeps listening."""
+        self._drop_all = True
+
+    def cleanup(self):
+        self.stop_event.set()
+        self.broadcaster.stop()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self.cleanup_audio()
+        print("Voice hub resources cleaned up")
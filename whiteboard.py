@@ -1,17 +1,30 @@
-from tkinter import Tk, Canvas, Button, filedialog, ttk, Frame, Label, StringVar, Scale, HORIZONTAL, IntVar
+from tkinter import Tk, Canvas, Button, filedialog, ttk, Frame, Label, StringVar, Scale, HORIZONTAL, IntVar, BooleanVar
 import time
 import threading
-import io
-from PIL import Image, ImageTk
-import base64
-import fitz  # PyMuPDF for PDF handling
+import queue
 
-from voice_chat import VoiceChat
+from voice_hub import VoiceHub
 from connection_manager import ConnectionRequestPanel
-from server import socketio, coordinates_queue, connected_clients
+from ink_layer import InkBaker, snapshot
+from recorder import SessionRecorder, replay_in_background
+from server import session
+from session import ERASER_RADIUS, TEACHER
+
+# Finished ink is baked into the page image once the canvas holds this many items
+FLATTEN_THRESHOLD = 4000
+
+# Wait after a failed bake before trying again, doubling up to the maximum (seconds)
+BAKE_RETRY_MIN = 1.0
+BAKE_RETRY_MAX = 60.0
+
+# Quiet time after the last <Configure> before the page is re-fitted to the canvas
+RESIZE_DEBOUNCE_MS = 150
+
+# How often unanswered connection requests are checked for expiry
+REQUEST_EXPIRY_CHECK_MS = 10000
 
 class CollaborativeWhiteboard:
-    def __init__(self, root, host_ip):
+    def __init__(self, root, host_ip, record_path=None, flatten_threshold=FLATTEN_THRESHOLD):
         self.root = root
         self.root.title("Collaborative Whiteboard with Voice Chat")
         self.host_ip = host_ip
@@ -34,8 +47,15 @@ class CollaborativeWhiteboard:
         self.canvas = Canvas(self.right_panel, bg="white", width=self.canvas_width, height=self.canvas_height)
         self.canvas.pack(fill="both", expand=True)
         
-        # Initialize the voice chat
-        self.voice_chat = VoiceChat(host_ip)
+        # Initialize the voice hub (any number of students can talk)
+        self.voice_chat = VoiceHub(host_ip)
+        
+        # Optional lecture recording (ink, pages and the room's audio)
+        self.recorder = None
+        if record_path:
+            self.recorder = SessionRecorder(record_path, session)
+            self.recorder.start()
+            self.voice_chat.recorder = self.recorder
         
         # Create connection panel
         self.connection_frame = Frame(self.left_panel, bg="#f0f0f0")
@@ -55,8 +75,23 @@ class CollaborativeWhiteboard:
         
         ttk.Button(btn_frame, text="Disconnect Voice", command=self.disconnect_voice).pack(side="left", padx=2)
         
+        # Lecture mode: broadcast the teacher's voice to every student
+        self.lecture_var = BooleanVar(value=False)
+        ttk.Checkbutton(btn_frame, text="Lecture mode", variable=self.lecture_var,
+                        command=self.toggle_lecture_mode).pack(side="left", padx=2)
+        
         # Status display
-        ttk.Label(self.connection_frame, textvariable=self.voice_chat.status_var).pack(pady=5)
+        self.voice_status_var = StringVar(value=self.voice_chat.status)
+        ttk.Label(self.connection_frame, textvariable=self.voice_status_var).pack(pady=5)
+        
+        # Microphone level meter
+        level_frame = Frame(self.connection_frame, bg="#f0f0f0")
+        level_frame.pack(fill="x", pady=2)
+        Label(level_frame, text="Mic:", bg="#f0f0f0").pack(side="left")
+        self.audio_level_bar = ttk.Progressbar(level_frame, orient=HORIZONTAL, length=120, maximum=100)
+        self.audio_level_bar.pack(side="left", padx=2)
+        self.clip_label = Label(level_frame, text="CLIP", bg="#f0f0f0", fg="#f0f0f0")
+        self.clip_label.pack(side="left")
         
         # Connected clients display
         self.clients_var = StringVar()
@@ -77,6 +112,15 @@ class CollaborativeWhiteboard:
         self.pen_color = "blue"
     
         self.line_width = 3
+        
+        # Tool selection: pen, stroke eraser or lasso selection
+        self.tool_var = StringVar(value="pen")
+        tool_frame = Frame(self.drawing_frame, bg="#f0f0f0")
+        tool_frame.pack(fill="x", pady=5)
+        for text, tool in (("Pen", "pen"), ("Eraser", "eraser"), ("Lasso", "lasso")):
+            ttk.Radiobutton(tool_frame, text=text, value=tool, variable=self.tool_var,
+                            command=self.clear_selection).pack(side="left", padx=2)
+        ttk.Button(tool_frame, text="Delete Selection", command=self.delete_selection).pack(side="left", padx=2)
 
         
         # PDF Controls
@@ -105,47 +149,91 @@ class CollaborativeWhiteboard:
         ttk.Button(wb_controls, text="Clear Annotations", command=self.clear_annotations).pack(side="left", padx=2)
         ttk.Button(wb_controls, text="Clear All", command=self.clear_all).pack(side="left", padx=2)
         
+        # Flattening mode: keep the canvas item count bounded on long lectures
+        self.flatten_var = BooleanVar(value=True)
+        ttk.Checkbutton(self.drawing_frame, text="Flatten old ink", variable=self.flatten_var).pack(anchor="w")
+        self.flatten_status_var = StringVar()
+        Label(self.drawing_frame, textvariable=self.flatten_status_var, bg="#f0f0f0", fg="red").pack(anchor="w")
+        
         # Drawing variables
         self.prev_x = None
         self.prev_y = None
         self.drawing = False
+        self.page_master = None  # Full-resolution page image, rescaled on resize
+        self.current_image = None  # Page image as displayed (resized)
         self.current_image_tk = None
         self.image_width = self.canvas_width  # Default to canvas size
         self.image_height = self.canvas_height
         self.x_offset = 0
         self.y_offset = 0
-        
-        # PDF Variables
-        self.pdf_document = None
-        self.current_page = 0
-        self.total_pages = 0
+        self.lasso_points = []  # Normalized vertices of the lasso being drawn
+        self.selected_ids = []  # Strokes picked by the lasso
+        
+        # Window resizing: debounced <Configure>, page rescaled off the Tk thread
+        self.resize_job = None
+        self.resize_generation = 0  # Bumped whenever the page or its size changes
+        self.rescale_pending = False
+        
+        # Raster layer holding baked (flattened) strokes, see ink_layer.py
+        self.flatten_threshold = flatten_threshold
+        self.ink_baker = InkBaker(lambda result: self.event_queue.put(("ink_baked", result)))
+        self.ink_generation = 0  # Bumped whenever the page under the layer changes
+        self.ink_layer = None
+        self.baked_ids = set()
+        self.baking_ids = set()
+        self.rebake_needed = False
+        self.bake_retry_at = 0.0  # time.monotonic() before which no bake starts
+        self.bake_backoff = BAKE_RETRY_MIN
+        # Annotation items on the canvas, kept here so checking the count needs no Tk call
+        self.annotation_items = 0
+        self.stroke_items = {}  # {stroke id (None for untagged ink): canvas items}
+        
+        # Session events waiting to be applied on the Tk thread
+        self.event_queue = queue.Queue()
+        self.admission_version = -1  # Version of the admission snapshot on screen
+        session.add_listener(self.on_session_event)
+        # The voice threads report their status through the same queue
+        self.voice_chat.on_status = lambda text: self.event_queue.put(("voice_status", text))
         
         # Bind mouse events
         self.canvas.bind("<Button-1>", self.start_draw)
         self.canvas.bind("<B1-Motion>", self.draw)
         self.canvas.bind("<ButtonRelease-1>", self.stop_draw)
+        self.root.bind("<Delete>", lambda event: self.delete_selection())
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
         
         # Start the coordinate processing
         self.root.after(50, self.process_coordinates)
         # Start audio level update
-        # Start connected clients counter update
-        self.root.after(500, self.update_client_count)
-        # Start connection request panel refresh
-        self.root.after(2000, self.refresh_connection_requests)
-        
-        # Start the voice server automatically
-        self.voice_chat.start_server()
+        self.root.after(100, self.update_audio_level)
+        # Client count and requests are redrawn on admission_changed; show the current ones
+        self.show_admission()
+        # Start dropping connection requests nobody answered
+        self.root.after(REQUEST_EXPIRY_CHECK_MS, self.expire_requests)
+        
+        # Start the voice server once the window is up
+        self.root.after(100, self.voice_chat.start_server)
     
-    def refresh_connection_requests(self):
-        """Refresh the connection request panel."""
-        self.connection_request_panel.refresh_requests()
-        self.root.after(4000, self.refresh_connection_requests)
+    def expire_requests(self):
+        """Drop stale connection requests; the panel updates through admission_changed."""
+        session.expire_stale_requests()
+        self.root.after(REQUEST_EXPIRY_CHECK_MS, self.expire_requests)
     
-    def update_client_count(self):
-        """Update the connected clients counter"""
-        count = len(connected_clients)
-        self.clients_var.set(f"Connected Clients: {count}")
-        self.root.after(2000, self.update_client_count)
+    def update_audio_level(self):
+        """Show the latest microphone level published by the capture thread"""
+        reading = self.voice_chat.level_meter.reading
+        self.audio_level_bar["value"] = reading.percent
+        self.clip_label.config(fg="red" if reading.clipping else "#f0f0f0")
+        self.root.after(100, self.update_audio_level)
+    
+    def show_admission(self):
+        """Show the latest admission snapshot (client count and request panel)."""
+        snapshot = session.admission_snapshot()
+        if snapshot.version == self.admission_version:
+            return  # Several changes were queued; the first one drew them all
+        self.admission_version = snapshot.version
+        self.clients_var.set(f"Connected Clients: {len(snapshot.connected_clients)}")
+        self.connection_request_panel.show_requests(snapshot)
     
     def disconnect_voice(self):
         """Disconnect the voice chat"""
@@ -153,6 +241,10 @@ class CollaborativeWhiteboard:
         # Start the server again after a short delay
         self.root.after(1000, self.voice_chat.start_server)
     
+    def toggle_lecture_mode(self):
+        """Switch the voice hub between lecture broadcast and open discussion"""
+        self.voice_chat.set_lecture_mode(self.lecture_var.get())
+    
     def set_pen_color(self, color):
         """Set the pen color"""
         self.pen_color = color
@@ -161,31 +253,36 @@ class CollaborativeWhiteboard:
         """Set the line width"""
         self.line_width = int(float(width))
     
+    def normalize(self, x, y):
+        """Convert canvas coordinates to normalized page coordinates (0-1)."""
+        norm_x = (x - self.x_offset) / self.image_width if self.image_width > 0 else 0
+        norm_y = (y - self.y_offset) / self.image_height if self.image_height > 0 else 0
+        
+        # Bound coordinates to valid range
+        return max(0, min(1, norm_x)), max(0, min(1, norm_y))
+    
     def start_draw(self, event):
-        """Start drawing on mouse press"""
+        """Start drawing, erasing or a lasso on mouse press"""
         self.drawing = True
         # Store current position
         x, y = event.x, event.y
+        norm_x, norm_y = self.normalize(x, y)
         
-        # Convert to normalized coordinates (0-1)
-        norm_x = (x - self.x_offset) / self.image_width if self.image_width > 0 else 0
-        norm_y = (y - self.y_offset) / self.image_height if self.image_height > 0 else 0
-        
-        # Bound coordinates to valid range
-        norm_x = max(0, min(1, norm_x))
-        norm_y = max(0, min(1, norm_y))
+        tool = self.tool_var.get()
+        if tool == "eraser":
+            session.erase_at(norm_x, norm_y, ERASER_RADIUS)
+            return
+        if tool == "lasso":
+            self.clear_selection()
+            self.lasso_points = [(norm_x, norm_y)]
+            self.prev_x = x
+            self.prev_y = y
+            return
         
         # Reset previous point
         self.prev_x = x
         self.prev_y = y
         
-        # Draw a point
-        self.canvas.create_oval(
-            x - self.line_width / 2, y - self.line_width / 2,
-            x + self.line_width / 2, y + self.line_width / 2,
-            fill=self.pen_color, outline=self.pen_color, tags="annotation"
-        )
-        
         # Send to Flask server
         data = {
             "x": norm_x,
@@ -194,56 +291,103 @@ class CollaborativeWhiteboard:
             "line_width": self.line_width,
             "pen_color": self.pen_color
         }
-        socketio.emit("coordinate_update", data)
+        stroke_id = session.add_point(data, origin=TEACHER)
+        
+        # Draw a point
+        self.canvas.create_oval(
+            x - self.line_width / 2, y - self.line_width / 2,
+            x + self.line_width / 2, y + self.line_width / 2,
+            fill=self.pen_color, outline=self.pen_color, tags=("annotation", f"stroke{stroke_id}")
+        )
+        self.count_items(stroke_id, 1)
     
     def draw(self, event):
-        """Continue drawing on mouse drag"""
+        """Continue drawing, erasing or the lasso on mouse drag"""
         if not self.drawing:
             return
             
         x, y = event.x, event.y
+        norm_x, norm_y = self.normalize(x, y)
         
-        # Convert to normalized coordinates (0-1)
-        norm_x = (x - self.x_offset) / self.image_width if self.image_width > 0 else 0
-        norm_y = (y - self.y_offset) / self.image_height if self.image_height > 0 else 0
+        tool = self.tool_var.get()
+        if tool == "eraser":
+            session.erase_at(norm_x, norm_y, ERASER_RADIUS)
+            return
+        if tool == "lasso":
+            self.canvas.create_line(self.prev_x, self.prev_y, x, y, dash=(4, 2), tags="lasso")
+            self.lasso_points.append((norm_x, norm_y))
+            self.prev_x = x
+            self.prev_y = y
+            return
         
-        # Bound coordinates to valid range
-        norm_x = max(0, min(1, norm_x))
-        norm_y = max(0, min(1, norm_y))
+        # Send to Flask server
+        data = {
+            "x": norm_x,
+            "y": norm_y,
+            "is_start": False,
+            "line_width": self.line_width,
+            "pen_color": self.pen_color
+        }
+        stroke_id = session.add_point(data, origin=TEACHER)
+        tags = ("annotation", f"stroke{stroke_id}")
         
         # Draw a line segment
         if self.prev_x is not None and self.prev_y is not None:
             self.canvas.create_line(
                 self.prev_x, self.prev_y, x, y, 
-                fill=self.pen_color, width=self.line_width, tags="annotation"
+                fill=self.pen_color, width=self.line_width, tags=tags
             )
         
         # Draw endpoint
         self.canvas.create_oval(
             x - self.line_width / 2, y - self.line_width / 2,
             x + self.line_width / 2, y + self.line_width / 2,
-            fill=self.pen_color, outline=self.pen_color, tags="annotation"
+            fill=self.pen_color, outline=self.pen_color, tags=tags
         )
+        self.count_items(stroke_id, 2 if self.prev_x is not None and self.prev_y is not None else 1)
         
         # Update previous point
         self.prev_x = x
         self.prev_y = y
-        
-        # Send to Flask server
-        data = {
-            "x": norm_x,
-            "y": norm_y,
-            "is_start": False,
-            "line_width": self.line_width,
-            "pen_color": self.pen_color
-        }
-        socketio.emit("coordinate_update", data)
     
     def stop_draw(self, event):
         """Stop drawing on mouse release"""
         self.drawing = False
         self.prev_x = None
         self.prev_y = None
+        if self.tool_var.get() == "lasso":
+            self.canvas.delete("lasso")
+            self.select_strokes(session.select_lasso(self.lasso_points))
+            self.lasso_points = []
+            return
+        session.end_stroke(origin=TEACHER)
+    
+    def select_strokes(self, stroke_ids):
+        """Select strokes and outline them on the canvas."""
+        self.canvas.delete("selection")
+        self.selected_ids = stroke_ids
+        with session.lock:
+            bounds = session.strokes.bounds(stroke_ids)
+        if bounds is None:
+            return
+        x0, y0, x1, y1 = bounds
+        pad = self.line_width
+        self.canvas.create_rectangle(
+            x0 * self.image_width + self.x_offset - pad, y0 * self.image_height + self.y_offset - pad,
+            x1 * self.image_width + self.x_offset + pad, y1 * self.image_height + self.y_offset + pad,
+            outline="#3080ff", dash=(4, 2), tags="selection"
+        )
+    
+    def clear_selection(self):
+        """Drop the lasso selection."""
+        self.selected_ids = []
+        self.canvas.delete("selection")
+    
+    def delete_selection(self):
+        """Erase the strokes picked by the lasso."""
+        if self.selected_ids:
+            session.erase_strokes(self.selected_ids)
+        self.clear_selection()
     
     def upload_pdf(self):
         """Upload and display a PDF document."""
@@ -252,137 +396,153 @@ class CollaborativeWhiteboard:
             return
 
         try:
-            # Open the PDF file
-            self.pdf_document = fitz.open(file_path)
-            self.total_pages = len(self.pdf_document)
-            self.current_page = 0
-            
-            # Update page counter
-            self.page_var.set(1)  # Display is 1-based
-            self.total_pages_var.set(f"/ {self.total_pages}")
-            
-            # Read PDF to memory buffer for sending
-            with open(file_path, "rb") as pdf_file:
-                pdf_bytes = pdf_file.read()
-                pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-            
-            # Send PDF to server for sharing
-            socketio.emit("new_pdf", {
-                "pdf_data": pdf_base64,
-                "total_pages": self.total_pages,
-                "current_page": self.current_page
-            })
-            
-            # Display first page
-            self.render_pdf_page(self.current_page)
-            
-            print(f"PDF uploaded: {file_path}, {self.total_pages} pages")
+            session.load_pdf(file_path)
         except Exception as e:
             print(f"Error uploading PDF: {e}")
     
     def render_pdf_page(self, page_num):
-        """Render a specific PDF page to the canvas."""
-        if not self.pdf_document or page_num < 0 or page_num >= self.total_pages:
-            return
-        
+        """Render a specific PDF page to the canvas and share it with clients."""
         try:
-            # Get the page
-            page = self.pdf_document[page_num]
-            
-            # Convert to an image with higher resolution for clarity
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            
-            # Convert to PIL Image
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Preserve original dimensions for proper mapping
-            original_width, original_height = img.size
-            
-            # Calculate aspect ratio
-            aspect_ratio = original_width / original_height
-            canvas_aspect = self.canvas_width / self.canvas_height
-            
-            # Resize while preserving aspect ratio
-            if aspect_ratio > canvas_aspect:
-                # Image is wider than canvas (relative to height)
-                new_width = self.canvas_width
-                new_height = int(new_width / aspect_ratio)
-            else:
-                # Image is taller than canvas (relative to width)
-                new_height = self.canvas_height
-                new_width = int(new_height * aspect_ratio)
-            
-            img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-            
-            # Calculate offsets for centering
-            self.image_width = new_width
-            self.image_height = new_height
-            self.x_offset = (self.canvas_width - new_width) // 2
-            self.y_offset = (self.canvas_height - new_height) // 2
-            
-            # Display image
-            self.current_image = img_resized
-            self.current_image_tk = ImageTk.PhotoImage(img_resized)
-            self.canvas.delete("all")  # Clear the canvas
-            self.canvas.create_image(
-                self.x_offset, self.y_offset, anchor="nw", image=self.current_image_tk
-            )
-            
-            # Send page change to clients
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            socketio.emit("change_page", {
-                "page_image": img_base64,
-                "page_number": page_num,
-                "canvas_width": original_width,
-                "canvas_height": original_height
-            })
-            
-            print(f"Displayed PDF page {page_num+1}/{self.total_pages}")
+            session.goto_page(page_num)
         except Exception as e:
             print(f"Error rendering PDF page: {e}")
     
+    def fit_page(self, page_size):
+        """Displayed (width, height, x offset, y offset) of a page fitted to the canvas.
+
+        Without a page (page_size None) the whole canvas is the page.
+        """
+        if page_size is None:
+            return self.canvas_width, self.canvas_height, 0, 0
+        
+        # Calculate aspect ratio
+        original_width, original_height = page_size
+        aspect_ratio = original_width / original_height
+        canvas_aspect = self.canvas_width / self.canvas_height
+        
+        # Resize while preserving aspect ratio
+        if aspect_ratio > canvas_aspect:
+            # Image is wider than canvas (relative to height)
+            new_width = self.canvas_width
+            new_height = max(1, int(new_width / aspect_ratio))
+        else:
+            # Image is taller than canvas (relative to width)
+            new_height = self.canvas_height
+            new_width = max(1, int(new_height * aspect_ratio))
+        
+        # Offsets for centering
+        return new_width, new_height, (self.canvas_width - new_width) // 2, (self.canvas_height - new_height) // 2
+    
+    def display_page(self, img):
+        """Fit a full-resolution page image to the canvas and display it."""
+        from PIL import Image, ImageTk
+
+        # Keep the full-resolution page so resizing never re-rasterizes the PDF
+        self.page_master = img
+        self.resize_generation += 1
+        self.rescale_pending = False
+        self.image_width, self.image_height, self.x_offset, self.y_offset = self.fit_page(img.size)
+        img_resized = img.resize((self.image_width, self.image_height), Image.LANCZOS)
+        
+        # Display image
+        self.current_image = img_resized
+        self.current_image_tk = ImageTk.PhotoImage(img_resized)
+        self.canvas.delete("all")  # Clear the canvas
+        self.forget_annotations()
+        self.reset_ink_layer()
+        self.canvas.create_image(
+            self.x_offset, self.y_offset, anchor="nw", image=self.current_image_tk, tags="page"
+        )
+        self.prev_x = None
+        self.prev_y = None
+    
+    def on_canvas_configure(self, event):
+        """Re-fit the page once the canvas has stopped changing size."""
+        if self.resize_job is not None:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(RESIZE_DEBOUNCE_MS, self.resize_canvas, event.width, event.height)
+    
+    def resize_canvas(self, width, height):
+        """Re-fit the page and its ink to a new canvas size.
+
+        Every canvas item is remapped in place by one scale and one move; the
+        page image is rescaled from page_master on a background thread and
+        swapped in when ready.
+        """
+        self.resize_job = None
+        if (width, height) == (self.canvas_width, self.canvas_height) or width < 2 or height < 2:
+            return
+        self.canvas_width, self.canvas_height = width, height
+        old_width, old_height, old_x, old_y = self.image_width, self.image_height, self.x_offset, self.y_offset
+        page_size = self.page_master.size if self.page_master is not None else None
+        self.image_width, self.image_height, self.x_offset, self.y_offset = self.fit_page(page_size)
+        scale_x = self.image_width / old_width
+        scale_y = self.image_height / old_height
+        
+        # Scale about the old page corner, then move it onto the new one
+        self.canvas.scale("all", old_x, old_y, scale_x, scale_y)
+        self.canvas.move("all", self.x_offset - old_x, self.y_offset - old_y)
+        if self.prev_x is not None and self.prev_y is not None:
+            self.prev_x = (self.prev_x - old_x) * scale_x + self.x_offset
+            self.prev_y = (self.prev_y - old_y) * scale_y + self.y_offset
+        
+        # The ink layer and any bake in flight were painted at the old size
+        self.ink_generation += 1
+        self.ink_layer = None
+        self.baking_ids = set()
+        self.resize_generation += 1
+        if self.page_master is None:
+            self.current_image = None
+            self.rebake_needed = bool(self.baked_ids)
+            return
+        # Until the rescaled page arrives the old image stays up, moved into place
+        self.rescale_pending = True
+        threading.Thread(
+            target=self._rescale_page,
+            args=(self.resize_generation, self.page_master, (self.image_width, self.image_height)),
+            daemon=True,
+        ).start()
+    
+    def _rescale_page(self, generation, master, size):
+        """Resize the master page image (background thread)."""
+        from PIL import Image
+
+        try:
+            img = master.resize(size, Image.LANCZOS)
+        except Exception as e:
+            print(f"Error rescaling page: {e}")
+            return
+        self.event_queue.put(("page_rescaled", (generation, img)))
+    
+    def apply_rescaled_page(self, generation, img):
+        """Show a page rescaled for the current canvas size (Tk thread)."""
+        if generation != self.resize_generation:
+            return  # The page or the canvas size changed again meanwhile
+        self.rescale_pending = False
+        self.current_image = img
+        if self.baked_ids:
+            # The baked ink is re-painted at the new size over the new page
+            self.rebake_needed = True
+        else:
+            self.show_page_image(img)
+    
     def next_page(self):
         """Display the next page of the PDF."""
-        if self.pdf_document and self.current_page < self.total_pages - 1:
-            self.current_page += 1
-            self.page_var.set(self.current_page + 1)  # Display is 1-based
-            self.render_pdf_page(self.current_page)
+        session.next_page()
     
     def previous_page(self):
         """Display the previous page of the PDF."""
-        if self.pdf_document and self.current_page > 0:
-            self.current_page -= 1
-            self.page_var.set(self.current_page + 1)  # Display is 1-based
-            self.render_pdf_page(self.current_page)
+        session.previous_page()
 
     def clear_annotations(self):
         """Clear only annotations while keeping the image."""
-        self.canvas.delete("annotation")
-        self.prev_x = None
-        self.prev_y = None
-        # Notify clients to clear their views
-        socketio.emit("clear_annotations")
+        session.clear_annotations()
     
     def clear_all(self):
         """Clear everything from the canvas"""
-        self.canvas.delete("all")
-        self.current_image_tk = None
-        self.prev_x = None
-        self.prev_y = None
-        # Close PDF if open
-        if self.pdf_document:
-            self.pdf_document.close()
-            self.pdf_document = None
-            self.total_pages = 0
-            self.current_page = 0
-            self.page_var.set(1)
-            self.total_pages_var.set("/ 0")
-        socketio.emit("clear_all")
-    
-    def draw_point(self, x, y, is_start, line_width, pen_color):
+        session.clear_all()
+    
+    def draw_point(self, x, y, is_start, line_width, pen_color, stroke_id=None):
         """Draw a point or line segment from received data."""
         # Convert normalized coordinates (0-1) to canvas coordinates
         canvas_x = x * self.image_width + self.x_offset
@@ -393,49 +553,216 @@ class CollaborativeWhiteboard:
             self.prev_x = None
             self.prev_y = None
 
+        tags = ("annotation", f"stroke{stroke_id}") if stroke_id is not None else "annotation"
+        
         # Draw line if we have a previous point
         if self.prev_x is not None and self.prev_y is not None:
             self.canvas.create_line(
                 self.prev_x, self.prev_y, canvas_x, canvas_y, 
-                fill=pen_color, width=line_width, tags="annotation"
+                fill=pen_color, width=line_width, tags=tags
             )
         
         # Draw the current point
         self.canvas.create_oval(
             canvas_x - line_width / 2, canvas_y - line_width / 2,
             canvas_x + line_width / 2, canvas_y + line_width / 2,
-            fill=pen_color, outline=pen_color, tags="annotation"
+            fill=pen_color, outline=pen_color, tags=tags
         )
+        self.count_items(stroke_id, 2 if self.prev_x is not None and self.prev_y is not None else 1)
         
         # Update previous point
         self.prev_x = canvas_x
         self.prev_y = canvas_y
 
+    def on_session_event(self, event, payload):
+        """Session listener; may be called from any thread."""
+        if event == "point" and payload["origin"] == TEACHER:
+            return  # Already drawn by start_draw/draw
+        if event == "document_loaded":
+            return  # Shown on page_changed
+        if event == "stroke_ended":
+            return  # Nothing to draw
+        self.event_queue.put((event, payload))
+        # Changes made from the Tk thread itself are shown immediately
+        if threading.current_thread() is threading.main_thread():
+            self.apply_session_events()
+    
+    def apply_session_events(self):
+        """Apply queued session events to the canvas."""
+        while True:
+            try:
+                event, payload = self.event_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event == "point":
+                data = payload["data"]
+                # Coordinates are already normalized (0-1)
+                x = data["x"] 
+                y = data["y"]
+                is_start = data.get("is_start", False)
+                line_width = data.get("line_width", self.line_width)
+                pen_color = data.get("pen_color", self.pen_color)
+                self.draw_point(x, y, is_start, line_width, pen_color, data.get("stroke_id"))
+            elif event == "strokes_erased":
+                for stroke_id in payload["stroke_ids"]:
+                    self.delete_stroke_items(stroke_id)
+                erased = set(payload["stroke_ids"])
+                if erased & (self.baked_ids | self.baking_ids):
+                    # Baked ink can't be deleted item by item; bake the layer again without it
+                    self.baked_ids -= erased
+                    self.rebake_needed = True
+                if set(self.selected_ids) & set(payload["stroke_ids"]):
+                    self.select_strokes([i for i in self.selected_ids if i not in payload["stroke_ids"]])
+            elif event == "page_changed":
+                self.clear_selection()
+                self.page_var.set(payload["page_number"] + 1)  # Display is 1-based
+                self.total_pages_var.set(f"/ {payload['total_pages']}")
+                self.display_page(payload["image"])
+            elif event == "ink_baked":
+                self.apply_ink_layer(payload)
+            elif event == "page_rescaled":
+                self.apply_rescaled_page(*payload)
+            elif event == "admission_changed":
+                self.show_admission()
+            elif event == "voice_status":
+                self.voice_status_var.set(payload)
+            elif event == "clear_annotations":
+                self.canvas.delete("annotation")
+                self.forget_annotations()
+                self.clear_selection()
+                if self.ink_layer is not None or self.baked_ids:
+                    self.show_page_image(self.current_image)
+                self.reset_ink_layer()
+                self.prev_x = None
+                self.prev_y = None
+            elif event == "clear_all":
+                self.canvas.delete("all")
+                self.forget_annotations()
+                self.selected_ids = []
+                self.page_master = None
+                self.resize_generation += 1
+                self.rescale_pending = False
+                self.current_image = None
+                self.current_image_tk = None
+                self.reset_ink_layer()
+                self.prev_x = None
+                self.prev_y = None
+                self.page_var.set(1)
+                self.total_pages_var.set("/ 0")
+
     def process_coordinates(self):
-        """Process coordinates from the queue."""
-        while not coordinates_queue.empty():
-            data = coordinates_queue.get()
-            # Coordinates are already normalized (0-1)
-            x = data["x"] 
-            y = data["y"]
-            is_start = data.get("is_start", False)
-            line_width = data.get("line_width", self.line_width)
-            pen_color = data.get("pen_color", self.pen_color)
-            self.draw_point(x, y, is_start, line_width, pen_color)
+        """Process coordinates and other session events from the queue."""
+        self.apply_session_events()
+        self.maybe_flatten()
         self.root.after(50, self.process_coordinates)
     
+    def count_items(self, stroke_id, count):
+        """Note canvas items just drawn for a stroke."""
+        self.annotation_items += count
+        self.stroke_items[stroke_id] = self.stroke_items.get(stroke_id, 0) + count
+    
+    def delete_stroke_items(self, stroke_id):
+        """Delete a stroke's canvas items."""
+        self.canvas.delete(f"stroke{stroke_id}")
+        self.annotation_items -= self.stroke_items.pop(stroke_id, 0)
+    
+    def forget_annotations(self):
+        """Reset the item count after every annotation was deleted from the canvas."""
+        self.annotation_items = 0
+        self.stroke_items = {}
+    
+    def reset_ink_layer(self):
+        """Forget the baked ink; results of bakes still running are dropped."""
+        self.ink_generation += 1
+        self.ink_layer = None
+        self.baked_ids = set()
+        self.baking_ids = set()
+        self.rebake_needed = False
+    
+    def maybe_flatten(self):
+        """Bake finished strokes in the background once the canvas holds too many items."""
+        if self.ink_baker.busy() or self.rescale_pending or time.monotonic() < self.bake_retry_at:
+            return
+        # A rebake restores ink that is already baked, so it runs even with flattening off
+        if not self.rebake_needed and (not self.flatten_var.get()
+                                       or self.annotation_items < self.flatten_threshold):
+            return
+        rebake = self.rebake_needed
+        with session.lock:
+            open_ids = {stroke.id for stroke in session.strokes.open_strokes.values()}
+            strokes = snapshot([
+                stroke for stroke in session.strokes
+                if stroke.id not in open_ids and (rebake or stroke.id not in self.baked_ids)
+            ])
+        if not strokes and not rebake:
+            return
+        self.rebake_needed = False
+        self.baking_ids = {stroke.id for stroke in strokes}
+        self.ink_baker.bake(self.ink_generation, strokes, (self.image_width, self.image_height),
+                            base_layer=None if rebake else self.ink_layer, page_image=self.current_image)
+    
+    def apply_ink_layer(self, result):
+        """Show a baked layer and delete the canvas items it replaces (Tk thread)."""
+        if result.generation != self.ink_generation:
+            return  # Baked for a page (or size) that is no longer shown
+        self.baking_ids = set()
+        if result.error is not None:
+            # Keep the ink as canvas items and try again later, less and less often
+            if result.replace and self.baked_ids:
+                self.rebake_needed = True  # The baked ink still has to be restored
+            self.bake_retry_at = time.monotonic() + self.bake_backoff
+            self.flatten_status_var.set(f"Flattening failed ({result.error}), "
+                                        f"retrying in {self.bake_backoff:.0f} s")
+            self.bake_backoff = min(self.bake_backoff * 2, BAKE_RETRY_MAX)
+            return
+        self.bake_backoff = BAKE_RETRY_MIN
+        self.flatten_status_var.set("")
+        self.ink_layer = result.layer
+        baked = set(result.stroke_ids)
+        self.baked_ids = baked if result.replace else self.baked_ids | baked
+        with session.lock:
+            erased = {stroke_id for stroke_id in baked if stroke_id not in session.strokes}
+        if erased:
+            # Erased while the bake was running
+            self.baked_ids -= erased
+            self.rebake_needed = True
+        self.show_page_image(result.composite)
+        for stroke_id in baked:
+            self.delete_stroke_items(stroke_id)
+    
+    def show_page_image(self, img):
+        """Replace the page image under the ink (a white page if img is None)."""
+        from PIL import Image, ImageTk
+
+        if img is None:
+            img = Image.new("RGB", (self.image_width, self.image_height), "white")
+        self.current_image_tk = ImageTk.PhotoImage(img)
+        if self.canvas.find_withtag("page"):
+            self.canvas.itemconfig("page", image=self.current_image_tk)
+        else:
+            self.canvas.create_image(
+                self.x_offset, self.y_offset, anchor="nw", image=self.current_image_tk, tags="page"
+            )
+            self.canvas.tag_lower("page")
+    
     def cleanup(self):
         """Clean up all resources when closing"""
+        session.remove_listener(self.on_session_event)
         if self.voice_chat:
             self.voice_chat.cleanup()
-        if self.pdf_document:
-            self.pdf_document.close()
+        if self.recorder:
+            self.recorder.stop()
+        session.close_document()
 
-def run_tkinter(host_ip):
+def run_tkinter(host_ip, pdf_path=None, record_path=None, replay_path=None, replay_speed=1.0):
     """Start the Tkinter GUI."""
     root = Tk()
     root.geometry("1200x700")
-    whiteboard_app = CollaborativeWhiteboard(root, host_ip)
+    whiteboard_app = CollaborativeWhiteboard(root, host_ip, record_path=record_path)
+    if pdf_path:
+        root.after_idle(session.load_pdf, pdf_path)
+    if replay_path:
+        root.after_idle(replay_in_background, replay_path, session, replay_speed)
     
     # Handle cleanup when window is closed
     def on_closing():